@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 
+from . import routers
 from .models import *
 
 
@@ -126,8 +127,24 @@ class CategoryAdmin(admin.ModelAdmin):
 admin.site.register(Category, CategoryAdmin)
 
 
+class AnalyticsModelAdmin(admin.ModelAdmin):
+	"""
+	Admin of a model stored in the analytics database, which may be separate from the
+	posts (blog_app.routers): posts are then neither joined nor searched in the same query.
+	"""
+
+	def get_list_select_related(self, request):
+		return () if routers.analytics_separate() else super().get_list_select_related(request)
+
+	def get_search_results(self, request, queryset, search_term):
+		if not routers.analytics_separate() or not search_term:
+			return super().get_search_results(request, queryset, search_term)
+		post_ids = Post.objects.filter(title__icontains=search_term).values_list('pk', flat=True)
+		return queryset.filter(post_id__in=list(post_ids)), False
+
+
 # Register the PostAnalytics model with the admin
-class PostAnalyticsAdmin(admin.ModelAdmin):
+class PostAnalyticsAdmin(AnalyticsModelAdmin):
 	list_display = ('post', 'views', 'likes')
 	search_fields = ('post__title',)
 	list_filter = ('post',)
@@ -136,6 +153,17 @@ class PostAnalyticsAdmin(admin.ModelAdmin):
 admin.site.register(PostAnalytics, PostAnalyticsAdmin)
 
 
+# Register the AnalyticsRollup model with the admin
+class AnalyticsRollupAdmin(AnalyticsModelAdmin):
+	list_display = ('post', 'period', 'bucket', 'views', 'likes', 'comments')
+	search_fields = ('post__title',)
+	list_filter = ('period',)
+	raw_id_fields = ('post',)
+
+
+admin.site.register(AnalyticsRollup, AnalyticsRollupAdmin)
+
+
 # Register the Follow model with the admin
 class FollowAdmin(admin.ModelAdmin):
 	list_display = ('follower', 'followed', 'created_at')
@@ -154,3 +182,13 @@ class PostLikeAdmin(admin.ModelAdmin):
 
 
 admin.site.register(PostLike, PostLikeAdmin)
+
+
+# Register the OrphanedFile model with the admin
+class OrphanedFileAdmin(admin.ModelAdmin):
+	list_display = ('name', 'created_at')
+	search_fields = ('name',)
+	readonly_fields = ('name', 'created_at')
+
+
+admin.site.register(OrphanedFile, OrphanedFileAdmin)
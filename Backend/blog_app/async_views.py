@@ -0,0 +1,182 @@
+"""
+Async variants of the hot read endpoints, served under /api/async/.
+
+Under ASGI a sync DRF view holds a worker thread for the whole request, including the
+time spent waiting on the database. These views are Django coroutines: rows are read
+with the async ORM, and the independent lookups behind one response (a profile and its
+three counts, a page of posts and its total) are awaited together with asyncio.gather.
+
+DRF's APIView only runs synchronously, so these are plain Django views: the JWT is
+checked by CachedJWTAuthentication through sync_to_async, and the responses are
+JsonResponses built by the same serializers (and paginator) as the sync endpoints.
+Serializers only ever see rows that are already loaded, so they never query from the
+event loop.
+
+Django's async ORM still runs each query through sync_to_async on the request's thread,
+so the gathered queries of one request are issued back to back rather than in parallel;
+what ASGI gains is that no thread is held while a request waits.
+`manage.py benchmark_async` compares both stacks.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound, ValidationError
+from rest_framework.request import Request
+
+from . import search
+from .authentication import CachedJWTAuthentication
+from .models import Category, Follow, Post, User
+from .pagination import KeysetPagination, alist
+from .serializers import PostSerializer, UserProfileSerializer
+
+CustomUser = get_user_model()
+
+
+def error_response(exc):
+	"""The response DRF's exception handler would give for `exc`."""
+	data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+	return JsonResponse(data, status=exc.status_code, safe=False)
+
+
+def async_api_view(authenticated=False):
+	"""
+	Wrap an async view taking (request, user, ...): authenticate the JWT, wrap the request
+	for query_params / absolute URLs and turn DRF exceptions into error responses.
+	"""
+
+	def decorator(view):
+		@require_GET
+		async def wrapper(request, *args, **kwargs):
+			try:
+				result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+				user = result[0] if result else AnonymousUser()
+				if authenticated and not user.is_authenticated:
+					raise NotAuthenticated()
+				return await view(Request(request), user, *args, **kwargs)
+			except APIException as exc:
+				return error_response(exc)
+
+		return wrapper
+
+	return decorator
+
+
+@async_api_view()
+async def post_list(request, user):
+	"""
+	Posts, newest first and cursor paginated (`?cursor=`, `?page_size=`, `?with_count=`),
+	filtered like /api/posts/ (PostViewSet.get_queryset) by `?username=`, `?author=`, `?q=`,
+	`?category=<slug>` and `?is_published=`.
+	"""
+	params = request.query_params
+	queryset = Post.objects.feed()
+	if params.get('username'):
+		queryset = queryset.filter(author__username=params['username'])
+	if params.get('author'):
+		try:
+			queryset = queryset.filter(author_id=int(params['author']))
+		except ValueError:
+			raise ValidationError("The 'author' query parameter must be a valid integer.")
+	if params.get('q'):
+		# Checks for the FTS table on the first search
+		queryset = await sync_to_async(search.filter_queryset)(queryset, params['q'])
+	if params.get('category'):
+		category = await Category.objects.filter(slug=params['category']).afirst()
+		if category is None:
+			raise ValidationError(f"Category with slug '{params['category']}' does not exist.")
+		queryset = queryset.filter(category=category)
+	is_published = params.get('is_published')
+	if is_published is not None:
+		queryset = queryset.filter(is_published=is_published.lower() in ['true', '1', 't', 'y', 'yes'])
+	if user.is_authenticated:
+		queryset = queryset.filter(Post.visible_to(user))
+
+	paginator = KeysetPagination()
+	posts = await paginator.apaginate_queryset(queryset, request)
+	return JsonResponse(paginator.get_paginated_data(PostSerializer(posts, many=True, context={'request': request}).data))
+
+
+@async_api_view()
+async def post_detail(request, user, slug):
+	try:
+		post = await Post.objects.feed().aget(slug=slug)
+	except Post.DoesNotExist:
+		raise NotFound("No Post matches the given query.")
+	return JsonResponse(PostSerializer(post, context={'request': request}).data)
+
+
+@async_api_view(authenticated=True)
+async def profile(request, user, username=None):
+	"""
+	A user's profile (the authenticated user's without `username`) with their follower,
+	following and post counts, which the sync API serves from four endpoints.
+	"""
+	# Other users' profiles are looked up among regular users, as UserProfileView.get does
+	users = CustomUser.objects if username is None else User.objects
+	if username is None:
+		username = user.username
+	profile_user, followers_count, following_count, post_count = await asyncio.gather(
+		users.filter(username=username).afirst(),
+		Follow.objects.filter(followed__username=username).acount(),
+		Follow.objects.filter(follower__username=username).acount(),
+		Post.objects.filter(author__username=username).acount(),
+	)
+	if profile_user is None:
+		raise NotFound("User not found.")
+	return JsonResponse({
+		**UserProfileSerializer(profile_user, context={'request': request}).data,
+		'followers_count': followers_count,
+		'following_count': following_count,
+		'post_count': post_count,
+	})
+
+
+async def follow_list(request, user_id, follows, side):
+	"""The users on the `side` of `follows`, listed or paginated like FollowViewSet.followers."""
+	follows = follows.select_related(side)
+	paginator = KeysetPagination() if KeysetPagination.requested(request) else None
+	page = paginator.apaginate_queryset(follows, request) if paginator else alist(follows)
+	exists, page = await asyncio.gather(CustomUser.objects.filter(pk=user_id).aexists(), page)
+	if not exists:
+		raise NotFound("No CustomUser matches the given query.")
+	data = UserProfileSerializer([getattr(follow, side) for follow in page], many=True).data
+	if paginator is None:
+		return JsonResponse(data, safe=False)
+	return JsonResponse(paginator.get_paginated_data(data))
+
+
+@async_api_view(authenticated=True)
+async def followers(request, user, id):
+	return await follow_list(request, id, Follow.objects.filter(followed_id=id), 'follower')
+
+
+@async_api_view(authenticated=True)
+async def following(request, user, id):
+	return await follow_list(request, id, Follow.objects.filter(follower_id=id), 'followed')
+
+
+async def count_response(user_id, key, queryset):
+	"""{key: count} with the user lookup and the count awaited together."""
+	exists, count = await asyncio.gather(CustomUser.objects.filter(pk=user_id).aexists(), queryset.acount())
+	if not exists:
+		return JsonResponse({key: "N/A"}, status=404)
+	return JsonResponse({key: count})
+
+
+@async_api_view()
+async def followers_count(request, user, user_id):
+	return await count_response(user_id, 'followers_count', Follow.objects.filter(followed_id=user_id))
+
+
+@async_api_view()
+async def following_count(request, user, user_id):
+	return await count_response(user_id, 'following_count', Follow.objects.filter(follower_id=user_id))
+
+
+@async_api_view()
+async def post_count(request, user, user_id):
+	return await count_response(user_id, 'post_count', Post.objects.filter(author_id=user_id))
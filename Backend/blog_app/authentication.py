@@ -0,0 +1,91 @@
+"""
+JWT authentication with a short-lived cache of the authenticated user.
+
+simplejwt's JWTAuthentication loads the user row on every request. CachedJWTAuthentication
+keeps the fields that authentication and permission checks read (CACHED_FIELDS) in the
+cache for AUTH_USER_CACHE_TIMEOUT seconds, keyed by the token's user id, and rebuilds
+request.user from them with every other field deferred: reading one loads it from the
+database, so views that serialize the user re-read the row instead. The password hash is
+not cached, only the digest of it that tokens are checked against.
+
+The entry is dropped when the user is saved or deleted (profile updates, password
+changes, deactivation) once the transaction commits; the timeout bounds staleness from
+anything else (e.g. raw UPDATEs). That deletion only reaches every process through a
+shared cache, so users are not cached at all when the default cache is local to the
+process (LocMemCache, the default) or a dummy one: a deactivated user could otherwise
+keep authenticating against the other workers' copies. Set REDIS_URL or CACHE_DIRECTORY
+(see settings.py) to run with a shared cache.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+# Fields of the cached user; the others are deferred
+CACHED_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser', 'is_admin', 'is_user', 'updated_at')
+# Cache backends whose entries are not shared between processes
+LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def user_cache_key(user_id):
+	return f'auth_user_state:{user_id}'
+
+
+def cache_timeout():
+	"""Seconds users stay cached, 0 when the default cache is not shared between processes."""
+	if isinstance(caches[DEFAULT_CACHE_ALIAS], LOCAL_CACHES):
+		return 0
+	return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+
+
+def cached_state(user):
+	"""What is cached of `user`: CACHED_FIELDS, and the digest of the password for CHECK_REVOKE_TOKEN."""
+	state = {field: getattr(user, field) for field in CACHED_FIELDS}
+	if api_settings.CHECK_REVOKE_TOKEN:
+		state['password_digest'] = get_md5_hash_password(user.password)
+	return state
+
+
+def user_from_state(state):
+	"""A user instance with the cached fields loaded and the others deferred."""
+	model = get_user_model()
+	field_names = [field.attname for field in model._meta.concrete_fields if field.attname in CACHED_FIELDS]
+	return model.from_db(DEFAULT_DB_ALIAS, field_names, [state[name] for name in field_names])
+
+
+def invalidate_user(user_id):
+	"""Drop the cached user once the current transaction commits."""
+	transaction.on_commit(lambda: cache.delete(user_cache_key(user_id)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+	"""JWTAuthentication that serves the user from the cache, falling back to the database."""
+
+	def get_user(self, validated_token):
+		user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+		if user_id is None or not cache_timeout():
+			return super().get_user(validated_token)
+
+		key = user_cache_key(user_id)
+		state = cache.get(key)
+		if state is None:
+			user = super().get_user(validated_token)
+			cache.set(key, cached_state(user), timeout=cache_timeout())
+			return user
+
+		# The same checks as a database lookup, against the cached fields
+		if api_settings.CHECK_USER_IS_ACTIVE and not state['is_active']:
+			raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+		if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+			api_settings.REVOKE_TOKEN_CLAIM
+		) != state.get('password_digest'):
+			raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+		return user_from_state(state)
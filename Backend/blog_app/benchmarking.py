@@ -0,0 +1,110 @@
+"""
+Synthetic data for the `benchmark_*` management commands.
+
+`scratch_databases()` runs a benchmark against freshly created copies of the test
+databases (the `TEST` names of `DATABASES`), so the real data is never touched, and the
+`create_*` helpers fill them in bulk: model signals do not run, so benchmarks build the
+derived rows (analytics, search index, timelines) they need themselves.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.test import override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .buffers import counter_buffer, rollup_buffer, view_buffer
+from .models import CustomUser, Post
+
+BATCH_SIZE = 2000
+# Vocabulary of the synthetic posts: a few very common words, then a long tail of
+# pseudo-words, the same on every run
+COMMON_WORDS = ['blog', 'post', 'django', 'python', 'data', 'web']
+_rng = random.Random(0)
+WORDS = COMMON_WORDS + [
+	''.join(_rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(_rng.randint(4, 9))) for _ in range(20_000)
+]
+
+
+@contextmanager
+def scratch_databases():
+	"""
+	Create empty test databases for the duration of the block, then destroy them. The
+	test client's host is allowed meanwhile, for benchmarks going through the views.
+	Buffered writes are flushed before the databases are destroyed.
+	"""
+	old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=[])
+	try:
+		with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+			yield
+	finally:
+		for buffer in (counter_buffer, view_buffer, rollup_buffer):
+			buffer.flush()
+		teardown_databases(old_config, verbosity=0)
+
+
+def client(user=None):
+	"""An API test client, signed in as `user` (so never served from the response cache)."""
+	api_client = APIClient()
+	if user is not None:
+		api_client.force_authenticate(user)
+	return api_client
+
+
+def create_users(count, prefix='user'):
+	"""Create `count` users sharing one (unusable) password hash; returns their ids."""
+	password = make_password(None)
+	for start in range(0, count, BATCH_SIZE):
+		CustomUser.objects.bulk_create(
+			CustomUser(username=f'{prefix}{number}', email=f'{prefix}{number}@example.com', password=password)
+			for number in range(start, min(count, start + BATCH_SIZE))
+		)
+	return list(CustomUser.objects.filter(username__startswith=prefix).order_by('pk').values_list('pk', flat=True))
+
+
+def text(rng, words):
+	"""`words` words, one in twenty of them from COMMON_WORDS."""
+	return ' '.join(
+		rng.choice(COMMON_WORDS) if rng.random() < 0.05 else rng.choice(WORDS) for _ in range(words)
+	)
+
+
+def create_posts(count, author_ids, seed=0, content_words=60, published=0.9, spread=timedelta(days=365)):
+	"""
+	Create `count` posts by random authors, with random text, `published` of them
+	published, and `created_at` spread evenly over the last `spread`.
+	"""
+	rng = random.Random(seed)
+	now = timezone.now()
+	step = spread / max(count, 1)
+	with transaction.atomic():
+		for start in range(0, count, BATCH_SIZE):
+			numbers = range(start, min(count, start + BATCH_SIZE))
+			posts = Post.objects.bulk_create(
+				Post(
+					title=text(rng, 6), slug=f'post-{number}', content=text(rng, content_words),
+					author_id=rng.choice(author_ids), is_published=rng.random() < published,
+				)
+				for number in numbers
+			)
+			# created_at is auto_now_add, so the spread is applied afterwards
+			for number, post in zip(numbers, posts):
+				post.created_at = now - step * (count - number)
+			Post.objects.bulk_update(posts, ['created_at'], batch_size=500)
+
+
+def measure(function, repeat=5):
+	"""Median seconds per call of `function`, after one warm-up call."""
+	function()
+	timings = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		timings.append(time.perf_counter() - start)
+	return sorted(timings)[len(timings) // 2]
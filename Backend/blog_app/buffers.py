@@ -0,0 +1,339 @@
+"""
+Write-behind buffers for high-frequency analytics writes.
+
+Requests record events into an in-process buffer and return immediately; a daemon
+thread drains the buffer every few seconds (or as soon as it grows past a threshold)
+and applies the whole batch with a handful of bulk statements. `view_buffer` holds post
+views, `rollup_buffer` the events of the hourly analytics time series and
+`counter_buffer` like / comment counter changes (only used with SQLITE_SINGLE_WRITER).
+
+Each buffer has its own thread, except in SQLite single-writer mode (blog_app.sqlite),
+where one thread flushes all of them in turn so that they never compete for the write
+lock.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from . import caching, counters, rollups, routers, sqlite
+from .models import Post, PostAnalytics
+
+logger = logging.getLogger(__name__)
+
+
+class Flusher:
+	"""
+	A daemon thread flushing `buffers` in order every few seconds (the shortest interval of
+	its buffers), or as soon as it is woken.
+	"""
+
+	def __init__(self, buffers):
+		self.buffers = buffers
+		self._wake = threading.Event()
+		self._lock = threading.Lock()
+		self._thread = None
+
+	@property
+	def interval(self):
+		# Buffers with an interval of 0 write through and never wait for the thread
+		return min((buffer.interval for buffer in self.buffers if buffer.interval), default=5)
+
+	def start(self):
+		with self._lock:
+			# Also restarts a thread that died, which `_run` should never let happen
+			if self._thread is None or not self._thread.is_alive():
+				name = '+'.join(type(buffer).__name__ for buffer in self.buffers)
+				self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+				self._thread.start()
+
+	def wake(self):
+		self._wake.set()
+
+	def flush(self):
+		"""
+		Flush every buffer once. A buffer failing with anything but a database error (which
+		the buffer handles itself) loses its batch, but never stops the others or the thread.
+		"""
+		for buffer in self.buffers:
+			try:
+				buffer.flush()
+			except Exception:
+				logger.exception("Flushing %s failed, its batch was dropped", type(buffer).__name__)
+
+	def _run(self):
+		while True:
+			self._wake.wait(self.interval)
+			self._wake.clear()
+			self.flush()
+			# Connections are per thread; do not keep one open between flushes
+			connections.close_all()
+
+
+class BufferedWriter:
+	"""
+	Base class for buffers flushed by a background thread.
+	Subclasses implement `_take()` (swap out the pending batch), `_restore(batch)` (merge a
+	batch back after a failed write) and `write(batch)`.
+	"""
+	interval_setting = None
+	max_pending_setting = None
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._size = 0
+		self._flusher = Flusher([self])
+
+	@property
+	def interval(self):
+		return getattr(settings, self.interval_setting, 5)
+
+	@property
+	def max_pending(self):
+		return getattr(settings, self.max_pending_setting, 1000)
+
+	@property
+	def flusher(self):
+		return single_writer if sqlite.single_writer() else self._flusher
+
+	def _added(self):
+		"""Called with the lock held after an event was buffered."""
+		self._size += 1
+		if not self.interval:
+			return
+		self.flusher.start()
+		if self._size >= self.max_pending:
+			self.flusher.wake()
+
+	def flush(self):
+		"""Write everything buffered so far. Returns the number of events written."""
+		with self._lock:
+			batch = self._take()
+			size, self._size = self._size, 0
+		if not size:
+			return 0
+		try:
+			self.write(batch)
+		except DatabaseError:
+			logger.exception("Flushing %s failed, keeping %d events for the next attempt", type(self).__name__, size)
+			with self._lock:
+				self._restore(batch)
+				self._size += size
+			return 0
+		return size
+
+	def _take(self):
+		raise NotImplementedError
+
+	def _restore(self, batch):
+		raise NotImplementedError
+
+	def write(self, batch):
+		raise NotImplementedError
+
+
+class ViewBuffer(BufferedWriter):
+	"""
+	Buffers post views.
+	Anonymous views are plain counts; authenticated views carry the user id so that
+	unique-viewer tracking happens once per batch instead of once per request.
+	"""
+	interval_setting = 'VIEW_BUFFER_FLUSH_INTERVAL'
+	max_pending_setting = 'VIEW_BUFFER_MAX_PENDING'
+	update_batch_size = 250  # Rows per bulk_update, keeps the statement under SQLite's parameter limit
+
+	def __init__(self):
+		super().__init__()
+		self._anonymous = defaultdict(int)
+		self._viewers = defaultdict(set)
+
+	def record(self, post_id, user_id=None):
+		"""Buffer one view of `post_id`, optionally by an authenticated user."""
+		with self._lock:
+			if user_id is None:
+				self._anonymous[post_id] += 1
+			else:
+				self._viewers[post_id].add(user_id)
+			self._added()
+		if not self.interval:
+			self.flush()
+
+	def pending(self, post_id):
+		"""Number of buffered views of `post_id`, used to approximate the live count."""
+		with self._lock:
+			return self._anonymous.get(post_id, 0) + len(self._viewers.get(post_id, ()))
+
+	def _take(self):
+		batch = (self._anonymous, self._viewers)
+		self._anonymous, self._viewers = defaultdict(int), defaultdict(set)
+		return batch
+
+	def _restore(self, batch):
+		anonymous, viewers = batch
+		for post_id, count in anonymous.items():
+			self._anonymous[post_id] += count
+		for post_id, user_ids in viewers.items():
+			self._viewers[post_id].update(user_ids)
+
+	def write(self, batch):
+		anonymous, viewers = batch
+		post_ids = set(anonymous) | set(viewers)
+		with transaction.atomic(using=routers.analytics_database()):
+			analytics_ids = dict(PostAnalytics.objects.filter(post_id__in=post_ids).values_list('post_id', 'id'))
+			missing = post_ids - set(analytics_ids)
+			# Posts deleted since their views were buffered get no row and are skipped
+			if missing and counters.ensure_analytics(missing):
+				analytics_ids = dict(
+					PostAnalytics.objects.filter(post_id__in=post_ids).values_list('post_id', 'id')
+				)
+
+			increments = defaultdict(int, anonymous)
+			for post_id, new_viewers in self.record_viewers(analytics_ids, viewers).items():
+				increments[post_id] += new_viewers
+
+			increments = {post_id: count for post_id, count in increments.items() if post_id in analytics_ids}
+			counters.add_many('views', increments)
+		caching.bump_posts(Post.objects.filter(pk__in=increments))
+		# Views reach the time series in the hour they were flushed
+		for post_id, count in increments.items():
+			if count:
+				rollup_buffer.record(post_id, 'views', count)
+
+	def record_viewers(self, analytics_ids, viewers):
+		"""
+		Store the buffered (post, user) pairs and return how many new unique viewers each
+		post gained.
+		"""
+		if getattr(settings, 'VIEW_TRACKING_BACKEND', 'm2m') == 'sketch':
+			return self.record_viewers_in_sketches(analytics_ids, viewers)
+		through = PostAnalytics.viewed_users.through
+		pairs = {
+			(analytics_ids[post_id], user_id)
+			for post_id, user_ids in viewers.items() if post_id in analytics_ids
+			for user_id in user_ids
+		}
+		if not pairs:
+			return {}
+		existing = set(through.objects.filter(
+			postanalytics_id__in={analytics_id for analytics_id, _ in pairs},
+			customuser_id__in={user_id for _, user_id in pairs},
+		).values_list('postanalytics_id', 'customuser_id'))
+		new_pairs = pairs - existing
+		through.objects.bulk_create(
+			[through(postanalytics_id=analytics_id, customuser_id=user_id) for analytics_id, user_id in new_pairs],
+			ignore_conflicts=True,
+		)
+		post_ids = {analytics_id: post_id for post_id, analytics_id in analytics_ids.items()}
+		gained = defaultdict(int)
+		for analytics_id, _ in new_pairs:
+			gained[post_ids[analytics_id]] += 1
+		return gained
+
+	def record_viewers_in_sketches(self, analytics_ids, viewers):
+		"""Sketch-mode counterpart of `record_viewers`: one read and one bulk write per batch."""
+		viewers = {post_id: user_ids for post_id, user_ids in viewers.items() if post_id in analytics_ids}
+		if not viewers:
+			return {}
+		rows = list(PostAnalytics.objects.filter(post_id__in=viewers).only('id', 'post_id', 'viewer_sketch'))
+		gained = defaultdict(int)
+		for analytics in rows:
+			sketch = analytics.get_viewer_sketch()
+			for user_id in viewers[analytics.post_id]:
+				gained[analytics.post_id] += sketch.add(user_id)
+			analytics.viewer_sketch = sketch.to_bytes()
+		PostAnalytics.objects.bulk_update(rows, ['viewer_sketch'], batch_size=self.update_batch_size)
+		return gained
+
+
+class RollupBuffer(BufferedWriter):
+	"""
+	Buffers view / like / comment events for the hourly time series (blog_app.rollups).
+	Events are summed per (post, hour) as they arrive, so a flush writes one row per post
+	and hour however many events it covers.
+	"""
+	interval_setting = 'ROLLUP_BUFFER_FLUSH_INTERVAL'
+	max_pending_setting = 'ROLLUP_BUFFER_MAX_PENDING'
+
+	def __init__(self):
+		super().__init__()
+		self._counts = defaultdict(lambda: dict.fromkeys(rollups.EVENTS, 0))
+
+	def record(self, post_id, event, amount=1, at=None):
+		"""Buffer `amount` (possibly negative) `event`s of `post_id` happening at `at` (now)."""
+		bucket = rollups.truncate(at or timezone.now(), rollups.HOUR)
+		with self._lock:
+			self._counts[post_id, bucket][event] += amount
+			self._added()
+		if not self.interval:
+			self.flush()
+
+	def _take(self):
+		batch, self._counts = self._counts, defaultdict(lambda: dict.fromkeys(rollups.EVENTS, 0))
+		return batch
+
+	def _restore(self, batch):
+		for key, counts in batch.items():
+			for event, amount in counts.items():
+				self._counts[key][event] += amount
+
+	def write(self, batch):
+		rollups.add(rollups.HOUR, batch)
+
+
+class CounterBuffer(BufferedWriter):
+	"""
+	Buffers changes to the like and comment counters of posts, summed per post, in SQLite
+	single-writer mode and with a separate analytics database. Each flush applies them in
+	one transaction.
+	"""
+	interval_setting = 'COUNTER_BUFFER_FLUSH_INTERVAL'
+	max_pending_setting = 'COUNTER_BUFFER_MAX_PENDING'
+	adjusters = {'likes': counters.adjust_likes, 'comment_count': counters.adjust_comments}
+
+	def __init__(self):
+		super().__init__()
+		self._deltas = defaultdict(int)
+
+	def record(self, post_id, field, delta):
+		"""Buffer `delta` (positive or negative) for the `field` counter of `post_id`."""
+		with self._lock:
+			self._deltas[post_id, field] += delta
+			self._added()
+		if not self.interval:
+			self.flush()
+
+	def pending(self, post_id, field):
+		"""The buffered change to a counter, used to approximate the live count."""
+		with self._lock:
+			return self._deltas.get((post_id, field), 0)
+
+	def _take(self):
+		batch, self._deltas = self._deltas, defaultdict(int)
+		return batch
+
+	def _restore(self, batch):
+		for key, delta in batch.items():
+			self._deltas[key] += delta
+
+	def write(self, batch):
+		with transaction.atomic(using=routers.analytics_database()):
+			for (post_id, field), delta in batch.items():
+				if delta:
+					self.adjusters[field](post_id, delta)
+		# The responses cached since the like / comment itself still have the old count
+		caching.bump_posts(Post.objects.filter(pk__in={post_id for post_id, field in batch}))
+
+
+rollup_buffer = RollupBuffer()
+view_buffer = ViewBuffer()
+counter_buffer = CounterBuffer()
+# The view buffer feeds the rollup buffer, so it is flushed first (atexit runs in reverse)
+atexit.register(rollup_buffer.flush)
+atexit.register(view_buffer.flush)
+atexit.register(counter_buffer.flush)
+# The thread flushing every buffer in SQLite single-writer mode, in the same order
+single_writer = Flusher([counter_buffer, view_buffer, rollup_buffer])
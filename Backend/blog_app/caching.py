@@ -0,0 +1,128 @@
+"""
+Response cache for the anonymous read endpoints.
+
+Cached responses are keyed on the view, the normalized query string and the current
+version stamp of every scope the response depends on ("post-list", "post:<slug>",
+"category-list"). Writes never delete entries: the model signals bump the version of
+the affected scopes (a post's, and those of the posts embedding a changed author or
+category), so stale entries simply stop being addressed and expire on their own.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+# Query parameters that change the response; anything else is ignored in the key
+CACHE_PARAMS = (
+	'q', 'category', 'author', 'username', 'is_published', 'page', 'page_size', 'cursor', 'pagination', 'with_count',
+	'limit',
+)
+
+# Response headers stored with the data
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+POST_LIST = 'post-list'
+CATEGORY_LIST = 'category-list'
+
+_STATS_KEYS = {'hits': 'response_cache:hits', 'misses': 'response_cache:misses'}
+
+
+def post_scope(slug):
+	return f'post:{slug}'
+
+
+def _version_key(scope):
+	return f'response_cache:version:{scope}'
+
+
+def get_versions(scopes):
+	"""Return the current version stamp of each scope, initializing missing ones."""
+	keys = {scope: _version_key(scope) for scope in scopes}
+	found = cache.get_many(keys.values())
+	versions = []
+	for scope, key in keys.items():
+		version = found.get(key)
+		if version is None:
+			# Start from a timestamp so that an evicted stamp never reuses an old version
+			version = int(time.time() * 1000)
+			cache.add(key, version, timeout=None)
+			version = cache.get(key, version)
+		versions.append(version)
+	return versions
+
+
+def bump(*scopes):
+	"""Invalidate every cached response that depends on one of `scopes` (after commit)."""
+
+	def _bump():
+		for scope in scopes:
+			try:
+				cache.incr(_version_key(scope))
+			except ValueError:
+				cache.set(_version_key(scope), int(time.time() * 1000), timeout=None)
+
+	transaction.on_commit(_bump)
+
+
+def bump_posts(posts, *scopes):
+	"""Bump `scopes`, the post list and the detail of every post of the `posts` queryset."""
+	slugs = posts.values_list('slug', flat=True)
+	bump(*scopes, POST_LIST, *[post_scope(slug) for slug in slugs])
+
+
+def _record(outcome):
+	try:
+		cache.incr(_STATS_KEYS[outcome])
+	except ValueError:
+		cache.add(_STATS_KEYS[outcome], 1, timeout=None)
+
+
+def stats():
+	"""Return the hit/miss counters shared by every process using this cache."""
+	found = cache.get_many(_STATS_KEYS.values())
+	counters = {name: found.get(key, 0) for name, key in _STATS_KEYS.items()}
+	total = counters['hits'] + counters['misses']
+	counters['hit_rate'] = counters['hits'] / total if total else 0.0
+	return counters
+
+
+def reset_stats():
+	cache.delete_many(_STATS_KEYS.values())
+
+
+def cache_key(request, view_name, scopes):
+	params = sorted(
+		(name, value) for name in CACHE_PARAMS for value in request.query_params.getlist(name)
+	)
+	raw = repr((request.get_host(), view_name, get_versions(scopes), params))
+	return 'response_cache:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def cached_response(request, view_name, scopes, build):
+	"""
+	Return the cached response for an anonymous request, or call `build()` and cache its
+	data and validators. Authenticated requests bypass the cache since their results
+	depend on the user.
+	"""
+	timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+	if not timeout or request.user.is_authenticated:
+		return build()
+
+	key = cache_key(request, view_name, scopes)
+	cached = cache.get(key)
+	if cached is not None:
+		_record('hits')
+		data, headers = cached
+		return Response(data, headers={**headers, 'X-Cache': 'HIT'})
+
+	_record('misses')
+	response = build()
+	if response.status_code == 200:
+		# Keeps the HTTP validators (blog_app.conditional) the response was built with
+		headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+		cache.set(key, (response.data, headers), timeout=timeout)
+	response['X-Cache'] = 'MISS'
+	return response
@@ -0,0 +1,64 @@
+"""
+HTTP conditional request support (ETag / Last-Modified).
+
+Validators are computed from `updated_at` columns and counter values with a single
+narrow query, so a 304 is returned before the queryset is loaded or serialized. They are
+only computed when needed: for requests carrying If-None-Match / If-Modified-Since, and
+for responses that are actually built (responses served from the response cache keep
+the validators they were cached with).
+"""
+import functools
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+	"""Build a strong ETag from the values a representation depends on."""
+	return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def is_conditional(request):
+	return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+
+def lazy(validators):
+	"""Wrap a validators function so that it runs at most once per request."""
+	return functools.cache(validators)
+
+
+def with_validators(response, validators):
+	"""
+	Attach the validators returned by `validators()`, an (etag, last_modified) pair either of
+	which may be None, to a successful response that has none yet.
+	"""
+	if response.status_code != 200 or response.has_header('ETag'):
+		return response
+	etag, last_modified = validators()
+	if etag is not None:
+		response['ETag'] = etag
+	if last_modified is not None:
+		response['Last-Modified'] = http_date(int(last_modified.timestamp()))
+	return response
+
+
+def conditional_response(request, validators, build):
+	"""
+	Return 304 Not Modified if the request's validators match `validators()` (see
+	`with_validators`), otherwise call `build()` and attach them to its response.
+	Representations that depend on more than `updated_at` (such as counters) should
+	return no `last_modified`, so that only their ETag is compared.
+	"""
+	if is_conditional(request):
+		etag, last_modified = validators()
+		timestamp = int(last_modified.timestamp()) if last_modified else None
+		if etag is not None or timestamp is not None:
+			not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+			if not_modified is not None:
+				if etag is not None:
+					not_modified['ETag'] = etag
+				if timestamp is not None:
+					not_modified['Last-Modified'] = http_date(timestamp)
+				return not_modified
+	return with_validators(build(), validators)
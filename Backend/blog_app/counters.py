@@ -0,0 +1,160 @@
+"""
+Denormalized post counters stored on PostAnalytics.
+
+Every change is a single `UPDATE ... SET column = column + n` statement run inside a
+transaction, so concurrent requests never overwrite each other's increments. The same
+statement rewrites the post's trending score (see blog_app.trending).
+
+The rows may live in a separate analytics database (blog_app.routers), so posts, likes
+and comments are always read with queries of their own rather than joined.
+"""
+from django.db import connections, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import routers, trending
+from .models import Comment, Post, PostAnalytics, PostLike
+
+# score_expression() argument of each counter column
+_SCORE_ARGUMENTS = {'views': 'views', 'likes': 'likes', 'comment_count': 'comments'}
+
+
+def ensure_analytics(post_ids):
+	"""Create the missing analytics rows of existing posts, with their trending offset set."""
+	post_ids = set(post_ids)
+	post_ids -= set(PostAnalytics.objects.filter(post_id__in=post_ids).values_list('post_id', flat=True))
+	missing = Post.objects.filter(pk__in=post_ids).values_list('pk', 'created_at') if post_ids else []
+	rows = []
+	for post_id, created_at in missing:
+		offset = trending.offset(created_at)
+		rows.append(PostAnalytics(post_id=post_id, trending_offset=offset, trending_score=offset))
+	PostAnalytics.objects.bulk_create(rows, ignore_conflicts=True)
+	return len(rows)
+
+
+def _adjust(post_id, field, delta):
+	"""Atomically add `delta` to a counter column, creating the analytics row if needed."""
+	values = {
+		field: F(field) + delta,
+		'trending_score': trending.score_expression(**{_SCORE_ARGUMENTS[field]: F(field) + delta}),
+	}
+	with transaction.atomic(using=routers.analytics_database()):
+		queryset = PostAnalytics.objects.filter(post_id=post_id)
+		if delta < 0:
+			# Never let a counter drop below zero (the columns are unsigned)
+			queryset = queryset.filter(**{f'{field}__gte': -delta})
+		updated = queryset.update(**values)
+		if not updated and delta > 0:
+			ensure_analytics([post_id])
+			updated = PostAnalytics.objects.filter(post_id=post_id).update(**values)
+	return updated
+
+
+def increment_views(post_id, amount=1):
+	"""Add `amount` views to a post."""
+	return _adjust(post_id, 'views', amount)
+
+
+def adjust_likes(post_id, delta):
+	"""Add `delta` (positive or negative) to a post's like count."""
+	return _adjust(post_id, 'likes', delta)
+
+
+def adjust_comments(post_id, delta):
+	"""Add `delta` (positive or negative) to a post's comment count."""
+	return _adjust(post_id, 'comment_count', delta)
+
+
+def add_many(field, increments):
+	"""
+	Add per-post amounts to a counter column: `increments` maps post ids to the amount to
+	add. All rows go through one prepared `UPDATE ... SET column = column + %s WHERE
+	post_id = %s` (executemany), which stays cheap however many posts are touched; the
+	trending scores are then refreshed in batches.
+	"""
+	params = [(amount, post_id) for post_id, amount in dict(increments).items() if amount]
+	if not params:
+		return
+	connection = connections[routers.analytics_database()]
+	quote = connection.ops.quote_name
+	column = quote(PostAnalytics._meta.get_field(field).column)
+	with connection.cursor() as cursor:
+		cursor.executemany(
+			f"UPDATE {quote(PostAnalytics._meta.db_table)} SET {column} = {column} + %s WHERE {quote('post_id')} = %s",
+			params,
+		)
+	trending.refresh(post_id for _, post_id in params)
+
+
+def get_counts(post_id):
+	"""Return the current counters of a post as a dict."""
+	counts = PostAnalytics.objects.filter(post_id=post_id).values('views', 'likes', 'comment_count').first()
+	return counts or {'views': 0, 'likes': 0, 'comment_count': 0}
+
+
+def joined_counters(*fields):
+	"""
+	`values()` names reading the given counters of a post through the join to its
+	analytics row; none with a separate analytics database (see `fill_counters`).
+	"""
+	return [] if routers.analytics_separate() else [f'post_analytics__{field}' for field in fields]
+
+
+def fill_counters(row, *fields):
+	"""Complete a post read with `values('pk', *joined_counters(*fields))` with its counters."""
+	if routers.analytics_separate():
+		counts = get_counts(row['pk'])
+		row.update({f'post_analytics__{field}': counts[field] for field in fields})
+	return row
+
+
+def reconcile(batch_size=500):
+	"""
+	Repair counter drift in bulk.
+	Creates missing analytics rows, then recomputes likes and comment counts from the
+	PostLike and Comment tables and rewrites only the rows that disagree.
+	Returns a tuple of (rows created, rows repaired).
+	"""
+	# SQLite gives no isolation between a cursor and writes on the same connection,
+	# so the (small) lists of ids to fix are read up front before writing.
+	if routers.analytics_separate():
+		stored = set(PostAnalytics.objects.values_list('post_id', flat=True))
+		missing = [pk for pk in Post.objects.values_list('pk', flat=True).iterator() if pk not in stored]
+	else:
+		missing = list(Post.objects.filter(post_analytics__isnull=True).values_list('pk', flat=True))
+	for start in range(0, len(missing), batch_size):
+		ensure_analytics(missing[start:start + batch_size])
+
+	fixes = [
+		PostAnalytics(pk=pk, post_id=post_id, likes=likes, comment_count=comments)
+		for pk, post_id, likes, comments in _drifted()
+	]
+	PostAnalytics.objects.bulk_update(fixes, ['likes', 'comment_count'], batch_size=batch_size)
+	trending.refresh([fix.post_id for fix in fixes], batch_size=batch_size)
+	return len(missing), len(fixes)
+
+
+def _drifted():
+	"""(pk, post id, actual likes, actual comments) of the analytics rows that disagree."""
+	if routers.analytics_separate():
+		# The counts are read from the main database and compared in Python
+		actual_likes = dict(PostLike.objects.order_by().values('post').annotate(
+			total=Count('pk')).values_list('post', 'total'))
+		actual_comments = dict(Comment.objects.order_by().values('post').annotate(
+			total=Count('pk')).values_list('post', 'total'))
+		rows = PostAnalytics.objects.values_list('pk', 'post_id', 'likes', 'comment_count')
+		return [
+			(pk, post_id, actual_likes.get(post_id, 0), actual_comments.get(post_id, 0))
+			for pk, post_id, likes, comments in rows.iterator()
+			if (likes, comments) != (actual_likes.get(post_id, 0), actual_comments.get(post_id, 0))
+		]
+
+	like_count = PostLike.objects.filter(post=OuterRef('post_id')).order_by().values('post').annotate(
+		total=Count('pk')).values('total')
+	comment_count = Comment.objects.filter(post=OuterRef('post_id')).order_by().values('post').annotate(
+		total=Count('pk')).values('total')
+	drifted = PostAnalytics.objects.annotate(
+		actual_likes=Coalesce(Subquery(like_count), 0),
+		actual_comments=Coalesce(Subquery(comment_count), 0),
+	).exclude(likes=F('actual_likes'), comment_count=F('actual_comments'))
+	return list(drifted.values_list('pk', 'post_id', 'actual_likes', 'actual_comments'))
@@ -0,0 +1,92 @@
+"""
+Bulk export of posts, comments, analytics and follows as NDJSON.
+
+Every line is one `{"model": ..., "data": {...}}` record. Tables are read with
+`.values().iterator(chunk_size=...)`, so rows are fetched from the cursor in chunks and
+never accumulated: memory use is constant whatever the size of the tables. Foreign keys
+are exported as natural keys (usernames, slugs) so a dump can be imported elsewhere.
+Analytics stored in a separate database get the slugs of their posts a chunk at a time.
+"""
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from . import routers
+from .models import Comment, Follow, Post, PostAnalytics
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _posts():
+	return Post.objects.order_by('pk').values(
+		'id', 'title', 'slug', 'content', 'image', 'is_published', 'created_at', 'updated_at',
+		author_username=F('author__username'), category_name=F('category__name'),
+	)
+
+
+def _comments():
+	# Replies refer to their parent by its `id` in the dump; ordered by id, parents come first
+	return Comment.objects.order_by('pk').values(
+		'id', 'parent', 'path', 'content', 'created_at',
+		post_slug=F('post__slug'), author_username=F('author__username'),
+	)
+
+
+def _analytics():
+	if routers.analytics_separate():
+		return PostAnalytics.objects.order_by('pk').values('views', 'likes', 'comment_count', 'post_id')
+	return PostAnalytics.objects.order_by('pk').values('views', 'likes', 'comment_count', post_slug=F('post__slug'))
+
+
+def _follows():
+	return Follow.objects.order_by('pk').values(
+		'created_at', follower_username=F('follower__username'), followed_username=F('followed__username'),
+	)
+
+
+# Exported models, in dependency order
+SOURCES = {
+	'post': _posts,
+	'comment': _comments,
+	'analytics': _analytics,
+	'follow': _follows,
+}
+
+
+def iter_records(models=None, chunk_size=DEFAULT_CHUNK_SIZE):
+	"""Yield (model, row) pairs for the requested models (all of them by default)."""
+	for model in models or SOURCES:
+		rows = SOURCES[model]().iterator(chunk_size=chunk_size)
+		if model == 'analytics' and routers.analytics_separate():
+			rows = _with_post_slugs(rows, chunk_size)
+		for row in rows:
+			yield model, row
+
+
+def _with_post_slugs(rows, chunk_size):
+	"""Replace the `post_id` of analytics rows with the slug of the post (skipping deleted posts)."""
+	while chunk := list(islice(rows, chunk_size)):
+		slugs = dict(Post.objects.filter(pk__in=[row['post_id'] for row in chunk]).values_list('pk', 'slug'))
+		for row in chunk:
+			post_id = row.pop('post_id')
+			if post_id in slugs:
+				yield {**row, 'post_slug': slugs[post_id]}
+
+
+def iter_ndjson(models=None, chunk_size=DEFAULT_CHUNK_SIZE):
+	"""Yield the export as NDJSON lines."""
+	encoder = DjangoJSONEncoder(separators=(',', ':'))
+	for model, row in iter_records(models, chunk_size):
+		yield encoder.encode({'model': model, 'data': row}) + '\n'
+
+
+def parse_models(value):
+	"""Parse a comma-separated list of model names, raising ValueError on unknown ones."""
+	if not value:
+		return list(SOURCES)
+	models = [name.strip() for name in value.split(',') if name.strip()]
+	unknown = [name for name in models if name not in SOURCES]
+	if unknown:
+		raise ValueError(f"Unknown models: {', '.join(unknown)}. Choose from: {', '.join(SOURCES)}.")
+	return models
@@ -0,0 +1,71 @@
+"""
+Password hashers whose cost is tuned per deployment.
+
+The scrypt and argon2 hashers below read their parameters from a named profile
+(PASSWORD_HASH_PROFILE) with optional per-algorithm overrides (PASSWORD_HASH_PARAMETERS),
+instead of Django's fixed class attributes. The first entry of PASSWORD_HASHERS hashes
+new passwords; the others only verify existing hashes. When the parameters change,
+Django re-hashes a user's password at their next successful login (`must_update`), so
+a profile can be raised or lowered without invalidating anyone's password.
+
+`manage.py benchmark_auth` measures what a profile costs on the current machine.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# Parameters per profile; "interactive" costs roughly 20-50 ms per login on a current core
+PROFILES = {
+	'interactive': {
+		'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 1},
+		'argon2': {'time_cost': 2, 'memory_cost': 19 * 1024, 'parallelism': 1},
+	},
+	'moderate': {
+		'scrypt': {'work_factor': 2 ** 15, 'block_size': 8, 'parallelism': 1},
+		'argon2': {'time_cost': 3, 'memory_cost': 64 * 1024, 'parallelism': 1},
+	},
+	'sensitive': {
+		'scrypt': {'work_factor': 2 ** 17, 'block_size': 8, 'parallelism': 1},
+		'argon2': {'time_cost': 4, 'memory_cost': 256 * 1024, 'parallelism': 2},
+	},
+}
+
+
+def parameters(algorithm):
+	"""The parameters of `algorithm` for the configured profile and overrides."""
+	profile = PROFILES[getattr(settings, 'PASSWORD_HASH_PROFILE', 'interactive')]
+	return {**profile[algorithm], **getattr(settings, 'PASSWORD_HASH_PARAMETERS', {}).get(algorithm, {})}
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+	"""Django's scrypt hasher with the work factor, block size and parallelism of the profile."""
+	# scrypt needs 128 * n * r bytes; OpenSSL's default limit (32 MiB) is too low for the
+	# larger profiles. This is only a ceiling, and also covers verifying older hashes.
+	maxmem = 512 * 1024 * 1024
+
+	@property
+	def work_factor(self):
+		return parameters('scrypt')['work_factor']
+
+	@property
+	def block_size(self):
+		return parameters('scrypt')['block_size']
+
+	@property
+	def parallelism(self):
+		return parameters('scrypt')['parallelism']
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+	"""Django's argon2 hasher (requires argon2-cffi) with the cost parameters of the profile."""
+
+	@property
+	def time_cost(self):
+		return parameters('argon2')['time_cost']
+
+	@property
+	def memory_cost(self):
+		return parameters('argon2')['memory_cost']
+
+	@property
+	def parallelism(self):
+		return parameters('argon2')['parallelism']
@@ -0,0 +1,165 @@
+"""
+Resized variants of uploaded images (post images and profile pictures).
+
+When an image is saved, its variants are generated after the transaction commits, on a
+small thread pool so the upload request does not wait for resizing. Each variant is
+written next to the original as WebP and JPEG ("post_images/a.png" gets
+"post_images/a_medium.webp", "post_images/a_medium.jpg", ...) and the generated names
+are recorded on the row in a JSON column, keyed by the source file they were made from:
+
+	{"source": "post_images/a.png", "medium": {"webp": "...", "jpeg": "..."}, ...}
+
+A row whose recorded source differs from its current file simply has no variants yet,
+and clients fall back to the original.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> bounding box; images are never upscaled
+POST_IMAGE_VARIANTS = {'thumb': (320, 320), 'medium': (800, 800), 'large': (1600, 1600)}
+PROFILE_PICTURE_VARIANTS = {'thumb': (96, 96), 'medium': (256, 256)}
+
+FORMATS = {'webp': ('WEBP', '.webp'), 'jpeg': ('JPEG', '.jpg')}
+
+# Sent with `pk`, `field` and `variants` once a row's variants have been recorded
+variants_generated = Signal()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+	global _executor
+	with _executor_lock:
+		if _executor is None:
+			_executor = ThreadPoolExecutor(
+				max_workers=getattr(settings, 'IMAGE_WORKERS', 2), thread_name_prefix='image-variants'
+			)
+		return _executor
+
+
+def variant_name(source, variant, fmt):
+	root, _ = os.path.splitext(source)
+	return f'{root}_{variant}{FORMATS[fmt][1]}'
+
+
+def variant_names(source, sizes):
+	"""Every name a variant of `source` may have been written under."""
+	return [variant_name(source, variant, fmt) for variant in sizes for fmt in FORMATS]
+
+
+def recorded_names(variants):
+	"""The variant file names listed in a variants mapping."""
+	return [name for variant, names in (variants or {}).items() if variant != 'source' for name in names.values()]
+
+
+def needs_variants(file, variants):
+	"""Return True if `file` is set and `variants` were not generated from it."""
+	return bool(file) and (variants or {}).get('source') != file.name
+
+
+def schedule(instance, file_field, variants_field, sizes):
+	"""
+	Generate the variants of `instance.<file_field>` once the current transaction commits,
+	in the background unless IMAGE_PROCESSING_ASYNC is False.
+	"""
+	# Proxies (Admin, User) are processed as their concrete model, which receivers listen to
+	label = instance._meta.concrete_model._meta.label
+	pk = instance.pk
+	source = getattr(instance, file_field).name
+
+	def _submit():
+		if getattr(settings, 'IMAGE_PROCESSING_ASYNC', True):
+			_get_executor().submit(_run, label, pk, file_field, variants_field, source, sizes)
+		else:
+			_run(label, pk, file_field, variants_field, source, sizes)
+
+	transaction.on_commit(_submit)
+
+
+def _run(label, pk, file_field, variants_field, source, sizes):
+	try:
+		process(apps.get_model(label), pk, file_field, variants_field, source, sizes)
+	except Exception:
+		logger.exception("Generating variants of %s failed", source)
+	finally:
+		if threading.current_thread() is not threading.main_thread():
+			connections.close_all()  # Including the analytics and replica aliases
+
+
+def process(model, pk, file_field, variants_field, source, sizes):
+	"""Write the variants of `source` and record them on the row, if it still uses that file."""
+	storage = model._meta.get_field(file_field).storage
+	with storage.open(source, 'rb') as original:
+		image = Image.open(original)
+		image = ImageOps.exif_transpose(image)
+		image.load()
+
+	variants = {'source': source}
+	for variant, size in sizes.items():
+		resized = image.copy()
+		resized.thumbnail(size, Image.LANCZOS)
+		variants[variant] = {fmt: _save(storage, resized, variant_name(source, variant, fmt), fmt) for fmt in FORMATS}
+
+	# Only record the variants if the file was not replaced in the meantime. The row's
+	# representation changes, so `auto_now` timestamps (used as HTTP validators) move too.
+	values = {variants_field: variants}
+	for field in model._meta.concrete_fields:
+		if getattr(field, 'auto_now', False):
+			values[field.name] = timezone.now()
+	updated = model.objects.filter(pk=pk, **{file_field: source}).update(**values)
+	if not updated:
+		from .media_gc import enqueue
+		enqueue(recorded_names(variants))
+		return None
+	variants_generated.send(sender=model, pk=pk, field=file_field, variants=variants)
+	return variants
+
+
+def _save(storage, image, name, fmt):
+	pil_format = FORMATS[fmt][0]
+	if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+		# JPEG has no alpha channel: flatten onto white
+		background = Image.new('RGB', image.size, (255, 255, 255))
+		rgba = image.convert('RGBA')
+		background.paste(rgba, mask=rgba.getchannel('A'))
+		image = background
+	elif pil_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+		image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+	buffer = BytesIO()
+	image.save(buffer, pil_format, quality=getattr(settings, 'IMAGE_VARIANT_QUALITY', 80), optimize=True)
+	if storage.exists(name):
+		storage.delete(name)
+	return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def variant_urls(file, variants, request=None):
+	"""
+	Return {variant: {format: url}} for the variants generated from the current `file`,
+	or an empty dict while they are pending.
+	"""
+	if needs_variants(file, variants) or not file:
+		return {}
+	urls = {}
+	for variant, names in variants.items():
+		if variant == 'source':
+			continue
+		urls[variant] = {}
+		for fmt, name in names.items():
+			url = file.storage.url(name)
+			urls[variant][fmt] = request.build_absolute_uri(url) if request is not None else url
+	return urls
@@ -0,0 +1,346 @@
+"""
+Bulk import of posts, comments and analytics from NDJSON.
+
+Reads the format written by blog_app.exporting (one `{"model": ..., "data": {...}}`
+record per line) in batches. Each batch resolves its authors, categories and post slugs
+with one query per kind, inserts rows with `bulk_create` and runs in its own transaction.
+Replies are attached to the comment their `parent` names by its id in the dump, which
+comes earlier in it (the export is ordered by id), and their thread paths are rebuilt.
+Model signals do not fire for bulk inserts, so the side effects they normally handle
+(analytics rows, comment counters, the search index, the home timelines of the authors'
+followers and the response cache) are applied here per batch.
+"""
+import json
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from . import caching, counters, search, timeline, trending
+from .models import Category, Comment, Post, PostAnalytics
+
+CustomUser = get_user_model()
+
+DEFAULT_BATCH_SIZE = 1000
+# Errors kept in the report; further ones are only counted
+MAX_REPORTED_ERRORS = 100
+# Room is left for a "-<n>" suffix within the 50 characters of Post.slug
+SLUG_BASE_LENGTH = 40
+
+
+class RecordError(Exception):
+	"""A record that cannot be imported; the message is reported with its line number."""
+
+
+class Importer:
+	"""
+	Imports NDJSON records in batches.
+	With `skip_existing`, posts whose slug is already taken are skipped (along with their
+	comments and analytics) so that re-running an import is idempotent; otherwise they
+	are imported under a new unique slug.
+	"""
+
+	def __init__(self, batch_size=DEFAULT_BATCH_SIZE, skip_existing=False):
+		self.batch_size = batch_size
+		self.skip_existing = skip_existing
+		self.report = {'posts': 0, 'comments': 0, 'analytics': 0, 'categories': 0, 'skipped': 0, 'errors': []}
+		self.error_count = 0
+		# In-memory lookups shared by every batch
+		self.authors = {}
+		self.categories = {}
+		# Slug in the source -> id of the post it was imported as (None when skipped)
+		self.imported_slugs = {}
+		# Comment id in the source -> (id, path, depth) it was imported as (None when skipped)
+		self.imported_comments = {}
+		self.touched_slugs = set()
+
+	def run(self, lines):
+		"""Import an iterable of NDJSON lines (str or bytes) and return the report."""
+		batch = []
+		for number, line in enumerate(lines, start=1):
+			if isinstance(line, bytes):
+				line = line.decode('utf-8')
+			if not line.strip():
+				continue
+			try:
+				record = json.loads(line)
+				batch.append((number, record['model'], record['data']))
+			except (ValueError, KeyError, TypeError):
+				self.error(number, "Invalid record.")
+				continue
+			if len(batch) >= self.batch_size:
+				self.import_batch(batch)
+				batch = []
+		if batch:
+			self.import_batch(batch)
+
+		caching.bump(caching.POST_LIST, *[caching.post_scope(slug) for slug in self.touched_slugs])
+		self.report['errors_total'] = self.error_count
+		return self.report
+
+	def error(self, number, message):
+		self.error_count += 1
+		if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+			self.report['errors'].append({'line': number, 'error': message})
+
+	def import_batch(self, batch):
+		by_model = defaultdict(list)
+		for number, model, data in batch:
+			by_model[model].append((number, data))
+		for model in set(by_model) - {'post', 'comment', 'analytics'}:
+			self.report['skipped'] += len(by_model[model])
+
+		with transaction.atomic():
+			# Posts first: comments and analytics of the same batch may refer to them
+			self.resolve_authors(by_model['post'] + by_model['comment'])
+			self.import_posts(by_model['post'])
+			post_ids = self.resolve_posts(by_model['analytics'] + by_model['comment'])
+			self.import_analytics(by_model['analytics'], post_ids)
+			self.import_comments(by_model['comment'], post_ids)
+
+	def resolve_authors(self, records):
+		usernames = {data.get('author_username') for _, data in records} - set(self.authors) - {None}
+		if usernames:
+			self.authors.update(CustomUser.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+	def resolve_categories(self, records):
+		names = {data.get('category_name') for _, data in records} - set(self.categories) - {None, ''}
+		if not names:
+			return
+		self.categories.update(Category.objects.filter(name__in=names).values_list('name', 'id'))
+		for name in names - set(self.categories):
+			# New categories are rare, so they go through the model (which fills the slug)
+			self.categories[name] = Category.objects.create(name=name).pk
+			self.report['categories'] += 1
+
+	def resolve_posts(self, records):
+		"""Map the post slugs referenced by `records` to post ids (None for skipped posts)."""
+		slugs = {data.get('post_slug') for _, data in records} - {None}
+		post_ids = {slug: self.imported_slugs[slug] for slug in slugs if slug in self.imported_slugs}
+		post_ids.update(Post.objects.filter(slug__in=slugs - set(post_ids)).values_list('slug', 'id'))
+		return post_ids
+
+	def import_posts(self, records):
+		self.resolve_categories(records)
+		rows = []
+		for number, data in records:
+			try:
+				rows.append((number, data, self.build_post(data)))
+			except RecordError as exc:
+				# Keep comments of a rejected post from matching another post with its slug
+				self.imported_slugs[source_slug(data)] = None
+				self.error(number, str(exc))
+		if not rows:
+			return
+
+		if self.skip_existing:
+			source_slugs = [source_slug(data) for _, data, _ in rows]
+			taken = set(Post.objects.filter(slug__in=source_slugs).values_list('slug', flat=True))
+			for _, data, _ in rows:
+				if source_slug(data) in taken:
+					self.imported_slugs[source_slug(data)] = None
+					self.report['skipped'] += 1
+			rows = [row for row in rows if source_slug(row[1]) not in taken]
+		bases = [source_slug(data) for _, data, _ in rows]
+		for (_, _, post), slug in zip(rows, unique_slugs(bases)):
+			post.slug = slug
+
+		posts = Post.objects.bulk_create([post for _, _, post in rows])
+		self.restore_timestamps(Post, [(post, data) for (_, data, _), post in zip(rows, posts)])
+		counters.ensure_analytics([post.pk for post in posts])
+		search.index_posts((post.pk, post.title, post.content) for post in posts)
+		timeline.fan_out_many([post for post in posts if post.is_published])
+
+		for (_, data, _), post in zip(rows, posts):
+			self.imported_slugs[source_slug(data)] = post.pk
+		self.report['posts'] += len(posts)
+
+	def build_post(self, data):
+		if not data.get('title') and not data.get('content'):
+			raise RecordError("A post must have either content or a title.")
+		author_id = self.authors.get(data.get('author_username'))
+		if author_id is None:
+			raise RecordError(f"Unknown author '{data.get('author_username')}'.")
+		return Post(
+			title=data.get('title') or '',
+			content=data.get('content') or '',
+			author_id=author_id,
+			category_id=self.categories.get(data.get('category_name')),
+			is_published=bool(data.get('is_published')),
+			image=data.get('image') or None,
+		)
+
+	def import_analytics(self, records, post_ids):
+		values = {}
+		for number, data in records:
+			post_id = post_ids.get(data.get('post_slug'))
+			if data.get('post_slug') not in post_ids:
+				self.error(number, f"Unknown post '{data.get('post_slug')}'.")
+			elif post_id is None:
+				self.report['skipped'] += 1
+			else:
+				values[post_id] = data
+		if not values:
+			return
+
+		# Likes and comment counts are derived from PostLike / Comment rows (see
+		# counters.reconcile), so only the view count is taken from the dump
+		rows = list(PostAnalytics.objects.filter(post_id__in=values).only('id', 'post_id', 'views'))
+		for row in rows:
+			row.views = int(values[row.post_id].get('views') or 0)
+		PostAnalytics.objects.bulk_update(rows, ['views'], batch_size=250)
+		trending.refresh(values)
+		self.touched_slugs.update(data['post_slug'] for data in values.values())
+		self.report['analytics'] += len(rows)
+
+	def import_comments(self, records, post_ids):
+		rows = []
+		pending = set()  # Source ids of the comments of this batch accepted so far
+		for number, data in records:
+			post_id = post_ids.get(data.get('post_slug'))
+			author_id = self.authors.get(data.get('author_username'))
+			parent = data.get('parent')
+			if data.get('post_slug') not in post_ids:
+				self.error(number, f"Unknown post '{data.get('post_slug')}'.")
+			elif post_id is None or (parent not in pending and parent in self.imported_comments
+					and self.imported_comments[parent] is None):
+				# On a skipped post, or a reply to a skipped comment: its replies are skipped too
+				if data.get('id') is not None:
+					self.imported_comments[data['id']] = None
+				self.report['skipped'] += 1
+			elif parent is not None and parent not in pending and parent not in self.imported_comments:
+				self.error(number, f"Unknown parent comment {parent}.")
+			elif author_id is None:
+				self.error(number, f"Unknown author '{data.get('author_username')}'.")
+			elif not data.get('content'):
+				self.error(number, "A comment must have content.")
+			else:
+				rows.append((number, data, Comment(post_id=post_id, author_id=author_id, content=data['content'])))
+				pending.add(data.get('id'))
+
+		# Inserted one thread level at a time: the paths of replies start with the path of
+		# their parent, known once it is inserted
+		imported = []
+		while rows:
+			ready = [data.get('parent') is None or data['parent'] in self.imported_comments for _, data, _ in rows]
+			level = [row for row, is_ready in zip(rows, ready) if is_ready]
+			rows = [row for row, is_ready in zip(rows, ready) if not is_ready]
+			if not level:
+				# Replies to comments rejected above
+				for number, data, _ in rows:
+					self.error(number, f"Unknown parent comment {data['parent']}.")
+				break
+			inserts = []
+			for number, data, comment in level:
+				if data.get('parent') is not None:
+					comment.parent_id, parent_path, parent_depth = self.imported_comments[data['parent']]
+					comment.path, comment.depth = parent_path, parent_depth + 1
+					if comment.depth > Comment.MAX_DEPTH:
+						self.error(number, "The thread is nested too deeply.")
+						continue
+				inserts.append((data, comment))
+			Comment.objects.bulk_create([comment for _, comment in inserts])
+			for data, comment in inserts:
+				comment.path += Comment.path_segment(comment.pk)
+				if data.get('id') is not None:
+					self.imported_comments[data['id']] = (comment.pk, comment.path, comment.depth)
+			imported += inserts
+		if not imported:
+			return
+
+		comments = [comment for _, comment in imported]
+		self.restore_timestamps(Comment, [(comment, data) for data, comment in imported])
+		quote = connection.ops.quote_name
+		table = quote(Comment._meta.db_table)
+		replies = defaultdict(int)
+		for comment in comments:
+			if comment.parent_id:
+				replies[comment.parent_id] += 1
+		with connection.cursor() as cursor:
+			cursor.executemany(
+				f"UPDATE {table} SET {quote('path')} = %s WHERE {quote('id')} = %s",
+				[(comment.path, comment.pk) for comment in comments],
+			)
+			cursor.executemany(
+				f"UPDATE {table} SET {quote('reply_count')} = {quote('reply_count')} + %s WHERE {quote('id')} = %s",
+				[(count, parent_id) for parent_id, count in replies.items()],
+			)
+
+		added = defaultdict(int)
+		for comment in comments:
+			added[comment.post_id] += 1
+		counters.add_many('comment_count', added)
+		self.touched_slugs.update(data['post_slug'] for data, _ in imported)
+		self.report['comments'] += len(comments)
+
+	def restore_timestamps(self, model, pairs):
+		"""
+		Give imported rows the timestamps of the source: `auto_now(_add)` fields are always
+		set to the current time on insert, so they are rewritten afterwards with one
+		prepared UPDATE per row (executemany). The objects get the restored values too.
+		"""
+		fields = [
+			field for field in model._meta.concrete_fields
+			if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+		]
+		params = []
+		for obj, data in pairs:
+			values = [parse_datetime(data.get(field.name) or '') or getattr(obj, field.attname) for field in fields]
+			for field, value in zip(fields, values):
+				setattr(obj, field.attname, value)
+			if any(data.get(field.name) for field in fields):
+				params.append([
+					field.get_db_prep_save(value, connection) for field, value in zip(fields, values)
+				] + [obj.pk])
+		if not params:
+			return
+
+		quote = connection.ops.quote_name
+		assignments = ', '.join(f'{quote(field.column)} = %s' for field in fields)
+		with connection.cursor() as cursor:
+			cursor.executemany(
+				f"UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {quote(model._meta.pk.column)} = %s",
+				params,
+			)
+
+
+def source_slug(data):
+	"""The slug a post record is known by in its source."""
+	return data.get('slug') or slugify(data.get('title') or '') or 'post'
+
+
+def unique_slugs(bases):
+	"""
+	Return one slug per entry of `bases`, unused both in the database and within the list.
+	Colliding slugs get the next free "-<n>" suffix; the suffixes already taken are read
+	with range lookups on the slug index, one query per chunk of colliding bases.
+	"""
+	bases = [base[:SLUG_BASE_LENGTH].strip('-') or 'post' for base in bases]
+	taken = set(Post.objects.filter(slug__in=set(bases)).values_list('slug', flat=True))
+	seen = set()
+	colliding = set()
+	for base in bases:
+		if base in taken or base in seen:
+			colliding.add(base)
+		seen.add(base)
+
+	colliding = sorted(colliding)
+	for start in range(0, len(colliding), 100):
+		ranges = Q()
+		for base in colliding[start:start + 100]:
+			ranges |= Q(slug__gte=f'{base}-', slug__lt=f'{base}.')  # "." sorts right after "-"
+		taken.update(Post.objects.filter(ranges).values_list('slug', flat=True))
+
+	slugs = []
+	next_suffix = defaultdict(lambda: 2)
+	for base in bases:
+		slug = base
+		while slug in taken:
+			slug = f'{base}-{next_suffix[base]}'
+			next_suffix[base] += 1
+		taken.add(slug)
+		slugs.append(slug)
+	return slugs
@@ -0,0 +1,187 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+
+from blog_app import sqlite
+
+LAYOUTS = ('shared', 'split')
+
+
+class Command(BaseCommand):
+	help = (
+		"Measure a mixed workload on scratch SQLite files with the analytics counters in the same "
+		"file as the posts and comments (shared) or in a file of their own (split): counter "
+		"updates (views / likes), comments (insert, then the comment counter), post edits and "
+		"post reads (post plus counters). Reports the throughput and p99 latency of each and the "
+		"\"database is locked\" errors."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--counter-writers', type=int, default=16, help="Threads updating view / like counters.")
+		parser.add_argument('--comment-writers', type=int, default=2, help="Threads writing comments.")
+		parser.add_argument('--post-writers', type=int, default=2, help="Threads editing posts.")
+		parser.add_argument('--readers', type=int, default=4, help="Threads reading posts.")
+		parser.add_argument('--seconds', type=float, default=5, help="Duration of each measurement.")
+		parser.add_argument('--posts', type=int, default=1000, help="Posts the workload is spread over.")
+		parser.add_argument(
+			'--profile', choices=['stock', 'production'], default='production',
+			help="SQLite settings: stock, or the pragmas and BEGIN IMMEDIATE of blog_app.sqlite.",
+		)
+		parser.add_argument('--layout', choices=LAYOUTS, nargs='+', default=list(LAYOUTS))
+
+	def handle(self, *args, **options):
+		self.stdout.write(
+			f"{options['counter_writers']} counter writers, {options['comment_writers']} comment writers, "
+			f"{options['post_writers']} post writers, {options['readers']} readers, {options['profile']} "
+			f"profile, {options['seconds']:g} s per layout"
+		)
+		for layout in options['layout']:
+			directory = tempfile.mkdtemp(prefix='benchmark_analytics_db_')
+			try:
+				main = os.path.join(directory, 'main.sqlite3')
+				analytics = main if layout == 'shared' else os.path.join(directory, 'analytics.sqlite3')
+				done, latencies, locked = self.run(main, analytics, options)
+			finally:
+				shutil.rmtree(directory, ignore_errors=True)
+			self.stdout.write(f"  {layout} ({locked} lock errors)")
+			for kind in ('counter writes', 'comments', 'post edits', 'reads'):
+				timings = sorted(latencies[kind])
+				p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] if timings else 0
+				self.stdout.write(
+					f"    {kind:<15} {done[kind] / options['seconds']:9.1f}/s  p99 {p99 * 1000:8.1f} ms"
+				)
+
+	def connect(self, path, profile):
+		connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+		if profile == 'production':
+			for statement in sqlite.pragma_statements():
+				connection.execute(statement)
+		return connection
+
+	def create_tables(self, main, analytics, options):
+		posts = range(options['posts'])
+		connection = self.connect(main, options['profile'])
+		connection.executescript(
+			"CREATE TABLE posts (id INTEGER PRIMARY KEY, title TEXT NOT NULL, content TEXT NOT NULL);"
+			"CREATE TABLE comments (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, content TEXT NOT NULL);"
+			"CREATE INDEX comments_post ON comments (post_id);"
+		)
+		connection.executemany(
+			"INSERT INTO posts (id, title, content) VALUES (?, ?, ?)", [(i, f'Post {i}', 'x' * 2000) for i in posts]
+		)
+		connection.close()
+		connection = self.connect(analytics, options['profile'])
+		connection.execute(
+			"CREATE TABLE analytics (post_id INTEGER PRIMARY KEY, views INTEGER NOT NULL DEFAULT 0,"
+			" likes INTEGER NOT NULL DEFAULT 0, comment_count INTEGER NOT NULL DEFAULT 0)"
+		)
+		connection.executemany("INSERT INTO analytics (post_id) VALUES (?)", [(i,) for i in posts])
+		connection.close()
+
+	def run(self, main, analytics, options):
+		"""(operations per kind, latencies per kind, lock errors) of one measurement."""
+		self.create_tables(main, analytics, options)
+		profile = options['profile']
+		posts = options['posts']
+		shared = analytics == main
+		begin = 'BEGIN' if profile == 'stock' else 'BEGIN IMMEDIATE'
+		done = Counter()
+		latencies = defaultdict(list)
+		lock = threading.Lock()
+		stop = threading.Event()
+
+		def write(connection, *statements):
+			"""Run (sql, params) pairs in one write transaction."""
+			connection.execute(begin)
+			try:
+				for sql, params in statements:
+					connection.execute(sql, params)
+				connection.execute('COMMIT')
+			except BaseException:
+				if connection.in_transaction:
+					connection.execute('ROLLBACK')
+				raise
+
+		def counter_write(connections, sequence):
+			column = 'likes' if sequence % 10 == 0 else 'views'
+			write(connections['analytics'], (
+				f"UPDATE analytics SET {column} = {column} + 1 WHERE post_id = ?", (sequence % posts,)
+			))
+
+		def comment(connections, sequence):
+			insert = ("INSERT INTO comments (post_id, content) VALUES (?, ?)", (sequence % posts, 'A comment'))
+			count = ("UPDATE analytics SET comment_count = comment_count + 1 WHERE post_id = ?", (sequence % posts,))
+			# As in the app: in the same transaction when shared, once it commits when split
+			if shared:
+				write(connections['main'], insert, count)
+			else:
+				write(connections['main'], insert)
+				write(connections['analytics'], count)
+
+		def post_edit(connections, sequence):
+			write(connections['main'], ("UPDATE posts SET title = ? WHERE id = ?", (f'Edit {sequence}', sequence % posts)))
+
+		def read(connections, sequence):
+			if shared:
+				connections['main'].execute(
+					"SELECT p.id, p.title, p.content, a.views, a.likes, a.comment_count FROM posts p"
+					" LEFT JOIN analytics a ON a.post_id = p.id WHERE p.id = ?", (sequence % posts,)
+				).fetchone()
+			else:
+				connections['main'].execute(
+					"SELECT id, title, content FROM posts WHERE id = ?", (sequence % posts,)
+				).fetchone()
+				connections['analytics'].execute(
+					"SELECT views, likes, comment_count FROM analytics WHERE post_id = ?", (sequence % posts,)
+				).fetchone()
+
+		locked = 0
+
+		def worker(kind, operation, number):
+			nonlocal locked
+			connections = {'main': self.connect(main, profile)}
+			connections['analytics'] = connections['main'] if shared else self.connect(analytics, profile)
+			timings = []
+			errors = 0
+			sequence = number
+			while not stop.is_set():
+				sequence += 7919  # Spreads the threads over the posts
+				start = time.perf_counter()
+				try:
+					operation(connections, sequence)
+				except sqlite3.OperationalError as exc:
+					if 'locked' not in str(exc) and 'busy' not in str(exc):
+						raise
+					errors += 1
+					continue
+				timings.append(time.perf_counter() - start)
+			for connection in set(connections.values()):
+				connection.close()
+			with lock:
+				done[kind] += len(timings)
+				latencies[kind] += timings
+				locked += errors
+
+		threads = [
+			threading.Thread(target=worker, args=(kind, operation, number))
+			for kind, operation, count in [
+				('counter writes', counter_write, options['counter_writers']),
+				('comments', comment, options['comment_writers']),
+				('post edits', post_edit, options['post_writers']),
+				('reads', read, options['readers']),
+			]
+			for number in range(count)
+		]
+		for thread in threads:
+			thread.start()
+		time.sleep(options['seconds'])
+		stop.set()
+		for thread in threads:
+			thread.join()
+		return done, latencies, locked
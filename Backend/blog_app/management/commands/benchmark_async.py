@@ -0,0 +1,145 @@
+import asyncio
+import queue
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from blog_app.models import Post
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the throughput of the sync read endpoints under WSGI (a pool of worker threads) "
+		"with the sync and async endpoints under ASGI, using in-process clients against the "
+		"current database."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--concurrency', type=int, nargs='+', default=[50, 200, 1000],
+			help="Concurrent connections to measure.",
+		)
+		parser.add_argument('--requests', type=int, default=2000, help="Requests per measurement.")
+		parser.add_argument(
+			'--threads', type=int, default=32,
+			help="WSGI worker threads; connections beyond this many wait for a free thread.",
+		)
+		parser.add_argument(
+			'--endpoint', choices=['posts', 'post', 'profile'], default='posts',
+			help="posts: the post list, post: one post, profile: a profile with its three counts.",
+		)
+
+	def handle(self, *args, **options):
+		user = get_user_model().objects.order_by('pk').first()
+		post = Post.objects.order_by('-pk').first()
+		if user is None or post is None:
+			raise CommandError("The benchmark needs at least one user and one post in the database.")
+		# Requests are authenticated, so both stacks bypass the anonymous response cache
+		headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+		sync_paths, async_path = {
+			'posts': (['/api/posts/?pagination=cursor'], '/api/async/posts/'),
+			'post': ([f'/api/posts/{post.slug}/'], f'/api/async/posts/{post.slug}/'),
+			'profile': (
+				[f'/api/users/{user.username}/profile/', f'/api/user/{user.pk}/followers-count/',
+				 f'/api/user/{user.pk}/following-count/', f'/api/user/{user.pk}/post-count/'],
+				f'/api/async/users/{user.username}/profile/',
+			),
+		}[options['endpoint']]
+		# A response is one request of the async API, or all the requests of the sync API
+		# that it replaces
+		total = options['requests']
+		self.stdout.write(f"{options['endpoint']}: {total} responses, {options['threads']} WSGI threads")
+		# The in-process clients address the server as "testserver"
+		with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+			for concurrency in options['concurrency']:
+				threads = options['threads']
+				self.report('WSGI sync', concurrency, self.run_wsgi(sync_paths, headers, total, concurrency, threads))
+				self.report('ASGI sync', concurrency, asyncio.run(self.run_asgi(sync_paths, headers, total, concurrency)))
+				self.report('ASGI async', concurrency, asyncio.run(self.run_asgi([async_path], headers, total, concurrency)))
+
+	def run_wsgi(self, paths, headers, total, concurrency, threads):
+		"""
+		(elapsed seconds, latencies) of `total` responses for `concurrency` connections served
+		by a fixed pool of threads. Each connection sends its next request as soon as it gets
+		a response; requests wait in a queue until a thread is free, as in a threaded server.
+		"""
+		pending = queue.Queue()
+		issued = min(concurrency, total)
+		for _ in range(issued):
+			pending.put(time.perf_counter())
+		lock = threading.Lock()
+		latencies = []
+		errors = []
+
+		def stop():
+			for _ in range(threads):
+				pending.put(None)
+
+		def worker():
+			nonlocal issued
+			client = Client()
+			try:
+				while (queued_at := pending.get()) is not None:
+					for path in paths:
+						self.check_status(client.get(path, headers=headers), path)
+					finished = time.perf_counter()
+					with lock:
+						latencies.append(finished - queued_at)
+						if issued < total:
+							issued += 1
+							pending.put(finished)
+						elif len(latencies) == total:
+							stop()
+			except CommandError as exc:
+				errors.append(exc)
+				stop()
+			finally:
+				connections.close_all()
+
+		workers = [threading.Thread(target=worker) for _ in range(threads)]
+		start = time.perf_counter()
+		for thread in workers:
+			thread.start()
+		for thread in workers:
+			thread.join()
+		if errors:
+			raise errors[0]
+		return time.perf_counter() - start, latencies
+
+	async def run_asgi(self, paths, headers, total, concurrency):
+		"""(elapsed seconds, latencies) of `total` responses from `concurrency` connections."""
+		remaining = iter(range(total))
+		latencies = []
+
+		async def connection():
+			client = AsyncClient()
+			while next(remaining, None) is not None:
+				start = time.perf_counter()
+				for path in paths:
+					self.check_status(await client.get(path, headers=headers), path)
+				latencies.append(time.perf_counter() - start)
+
+		start = time.perf_counter()
+		await asyncio.gather(*(connection() for _ in range(concurrency)))
+		return time.perf_counter() - start, latencies
+
+	def check_status(self, response, path):
+		if response.status_code != 200:
+			raise CommandError(f"GET {path} returned {response.status_code}.")
+
+	def report(self, name, concurrency, result):
+		elapsed, latencies = result
+		latencies = sorted(latencies)
+		p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+		self.stdout.write(
+			f"  {name:<11} {concurrency:>5} connections  {len(latencies) / elapsed:8.1f} responses/s  "
+			f"p50 {statistics.median(latencies) * 1000:8.1f} ms  p99 {p99 * 1000:8.1f} ms"
+		)
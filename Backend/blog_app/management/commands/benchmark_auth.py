@@ -0,0 +1,140 @@
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hashers
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from blog_app import authentication, benchmarking, hashers
+from blog_app.models import CustomUser
+from blog_app.serializers import LoginSerializer
+
+
+class Command(BaseCommand):
+	help = (
+		"Measure password hashing, token issuance and full logins per second on one core, "
+		"to tune PASSWORD_HASH_PROFILE for this machine, and the throughput (requests/s) of "
+		"the post list (`GET /api/posts/`) signed in with a bearer token, with the user read "
+		"from the database on each request and served by CachedJWTAuthentication from the "
+		"cache. The list runs on synthetic posts in scratch databases, with the configured "
+		"cache when it is shared between processes (REDIS_URL, CACHE_DIRECTORY) and files in "
+		"a temporary directory otherwise. The real databases and cache are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--iterations', type=int, default=10, help="Repetitions per measurement.")
+		parser.add_argument(
+			'--target-ms', type=float,
+			help="Also report the largest scrypt work factor whose hash takes at most this long.",
+		)
+		parser.add_argument('--requests', type=int, default=1000, help="Post list requests per measurement.")
+		parser.add_argument('--posts', type=int, default=1000, help="Synthetic posts of the post list.")
+
+	def handle(self, *args, **options):
+		iterations = options['iterations']
+		self.stdout.write(f"Profile: {getattr(settings, 'PASSWORD_HASH_PROFILE', 'interactive')}")
+
+		for hasher in get_hashers():
+			try:
+				hasher.encode('benchmark-password', hasher.salt())
+			except (ValueError, ImportError) as exc:
+				self.stdout.write(f"  {hasher.algorithm:<16} unavailable ({exc})")
+				continue
+			seconds = self.measure(lambda: hasher.encode('benchmark-password', hasher.salt()), iterations)
+			self.report(hasher.algorithm, seconds, "hashes")
+
+		user = get_user_model()(pk=0, username='benchmark')
+		self.report('token issuance', self.measure(lambda: str(RefreshToken.for_user(user).access_token), 1000), "tokens")
+
+		# A full login against a temporary user, rolled back afterwards
+		with transaction.atomic():
+			get_user_model().objects.create_user('benchmark-login', password='benchmark-password')
+			login = lambda: LoginSerializer(data={'username': 'benchmark-login', 'password': 'benchmark-password'}).is_valid(
+				raise_exception=True)
+			login()  # A first login may re-hash the password
+			self.report('login', self.measure(login, iterations), "logins")
+			transaction.set_rollback(True)
+
+		if options['target_ms']:
+			self.suggest_work_factor(options['target_ms'] / 1000, iterations)
+
+		self.list_throughput(options['requests'], options['posts'])
+
+	def measure(self, function, iterations):
+		"""Average seconds per call."""
+		start = time.perf_counter()
+		for _ in range(iterations):
+			function()
+		return (time.perf_counter() - start) / iterations
+
+	def report(self, name, seconds, unit):
+		self.stdout.write(f"  {name:<16} {seconds * 1000:9.2f} ms  {1 / seconds:10.1f} {unit}/s per core")
+
+	def list_throughput(self, requests, posts):
+		location = None
+		shared_cache = settings.CACHES[DEFAULT_CACHE_ALIAS]
+		if isinstance(caches[DEFAULT_CACHE_ALIAS], authentication.LOCAL_CACHES):
+			location = tempfile.mkdtemp(prefix='benchmark_auth_')
+			shared_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+		# Prefixed, so that the scratch users never shadow the real ones in a configured cache
+		shared_cache = {**shared_cache, 'KEY_PREFIX': 'benchmark-auth'}
+		try:
+			with benchmarking.scratch_databases(), override_settings(CACHES={DEFAULT_CACHE_ALIAS: shared_cache}):
+				self.stdout.write(f"Post list with a bearer token ({settings.CACHES['default']['BACKEND']}):")
+				reader = CustomUser.objects.get(pk=benchmarking.create_users(1, prefix='reader')[0])
+				benchmarking.create_posts(posts, benchmarking.create_users(10, prefix='author'))
+				client = APIClient()
+				client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(reader).access_token}')
+				self.stdout.write(f"  {'':<22} {'queries':>8} {'requests/s':>11}")
+				for name, timeout in (('user read per request', 0), ('user cached', 60)):
+					with override_settings(AUTH_USER_CACHE_TIMEOUT=timeout):
+						cache.delete(authentication.user_cache_key(reader.pk))
+						self.get(client)  # Warms the cache up
+						with CaptureQueriesContext(connection) as queries:
+							self.get(client)
+						# Counted now: with DEBUG, the queries log keeps rotating meanwhile
+						query_count = len(queries)
+						started = time.perf_counter()
+						for _ in range(requests):
+							self.get(client)
+						elapsed = time.perf_counter() - started
+					self.stdout.write(f"  {name:<22} {query_count:>8} {requests / elapsed:>11.0f}")
+				cache.delete(authentication.user_cache_key(reader.pk))
+		finally:
+			if location:
+				shutil.rmtree(location, ignore_errors=True)
+
+	def get(self, client):
+		response = client.get('/api/posts/')
+		assert response.status_code == 200, response.content
+
+	def suggest_work_factor(self, target, iterations):
+		hasher = hashers.ScryptPasswordHasher()
+		params = hashers.parameters('scrypt')
+		best = None
+		work_factor = 2 ** 12
+		while work_factor <= 2 ** 20:
+			seconds = self.measure(
+				lambda: hasher.encode('benchmark-password', hasher.salt(), n=work_factor, r=params['block_size'],
+				                      p=params['parallelism']),
+				max(iterations // 2, 1),
+			)
+			if seconds > target:
+				break
+			best = (work_factor, seconds)
+			work_factor *= 2
+		if best is None:
+			self.stdout.write(self.style.WARNING(f"Even a work factor of 2 ** 12 takes longer than {target * 1000:.0f} ms."))
+		else:
+			self.stdout.write(self.style.SUCCESS(
+				f"Largest scrypt work factor within {target * 1000:.0f} ms: 2 ** {best[0].bit_length() - 1} "
+				f"({best[1] * 1000:.1f} ms). Set PASSWORD_HASH_PARAMETERS = {{'scrypt': {{'work_factor': {best[0]}}}}}."
+			))
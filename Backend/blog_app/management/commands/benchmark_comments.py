@@ -0,0 +1,125 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from blog_app import benchmarking
+from blog_app.models import Comment, Post
+from blog_app.pagination import KeysetPagination
+from blog_app.serializers import CommentSerializer
+
+
+class OriginalCommentsListView(APIView):
+	"""`comments_list` before threading: every comment of the post, author and post read per comment."""
+
+	def get(self, request, slug=None):
+		post = get_object_or_404(Post, slug=slug)
+		comments = Comment.objects.select_related(None).filter(post=post)
+		serializer = CommentSerializer(comments, many=True)
+		return Response(serializer.data, status=200)
+
+
+class Command(BaseCommand):
+	help = (
+		"Measure the latency and query count of reading the comments of a post with --comments "
+		"synthetic comments (--replies of them replies to a top-level comment) in scratch "
+		"databases: the whole flat list serialized at once (as before threading), against a "
+		"page of top-level comments with their first replies (`GET /api/posts/<slug>/comments_list/`), "
+		"first and deep in the thread, and a page of replies (`GET /api/comments/<id>/replies/`). "
+		"The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--comments', type=int, default=10_000, help="Comments on the post.")
+		parser.add_argument('--replies', type=float, default=0.5, help="Share of the comments that are replies.")
+		parser.add_argument('--commenters', type=int, default=500, help="Users writing the comments.")
+		parser.add_argument('--page-size', type=int, default=20)
+		parser.add_argument('--repeat', type=int, default=3, help="Repetitions per measurement (median).")
+
+	def handle(self, *args, **options):
+		size = options['page_size']
+		with benchmarking.scratch_databases():
+			self.stdout.write(f"Creating a post with {options['comments']} comments...")
+			commenters = benchmarking.create_users(options['commenters'], prefix='commenter')
+			benchmarking.create_posts(1, commenters[:1], published=1)
+			post = Post.objects.get()
+			self.create_comments(post, commenters, options['comments'], options['replies'])
+			with connection.cursor() as cursor:
+				cursor.execute('ANALYZE')  # As migration 0020 does
+
+			client = benchmarking.client()
+			threads = Comment.objects.filter(post=post, depth=0).order_by('-created_at', '-id')
+			deep = threads[size * 50] if threads.count() > size * 50 else threads.last()
+			cursor = KeysetPagination().encode_cursor(deep)
+			busiest = Comment.objects.filter(post=post, depth=0).order_by('-reply_count').first()
+			original = OriginalCommentsListView.as_view()
+			scenarios = {
+				'flat list (before)': lambda: original(APIRequestFactory().get('/'), slug=post.slug),
+				'page of threads': lambda: self.get(client, f'/api/posts/{post.slug}/comments_list/?page_size={size}'),
+				'page of threads, deep': lambda: self.get(
+					client, f'/api/posts/{post.slug}/comments_list/?page_size={size}&cursor={cursor}'
+				),
+				'page of replies': lambda: self.get(client, f'/api/comments/{busiest.pk}/replies/?page_size={size}'),
+			}
+			self.stdout.write(f"{'':<24} {'queries':>8} {'ms':>9}")
+			for name, function in scenarios.items():
+				query_count = self.count_queries(function)
+				seconds = benchmarking.measure(function, options['repeat'])
+				self.stdout.write(f"{name:<24} {query_count:>8} {seconds * 1000:>9.2f}")
+
+	def create_comments(self, post, commenters, count, reply_share):
+		"""Top-level comments, then replies to random ones, in bulk with their paths."""
+		rng = random.Random(0)
+		replies = int(count * reply_share)
+		now = timezone.now()
+		with transaction.atomic():
+			top_level = Comment.objects.bulk_create(
+				(Comment(post=post, author_id=rng.choice(commenters), content=benchmarking.text(rng, 30))
+				 for _ in range(count - replies)),
+				batch_size=benchmarking.BATCH_SIZE,
+			)
+			comments = list(top_level)
+			for comment in top_level:
+				comment.path = Comment.path_segment(comment.pk)
+			reply_rows = [
+				Comment(
+					post=post, author_id=rng.choice(commenters), content=benchmarking.text(rng, 30),
+					parent=rng.choice(top_level), depth=1,
+				)
+				for _ in range(replies)
+			]
+			comments += Comment.objects.bulk_create(reply_rows, batch_size=benchmarking.BATCH_SIZE)
+			for reply in reply_rows:
+				reply.path = reply.parent.path + Comment.path_segment(reply.pk)
+			# created_at is auto_now_add, so the order is spread afterwards: a comment per second
+			for number, comment in enumerate(comments):
+				comment.created_at = now - (len(comments) - number) * timedelta(seconds=1)
+			Comment.objects.bulk_update(comments, ['path', 'created_at'], batch_size=500)
+			reply_counts = Comment.objects.filter(post=post, depth=1).values('parent').annotate(total=Count('pk'))
+			counts = {row['parent']: row['total'] for row in reply_counts}
+			for comment in top_level:
+				comment.reply_count = counts.get(comment.pk, 0)
+			Comment.objects.bulk_update(top_level, ['reply_count'], batch_size=500)
+
+	def count_queries(self, function):
+		# Counted as they run: the flat list overflows the (9000 long) queries log of DEBUG
+		queries = []
+
+		def count(execute, sql, params, many, context):
+			queries.append(sql)
+			return execute(sql, params, many, context)
+
+		with connection.execute_wrapper(count):
+			function()
+		return len(queries)
+
+	def get(self, client, path):
+		response = client.get(path)
+		assert response.status_code == 200, response.content
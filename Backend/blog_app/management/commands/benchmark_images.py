@@ -0,0 +1,100 @@
+import shutil
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image
+
+from blog_app import benchmarking, images
+from blog_app.models import CustomUser, Post
+
+
+class Command(BaseCommand):
+	help = (
+		"Measure the latency of a post upload with an image (`POST /api/posts/`) with its "
+		"variants generated inline and on the thread pool (IMAGE_PROCESSING_ASYNC), and the "
+		"image bytes a client downloads for one page of the feed: the originals, against each "
+		"variant. Runs on synthetic photos in scratch databases and a temporary MEDIA_ROOT. The "
+		"real databases and media are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--uploads', type=int, default=20, help="Uploads per measurement.")
+		parser.add_argument('--width', type=int, default=3000, help="Width of the uploaded photos.")
+		parser.add_argument('--height', type=int, default=2000, help="Height of the uploaded photos.")
+		parser.add_argument('--page-size', type=int, default=20, help="Posts on the feed page.")
+
+	def handle(self, *args, **options):
+		media = tempfile.mkdtemp(prefix='benchmark_images_')
+		try:
+			with benchmarking.scratch_databases(), override_settings(MEDIA_ROOT=media):
+				photo = self.photo(options['width'], options['height'])
+				author = CustomUser.objects.get(pk=benchmarking.create_users(1, prefix='author')[0])
+				client = benchmarking.client(author)
+				self.stdout.write(
+					f"Uploading {options['uploads']} photos of {options['width']}x{options['height']} "
+					f"({len(photo) / 1024:.0f} KiB)"
+				)
+				self.stdout.write(f"{'':<24} {'median ms':>10} {'max ms':>9}")
+				for name, asynchronous in (('variants inline', False), ('variants in background', True)):
+					timings = []
+					with override_settings(IMAGE_PROCESSING_ASYNC=asynchronous):
+						for number in range(options['uploads']):
+							upload = SimpleUploadedFile(f'photo{number}.jpg', photo, content_type='image/jpeg')
+							started = time.perf_counter()
+							response = client.post(
+								'/api/posts/', {'title': f'{name} {number}', 'content': 'A photo', 'image': upload},
+								format='multipart',
+							)
+							timings.append(time.perf_counter() - started)
+							assert response.status_code == 201, response.content
+					self.stdout.write(
+						f"{name:<24} {statistics.median(timings) * 1000:>10.1f} {max(timings) * 1000:>9.1f}"
+					)
+				self.wait_for_variants()
+				self.feed_page_bytes(client, options['page_size'])
+		finally:
+			shutil.rmtree(media, ignore_errors=True)
+
+	def photo(self, width, height):
+		"""A JPEG that compresses like a photo: gradients under some noise."""
+		size = (width, height)
+		image = Image.merge('RGB', [
+			Image.linear_gradient('L').resize(size),
+			Image.effect_noise(size, 40),
+			Image.radial_gradient('L').resize(size),
+		])
+		buffer = BytesIO()
+		image.save(buffer, 'JPEG', quality=90)
+		return buffer.getvalue()
+
+	def wait_for_variants(self, timeout=300):
+		started = time.perf_counter()
+		while time.perf_counter() - started < timeout:
+			pending = [post for post in Post.objects.only('image', 'image_variants') if images.needs_variants(
+				post.image, post.image_variants
+			)]
+			if not pending:
+				self.stdout.write(f"The background variants were ready {time.perf_counter() - started:.1f}s later.")
+				return
+			time.sleep(0.1)
+		raise RuntimeError(f"{len(pending)} posts still have no variants after {timeout}s.")
+
+	def feed_page_bytes(self, client, page_size):
+		response = client.get('/api/posts/', {'page_size': page_size})
+		assert response.status_code == 200, response.content
+		posts = Post.objects.in_bulk([row['id'] for row in response.json()['results']])
+		storage = Post._meta.get_field('image').storage
+		totals = {'original': sum(post.image.size for post in posts.values())}
+		for post in posts.values():
+			for variant, names in post.image_variants.items():
+				if variant != 'source':
+					for fmt, name in names.items():
+						totals[f'{variant} {fmt}'] = totals.get(f'{variant} {fmt}', 0) + storage.size(name)
+		self.stdout.write(f"Image bytes of a feed page of {len(posts)} posts:")
+		for name, size in totals.items():
+			self.stdout.write(f"  {name:<14} {size / 1024:>9.0f} KiB")
@@ -0,0 +1,86 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from blog_app import benchmarking, importing
+from blog_app.models import Category, CustomUser, PostAnalytics
+from blog_app.serializers import CommentSerializer, PostSerializer
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the import rate (rows/s) of an NDJSON dump of posts, comments and analytics "
+		"through blog_app.importing (batched bulk inserts) and through the per-row path of the "
+		"API (PostSerializer / CommentSerializer and Model.save, with their signals), each into "
+		"its own scratch databases. The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--posts', type=int, default=2000, help="Posts in the dump.")
+		parser.add_argument('--comments', type=int, default=3, help="Comments per post.")
+		parser.add_argument('--authors', type=int, default=100, help="Authors of the posts and comments.")
+		parser.add_argument('--categories', type=int, default=10)
+		parser.add_argument('--batch-size', type=int, default=importing.DEFAULT_BATCH_SIZE)
+
+	def handle(self, *args, **options):
+		lines = list(self.dump(options))
+		self.stdout.write(f"{'path':<12} {'rows':>8} {'seconds':>9} {'rows/s':>9}")
+		for name, function in (
+			('per row', self.import_per_row),
+			('bulk', lambda lines: importing.Importer(batch_size=options['batch_size']).run(lines)),
+		):
+			with benchmarking.scratch_databases():
+				benchmarking.create_users(options['authors'], prefix='author')
+				Category.objects.bulk_create(Category(name=f'category{number}') for number in range(options['categories']))
+				started = time.perf_counter()
+				function(lines)
+				elapsed = time.perf_counter() - started
+				self.stdout.write(f"{name:<12} {len(lines):>8} {elapsed:>9.1f} {len(lines) / elapsed:>9.0f}")
+
+	def dump(self, options):
+		"""NDJSON lines in the format of blog_app.exporting."""
+		rng = random.Random(0)
+		for number in range(options['posts']):
+			slug = f'post-{number}'
+			records = [('post', {
+				'title': f"{benchmarking.text(rng, 6)} {number}",
+				'slug': slug,
+				'content': benchmarking.text(rng, 60),
+				'is_published': True,
+				'author_username': f"author{rng.randrange(options['authors'])}",
+				'category_name': f"category{rng.randrange(options['categories'])}",
+			})]
+			records += [('comment', {
+				'content': benchmarking.text(rng, 15),
+				'post_slug': slug,
+				'author_username': f"author{rng.randrange(options['authors'])}",
+			}) for _ in range(options['comments'])]
+			records.append(('analytics', {'views': rng.randrange(1000), 'post_slug': slug}))
+			for model, data in records:
+				yield json.dumps({'model': model, 'data': data}) + '\n'
+
+	def import_per_row(self, lines):
+		"""One record at a time, as clients of the API had to: look-ups, serializer, save()."""
+		posts = {}
+		for line in lines:
+			record = json.loads(line)
+			data = record['data']
+			if record['model'] == 'post':
+				author = CustomUser.objects.get(username=data['author_username'])
+				category = Category.objects.get(name=data['category_name'])
+				serializer = PostSerializer(data={
+					'title': data['title'], 'content': data['content'], 'is_published': data['is_published'],
+					'category': category.pk,
+				})
+				serializer.is_valid(raise_exception=True)
+				posts[data['slug']] = serializer.save(author=author)
+			elif record['model'] == 'comment':
+				author = CustomUser.objects.get(username=data['author_username'])
+				serializer = CommentSerializer(data={'post': posts[data['post_slug']].slug, 'content': data['content']})
+				serializer.is_valid(raise_exception=True)
+				serializer.save(author=author)
+			else:
+				PostAnalytics.objects.filter(post=posts[data['post_slug']]).update(views=F('views') + data['views'])
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from blog_app import benchmarking
+from blog_app.models import CustomUser, Post
+from blog_app.pagination import KeysetPagination
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the latency of deep pages of the post list (`GET /api/posts/`) in page-number "
+		"mode (`?page=`, OFFSET plus COUNT) and cursor mode (`?cursor=`), on synthetic posts in "
+		"scratch databases. The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--posts', type=int, default=100_000, help="Synthetic posts to create.")
+		parser.add_argument('--page-size', type=int, default=10)
+		parser.add_argument(
+			'--pages', type=int, nargs='+', default=[1, 10, 100, 1000, 5000],
+			help="Page numbers to measure (pages past the end are skipped).",
+		)
+		parser.add_argument('--repeat', type=int, default=5, help="Requests per measurement (median).")
+		parser.add_argument(
+			'--anonymous', action='store_true',
+			help="Request as an anonymous visitor (with the response cache off) rather than a signed-in reader.",
+		)
+
+	def handle(self, *args, **options):
+		size = options['page_size']
+		with benchmarking.scratch_databases(), override_settings(RESPONSE_CACHE_TIMEOUT=0):
+			self.stdout.write(f"Creating {options['posts']} posts...")
+			benchmarking.create_posts(options['posts'], benchmarking.create_users(100))
+			feed = Post.objects.order_by('-created_at', '-pk')
+			if options['anonymous']:
+				client = benchmarking.client()
+			else:
+				# A reader with no posts of their own, who sees the published posts
+				client = benchmarking.client(CustomUser.objects.get(pk=benchmarking.create_users(1, prefix='reader')[0]))
+				feed = feed.filter(is_published=True)
+			paginator = KeysetPagination()
+
+			self.stdout.write(f"{'page':>6} {'page number ms':>15} {'cursor ms':>10} {'cursor + count ms':>18}")
+			for number in options['pages']:
+				# The cursor of page `number` is the last post of the page before it
+				previous = feed[(number - 1) * size - 1] if number > 1 else None
+				if feed[(number - 1) * size:].first() is None:
+					continue
+				params = {'page_size': size}
+				cursor = {**params, 'cursor': paginator.encode_cursor(previous)} if previous else {
+					**params, 'pagination': 'cursor'}
+				timings = [
+					benchmarking.measure(lambda: self.get(client, query), options['repeat'])
+					for query in ({**params, 'page': number}, cursor, {**cursor, 'with_count': 'true'})
+				]
+				self.stdout.write(
+					f"{number:>6} {timings[0] * 1000:>15.1f} {timings[1] * 1000:>10.1f} {timings[2] * 1000:>18.1f}"
+				)
+
+	def get(self, client, params):
+		response = client.get('/api/posts/', params)
+		assert response.status_code == 200, response.content
@@ -0,0 +1,78 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+
+from blog_app import benchmarking, rollups
+from blog_app.buffers import RollupBuffer
+from blog_app.models import AnalyticsRollup, Post
+
+
+class Command(BaseCommand):
+	help = (
+		"Measure the ingest throughput (events/s) of the analytics time series on synthetic "
+		"view / like / comment events in scratch databases: written one event at a time, and "
+		"summed by a RollupBuffer flushed every --batch events (as the flush thread does every "
+		"ROLLUP_BUFFER_MAX_PENDING events), then the compaction of the hourly rows past the "
+		"retention into daily ones. The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--events', type=int, default=200_000, help="Events ingested through the buffer.")
+		parser.add_argument(
+			'--unbuffered-events', type=int, default=2000, help="Events ingested one at a time (a slower path)."
+		)
+		parser.add_argument('--posts', type=int, default=1000, help="Posts the events are spread over.")
+		parser.add_argument('--days', type=int, default=30, help="Days the events are spread over.")
+		parser.add_argument('--batch', type=int, default=1000, help="Events per buffered flush.")
+
+	def handle(self, *args, **options):
+		# A long interval keeps the buffer's own thread idle: the flushes are made here
+		with benchmarking.scratch_databases(), override_settings(
+			ROLLUP_BUFFER_FLUSH_INTERVAL=3600, ROLLUP_BUFFER_MAX_PENDING=10 ** 9
+		):
+			self.stdout.write(f"Creating {options['posts']} posts...")
+			benchmarking.create_posts(options['posts'], benchmarking.create_users(100))
+			post_ids = list(Post.objects.values_list('pk', flat=True))
+			buffer = RollupBuffer()
+
+			self.stdout.write(f"{'':<24} {'events':>8} {'rows':>8} {'seconds':>9} {'events/s':>10}")
+			for name, count, batch in (
+				('one event per write', options['unbuffered_events'], 1),
+				('buffered', options['events'], options['batch']),
+			):
+				AnalyticsRollup.objects.all().delete()
+				events = self.events(count, post_ids, options['days'])
+				started = time.perf_counter()
+				for number, (post_id, event, at) in enumerate(events, start=1):
+					buffer.record(post_id, event, at=at)
+					if number % batch == 0:
+						buffer.flush()
+				buffer.flush()
+				elapsed = time.perf_counter() - started
+				self.stdout.write(
+					f"{name:<24} {count:>8} {AnalyticsRollup.objects.count():>8} {elapsed:>9.2f} {count / elapsed:>10.0f}"
+				)
+
+			hourly = AnalyticsRollup.objects.filter(period=rollups.HOUR).count()
+			started = time.perf_counter()
+			days, removed = rollups.compact()
+			elapsed = time.perf_counter() - started
+			self.stdout.write(
+				f"Compacted {removed} hourly rows of {days} days into "
+				f"{AnalyticsRollup.objects.filter(period=rollups.DAY).count()} daily rows in {elapsed:.2f}s "
+				f"({removed / elapsed if elapsed else 0:.0f} rows/s, {hourly - removed} hourly rows kept)."
+			)
+
+	def events(self, count, post_ids, days):
+		"""(post id, event, time) triples over the last `days` days, mostly views, in time order."""
+		rng = random.Random(0)
+		now = timezone.now()
+		step = timedelta(days=days) / count
+		return [
+			(rng.choice(post_ids), rng.choices(rollups.EVENTS, weights=(90, 8, 2))[0], now - step * (count - number))
+			for number in range(count)
+		]
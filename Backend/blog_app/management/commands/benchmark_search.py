@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_app import benchmarking, search
+from blog_app.models import Post
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the latency of a `?q=` post search (count plus the first page) before and after "
+		"the full-text index: `title__icontains` against the FTS5 index, on synthetic posts in "
+		"scratch databases. The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--posts', type=int, default=100_000, help="Synthetic posts to create.")
+		parser.add_argument('--authors', type=int, default=1000, help="Authors the posts are spread over.")
+		rare, other = benchmarking.WORDS[1000], benchmarking.WORDS[2000]
+		parser.add_argument(
+			'--query', nargs='+', default=['python', rare, rare[:3], f'python {other}'],
+			help="Searches to measure (by default a common word, a rare one, a prefix, two words).",
+		)
+		parser.add_argument('--repeat', type=int, default=5, help="Repetitions per measurement (median).")
+
+	def handle(self, *args, **options):
+		with benchmarking.scratch_databases():
+			if not search.is_available():
+				raise CommandError("This SQLite build has no FTS5, so there is no index to compare with.")
+			self.stdout.write(f"Creating {options['posts']} posts...")
+			author_ids = benchmarking.create_users(options['authors'], prefix='author')
+			benchmarking.create_posts(options['posts'], author_ids)
+			search.rebuild()
+			author_id = author_ids[0]
+
+			self.stdout.write(
+				f"{'query':<16} {'old matches':>11} {'old ms':>9} {'matches':>8} {'new ms':>9} {'one author ms':>14}"
+			)
+			for query in options['query']:
+				feed = Post.objects.feed()
+				old = feed.filter(title__icontains=query)
+				new = search.filter_queryset(feed, query)
+				by_author = search.filter_queryset(feed.filter(author_id=author_id), query)
+				timings = [benchmarking.measure(lambda: self.page(qs), options['repeat']) for qs in (old, new, by_author)]
+				self.stdout.write(
+					f"{query:<16} {old.count():>11} {timings[0] * 1000:>9.1f} {new.count():>8} "
+					f"{timings[1] * 1000:>9.1f} {timings[2] * 1000:>14.1f}"
+				)
+
+	def page(self, queryset):
+		"""What a page-number paginated `?q=` request reads: the count and the first page."""
+		queryset.count()
+		list(queryset[:10])
@@ -0,0 +1,159 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+
+from blog_app import sqlite
+
+MODES = ('stock', 'production', 'single-writer')
+
+
+class Command(BaseCommand):
+	help = (
+		"Measure committed writes per second and the rate of \"database is locked\" errors of "
+		"concurrent like-style writes (check, insert, counter update) with concurrent readers, "
+		"on a scratch SQLite file: with stock settings, with the production pragmas and "
+		"BEGIN IMMEDIATE, and with counter updates sent to a single batching writer."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--writers', type=int, default=16, help="Concurrent writing threads.")
+		parser.add_argument('--readers', type=int, default=4, help="Concurrent reading threads.")
+		parser.add_argument('--seconds', type=float, default=5, help="Duration of each measurement.")
+		parser.add_argument('--posts', type=int, default=100, help="Posts the writes are spread over.")
+		parser.add_argument('--mode', choices=MODES, nargs='+', default=list(MODES))
+
+	def handle(self, *args, **options):
+		self.stdout.write(
+			f"{options['writers']} writers, {options['readers']} readers, {options['seconds']:g} s per mode"
+		)
+		for mode in options['mode']:
+			directory = tempfile.mkdtemp(prefix='benchmark_sqlite_')
+			try:
+				stats = self.run(os.path.join(directory, 'benchmark.sqlite3'), mode, options)
+			finally:
+				shutil.rmtree(directory, ignore_errors=True)
+			attempts = stats['writes'] + stats['locked']
+			self.stdout.write(
+				f"  {mode:<14} {stats['writes'] / options['seconds']:9.1f} writes/s  "
+				f"{stats['reads'] / options['seconds']:9.1f} reads/s  "
+				f"{stats['locked']:6d} lock errors ({stats['locked'] / max(attempts, 1):6.1%})"
+			)
+
+	def connect(self, path, mode):
+		connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+		if mode != 'stock':
+			for statement in sqlite.pragma_statements():
+				connection.execute(statement)
+		return connection
+
+	def run(self, path, mode, options):
+		setup = self.connect(path, mode)
+		setup.executescript(
+			"CREATE TABLE counters (post_id INTEGER PRIMARY KEY, likes INTEGER NOT NULL DEFAULT 0);"
+			"CREATE TABLE likes (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, user_id INTEGER NOT NULL,"
+			" UNIQUE (post_id, user_id));"
+		)
+		setup.executemany("INSERT INTO counters (post_id) VALUES (?)", [(i,) for i in range(options['posts'])])
+		setup.close()
+
+		stats = Counter()
+		stats_lock = threading.Lock()
+		stop = threading.Event()
+		writers_done = threading.Event()
+		queued = defaultdict(int)
+		queue_lock = threading.Lock()
+		begin = 'BEGIN' if mode == 'stock' else 'BEGIN IMMEDIATE'
+
+		def writer(number):
+			connection = self.connect(path, mode)
+			writes = locked = 0
+			sequence = 0
+			while not stop.is_set():
+				post_id = sequence % options['posts']
+				user_id = number * 10 ** 9 + sequence
+				sequence += 1
+				try:
+					connection.execute(begin)
+					connection.execute("SELECT 1 FROM likes WHERE post_id = ? AND user_id = ?", (post_id, user_id))
+					connection.execute("INSERT INTO likes (post_id, user_id) VALUES (?, ?)", (post_id, user_id))
+					if mode != 'single-writer':
+						connection.execute("UPDATE counters SET likes = likes + 1 WHERE post_id = ?", (post_id,))
+					connection.execute('COMMIT')
+				except sqlite3.OperationalError as exc:
+					if 'locked' not in str(exc) and 'busy' not in str(exc):
+						raise
+					if connection.in_transaction:
+						connection.execute('ROLLBACK')
+					locked += 1
+					continue
+				if mode == 'single-writer':
+					with queue_lock:
+						queued[post_id] += 1
+				writes += 1
+			connection.close()
+			with stats_lock:
+				stats.update(writes=writes, locked=locked)
+
+		def counter_writer():
+			# Applies the queued counter updates in one transaction every 100 ms
+			connection = self.connect(path, mode)
+			while True:
+				finished = writers_done.wait(0.1)
+				with queue_lock:
+					batch = dict(queued)
+					queued.clear()
+				if batch:
+					connection.execute('BEGIN IMMEDIATE')
+					connection.executemany(
+						"UPDATE counters SET likes = likes + ? WHERE post_id = ?",
+						[(amount, post_id) for post_id, amount in batch.items()],
+					)
+					connection.execute('COMMIT')
+				if finished:
+					break
+			connection.close()
+
+		def reader():
+			connection = self.connect(path, mode)
+			reads = locked = 0
+			while not stop.is_set():
+				try:
+					connection.execute("SELECT post_id, likes FROM counters ORDER BY likes DESC LIMIT 10").fetchall()
+					reads += 1
+				except sqlite3.OperationalError:
+					locked += 1
+			connection.close()
+			with stats_lock:
+				stats.update(reads=reads, read_locked=locked)
+
+		threads = [threading.Thread(target=writer, args=(number,)) for number in range(options['writers'])]
+		threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+		counter_thread = threading.Thread(target=counter_writer)
+		if mode == 'single-writer':
+			counter_thread.start()
+		for thread in threads:
+			thread.start()
+		time.sleep(options['seconds'])
+		stop.set()
+		for thread in threads:
+			thread.join()
+		# The counter writer drains what the writers queued before they stopped
+		writers_done.set()
+		if mode == 'single-writer':
+			counter_thread.join()
+
+		# Every committed like must be counted exactly once
+		check = sqlite3.connect(path)
+		counted, liked = check.execute(
+			"SELECT (SELECT SUM(likes) FROM counters), (SELECT COUNT(*) FROM likes)"
+		).fetchone()
+		check.close()
+		if counted != liked:
+			self.stderr.write(f"  {mode}: counters sum to {counted} but {liked} likes were committed")
+		return stats
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from blog_app import benchmarking, timeline
+from blog_app.models import CustomUser, Follow, Post, TimelineEntry
+from blog_app.pagination import KeysetPagination
+
+
+class Command(BaseCommand):
+	help = (
+		"Measure the latency of a page of the home timeline (`GET /api/posts/following/`) of a "
+		"reader following --followed authors, on synthetic posts in scratch databases: joined "
+		"from the follows and posts on each request (fan-out on read) against "
+		"blog_app.timeline.page() reading the materialized entries, with the posts of "
+		"--celebrities of the followed authors left out of the fan-out and merged at read time, "
+		"alone and through the endpoint. The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--followed', type=int, default=1000, help="Authors the reader follows.")
+		parser.add_argument('--authors', type=int, default=2000, help="Authors in total.")
+		parser.add_argument('--posts', type=int, default=100_000, help="Synthetic posts to create.")
+		parser.add_argument('--celebrities', type=int, default=10, help="Followed authors that are not fanned out.")
+		parser.add_argument('--page-size', type=int, default=20)
+		parser.add_argument('--repeat', type=int, default=5, help="Repetitions per measurement (median).")
+
+	def handle(self, *args, **options):
+		size = options['page_size']
+		with benchmarking.scratch_databases():
+			self.stdout.write(f"Creating {options['posts']} posts by {options['authors']} authors...")
+			author_ids = benchmarking.create_users(options['authors'], prefix='author')
+			benchmarking.create_posts(options['posts'], author_ids)
+			reader = CustomUser.objects.get(pk=benchmarking.create_users(1, prefix='reader')[0])
+			followed = author_ids[:options['followed']]
+			self.materialize(reader, followed, set(followed[:options['celebrities']]))
+			with connection.cursor() as cursor:
+				cursor.execute('ANALYZE')  # As migration 0020 does
+			client = benchmarking.client(reader)
+
+			# The cursor of a page deep in the timeline
+			joined = Post.objects.feed().filter(author__followers__follower=reader, is_published__in=[True]).order_by(
+				'-created_at', '-id'
+			)
+			deep = joined[size * 50]
+			cursor = KeysetPagination().encode_cursor(deep)
+			self.stdout.write(
+				f"The reader follows {len(followed)} authors, {joined.count()} posts, "
+				f"{TimelineEntry.objects.filter(user=reader).count()} of them fanned out."
+			)
+
+			scenarios = {
+				'joined per request': lambda: list(joined[:size]),
+				'timeline.page()': lambda: timeline.page(reader, size=size),
+				'timeline.page(), deep': lambda: timeline.page(reader, (deep.created_at, deep.pk), size=size),
+				'endpoint': lambda: self.get(client, f'/api/posts/following/?page_size={size}'),
+				'endpoint, deep': lambda: self.get(client, f'/api/posts/following/?page_size={size}&cursor={cursor}'),
+			}
+			self.stdout.write(f"{'':<24} {'ms':>9}")
+			for name, function in scenarios.items():
+				seconds = benchmarking.measure(function, options['repeat'])
+				self.stdout.write(f"{name:<24} {seconds * 1000:>9.2f}")
+
+	def materialize(self, reader, followed, celebrities):
+		"""The follows and timeline entries the signals would have written, in bulk."""
+		with transaction.atomic():
+			Follow.objects.bulk_create(Follow(follower=reader, followed_id=author_id) for author_id in followed)
+			published = Post.objects.filter(is_published__in=[True])
+			published.exclude(author_id__in=celebrities).update(fanned_out=True)
+			posts = published.filter(author_id__in=set(followed) - celebrities).values_list('pk', 'author_id', 'created_at')
+			TimelineEntry.objects.bulk_create(
+				(
+					TimelineEntry(user=reader, post_id=pk, author_id=author_id, created_at=created_at)
+					for pk, author_id, created_at in posts.iterator(chunk_size=benchmarking.BATCH_SIZE)
+				),
+				batch_size=benchmarking.BATCH_SIZE,
+			)
+
+	def get(self, client, path):
+		response = client.get(path)
+		assert response.status_code == 200, response.content
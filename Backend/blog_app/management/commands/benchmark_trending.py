@@ -0,0 +1,74 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from blog_app import benchmarking, counters, routers, trending
+from blog_app.models import CustomUser, Post, PostAnalytics
+
+
+class Command(BaseCommand):
+	help = (
+		"Measure the latency of the top trending posts (`GET /api/posts/trending/`) on synthetic "
+		"posts with random engagement in scratch databases: ranking by a score computed for every "
+		"post on each request (a full sort), against trending.top() walking the trending_score "
+		"index, alone and through the endpoint, plus the cost of the incremental score update a "
+		"like makes. The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--posts', type=int, default=1_000_000, help="Synthetic posts to create.")
+		parser.add_argument('--authors', type=int, default=1000, help="Authors the posts are spread over.")
+		parser.add_argument('--limit', type=int, default=50, help="Posts in the ranking.")
+		parser.add_argument('--repeat', type=int, default=5, help="Repetitions per measurement (median).")
+
+	def handle(self, *args, **options):
+		limit = options['limit']
+		with benchmarking.scratch_databases(), override_settings(RESPONSE_CACHE_TIMEOUT=0):
+			self.stdout.write(f"Creating {options['posts']} posts...")
+			author_ids = benchmarking.create_users(options['authors'])
+			benchmarking.create_posts(options['posts'], author_ids)
+			self.create_analytics()
+			client = benchmarking.client(CustomUser.objects.get(pk=author_ids[0]))
+			post_id = Post.objects.order_by('-pk').values_list('pk', flat=True)[0]
+
+			scenarios = {}
+			if not routers.analytics_separate():
+				# The score of every published post computed (rather than read) and sorted on each request
+				sort_on_read = PostAnalytics.objects.filter(post__is_published__in=[True]).alias(
+					score=trending.score_expression()
+				).order_by('-score', '-post_id').values_list('post_id', flat=True)
+				scenarios['score computed per request'] = lambda: Post.objects.feed().in_bulk(list(sort_on_read[:limit]))
+			scenarios['trending.top()'] = lambda: trending.top(limit)
+			scenarios['endpoint'] = lambda: self.get(client, f'/api/posts/trending/?limit={limit}')
+			scenarios['score update of a like'] = lambda: counters.adjust_likes(post_id, 1)
+
+			self.stdout.write(f"{'':<28} {'ms':>9}")
+			for name, function in scenarios.items():
+				seconds = benchmarking.measure(function, options['repeat'])
+				self.stdout.write(f"{name:<28} {seconds * 1000:>9.2f}")
+
+	def create_analytics(self):
+		"""Analytics rows with long-tailed random counters and their scores."""
+		rng = random.Random(0)
+		posts = Post.objects.order_by('pk').values_list('pk', 'created_at')
+		with transaction.atomic(using=routers.analytics_database()):
+			last_pk = 0
+			while batch := list(posts.filter(pk__gt=last_pk)[:benchmarking.BATCH_SIZE]):
+				rows = []
+				for pk, created_at in batch:
+					views = int(rng.paretovariate(1.2)) - 1
+					likes = int(views * rng.random() * 0.1)
+					comments = int(views * rng.random() * 0.02)
+					offset = trending.offset(created_at)
+					rows.append(PostAnalytics(
+						post_id=pk, views=views, likes=likes, comment_count=comments, trending_offset=offset,
+						trending_score=trending.score(views, likes, comments, offset),
+					))
+				PostAnalytics.objects.bulk_create(rows)
+				last_pk = batch[-1][0]
+
+	def get(self, client, path):
+		response = client.get(path)
+		assert response.status_code == 200, response.content
@@ -0,0 +1,73 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog_app import benchmarking
+from blog_app.models import CustomUser, Follow
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare loading the counts of a user directory page, before (the list, then one "
+		"followers-count request per user) and after (`?include_counts=true`, or one "
+		"`user/stats/` request), and of a profile (three count requests or one stats request), "
+		"on synthetic users in scratch databases. The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--users', type=int, default=100, help="Users listed on the page.")
+		parser.add_argument('--follows', type=int, default=20, help="Average follows per user.")
+		parser.add_argument('--posts', type=int, default=5000, help="Synthetic posts spread over the users.")
+		parser.add_argument('--repeat', type=int, default=5, help="Repetitions per measurement (median).")
+
+	def handle(self, *args, **options):
+		with benchmarking.scratch_databases():
+			user_ids = benchmarking.create_users(options['users'])
+			rng = random.Random(0)
+			Follow.objects.bulk_create(
+				[
+					Follow(follower_id=follower, followed_id=followed)
+					for follower in user_ids
+					for followed in rng.sample(user_ids, min(options['follows'], len(user_ids)))
+					if followed != follower
+				],
+				batch_size=benchmarking.BATCH_SIZE,
+			)
+			benchmarking.create_posts(options['posts'], user_ids)
+			client = benchmarking.client(CustomUser.objects.get(pk=user_ids[0]))
+			page = f"/api/users-list/?page_size={options['users']}"
+			user_id = user_ids[0]
+
+			def fan_out():
+				ids = [row['id'] for row in self.get(client, page)['results']]
+				for listed in ids:
+					self.get(client, f'/api/user/{listed}/followers-count/')
+
+			def batched():
+				ids = [row['id'] for row in self.get(client, page)['results']]
+				self.get(client, f"/api/user/stats/?ids={','.join(map(str, ids))}")
+
+			scenarios = [
+				('directory page, one count request per user', 1 + options['users'], fan_out),
+				('directory page, include_counts', 1, lambda: self.get(client, f'{page}&include_counts=true')),
+				('directory page, then user/stats/', 2, batched),
+				('profile, three count requests', 3, lambda: [
+					self.get(client, f'/api/user/{user_id}/{metric}/')
+					for metric in ('followers-count', 'following-count', 'post-count')
+				]),
+				('profile, user/stats/', 1, lambda: self.get(client, f'/api/user/stats/?ids={user_id}')),
+			]
+			self.stdout.write(f"{'':<45} {'requests':>8} {'queries':>8} {'ms':>9}")
+			for name, requests, function in scenarios:
+				queries = []
+				# Not CaptureQueriesContext: the query log is reset at the start of every request
+				with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+					function()
+				seconds = benchmarking.measure(function, options['repeat'])
+				self.stdout.write(f"{name:<45} {requests:>8} {len(queries):>8} {seconds * 1000:>9.1f}")
+
+	def get(self, client, path):
+		response = client.get(path)
+		assert response.status_code == 200, response.content
+		return response.json()
@@ -0,0 +1,77 @@
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from blog_app import benchmarking
+from blog_app.models import CustomUser
+from blog_app.pagination import KeysetPagination
+from blog_app.serializers import UserProfileSerializer
+from blog_app.views import UserListView
+
+
+class OriginalUserListView(APIView):
+	"""The user list before pagination: every user, with the full profile serializer."""
+
+	def get(self, request):
+		users = CustomUser.objects.filter(is_user=True)
+		serializer = UserProfileSerializer(users, many=True)
+		return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the time, peak Python memory and response size of the user directory "
+		"(`GET /api/users-list/`) before pagination (every user, UserProfileSerializer) and "
+		"after (one page of UserListSerializer rows: the first, a deep one by page number and by "
+		"cursor, and a username prefix search), on synthetic users in scratch databases. The "
+		"real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--users', type=int, default=100_000, help="Synthetic users to create.")
+		parser.add_argument('--page-size', type=int, default=20)
+		parser.add_argument('--repeat', type=int, default=5, help="Requests per measurement (median).")
+
+	def handle(self, *args, **options):
+		size = options['page_size']
+		with benchmarking.scratch_databases():
+			self.stdout.write(f"Creating {options['users']} users...")
+			user_ids = benchmarking.create_users(options['users'])
+			viewer = CustomUser.objects.get(pk=user_ids[0])
+			# The cursor of the middle page is the last row of the page before it
+			middle = options['users'] // size // 2
+			directory = CustomUser.objects.filter(is_user=True).order_by('-created_at', '-pk')
+			previous = directory[middle * size - 1]
+			cursor = KeysetPagination().encode_cursor(previous)
+
+			scenarios = [
+				('all users (before)', OriginalUserListView.as_view(), {}),
+				('first page', UserListView.as_view(), {'page_size': size}),
+				(f'page {middle + 1}', UserListView.as_view(), {'page_size': size, 'page': middle + 1}),
+				(f'page {middle + 1} by cursor', UserListView.as_view(), {'page_size': size, 'cursor': cursor}),
+				('prefix search', UserListView.as_view(), {'page_size': size, 'search': 'user99'}),
+			]
+			self.stdout.write(f"{'':<24} {'rows':>7} {'ms':>9} {'peak MiB':>9} {'body KiB':>9}")
+			for name, view, params in scenarios:
+				def get():
+					request = APIRequestFactory().get('/api/users-list/', params)
+					force_authenticate(request, viewer)
+					response = view(request).render()
+					assert response.status_code == 200, response.content
+					return response
+
+				seconds = benchmarking.measure(get, options['repeat'])
+				tracemalloc.start()
+				response = get()
+				peak = tracemalloc.get_traced_memory()[1]
+				tracemalloc.stop()
+				data = response.data
+				rows = len(data['results'] if isinstance(data, dict) else data)
+				self.stdout.write(
+					f"{name:<24} {rows:>7} {seconds * 1000:>9.1f} {peak / 2 ** 20:>9.2f} "
+					f"{len(response.content) / 1024:>9.1f}"
+				)
@@ -0,0 +1,67 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog_app.sketches import ViewerSketch
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the viewer sketch of one post (VIEW_TRACKING_BACKEND='sketch') with its "
+		"viewed_users rows at several numbers of distinct viewers: storage (the serialized "
+		"sketch vs the join table and its indexes in a scratch SQLite database), error of the "
+		"unique-viewer estimate, Bloom filter false positives (new viewers taken for repeat "
+		"ones, so not counted) and time per recorded view."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--viewers', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+			help="Numbers of distinct viewers to measure.",
+		)
+		parser.add_argument('--probes', type=int, default=100_000, help="Unseen viewers probed for false positives.")
+
+	def handle(self, *args, **options):
+		self.stdout.write(
+			f"{'viewers':>10} {'sketch':>10} {'m2m rows':>10} {'estimate':>10} {'error':>8} "
+			f"{'missed':>8} {'false pos':>10} {'us/view':>8}"
+		)
+		for viewers in options['viewers']:
+			sketch = ViewerSketch()
+			missed = 0
+			start = time.perf_counter()
+			for user_id in range(viewers):
+				missed += not sketch.add(user_id)
+			per_view = (time.perf_counter() - start) / viewers
+			size = len(sketch.to_bytes())
+			estimate = ViewerSketch.from_bytes(sketch.to_bytes()).unique_count()
+			false_positives = sum(user_id in sketch for user_id in range(viewers, viewers + options['probes']))
+			self.stdout.write(
+				f"{viewers:>10} {self.size(size):>10} {self.size(self.m2m_size(viewers)):>10} {estimate:>10} "
+				f"{(estimate - viewers) / viewers:>8.2%} {missed / viewers:>8.3%} "
+				f"{false_positives / options['probes']:>10.3%} {per_view * 1e6:>8.1f}"
+			)
+
+	def m2m_size(self, viewers):
+		"""Bytes taken by `viewers` rows of the viewed_users table, with Django's indexes."""
+		connection = sqlite3.connect(':memory:')
+		connection.executescript(
+			"CREATE TABLE viewed_users (id INTEGER PRIMARY KEY, postanalytics_id INTEGER NOT NULL,"
+			" customuser_id INTEGER NOT NULL);"
+			"CREATE UNIQUE INDEX viewed_users_pair ON viewed_users (postanalytics_id, customuser_id);"
+			"CREATE INDEX viewed_users_user ON viewed_users (customuser_id);"
+		)
+		connection.executemany(
+			"INSERT INTO viewed_users (postanalytics_id, customuser_id) VALUES (1, ?)", ((i,) for i in range(viewers))
+		)
+		page_count, = connection.execute("PRAGMA page_count").fetchone()
+		page_size, = connection.execute("PRAGMA page_size").fetchone()
+		connection.close()
+		return page_count * page_size
+
+	def size(self, size):
+		for unit in ('B', 'KiB', 'MiB'):
+			if size < 1024 or unit == 'MiB':
+				return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+			size /= 1024
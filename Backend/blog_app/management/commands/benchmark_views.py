@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.shortcuts import get_object_or_404
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from blog_app import benchmarking
+from blog_app.buffers import rollup_buffer, view_buffer
+from blog_app.models import CustomUser, Post, PostAnalytics
+from blog_app.views import PostViewSet
+
+
+class OriginalIncrementViewsView(APIView):
+	"""`increment_views` before the view buffer: the analytics row read and written per view."""
+
+	def post(self, request, slug=None):
+		post = get_object_or_404(Post, slug=slug)
+		analytics, _ = PostAnalytics.objects.get_or_create(post=post)
+		if not analytics.viewed_users.filter(id=request.user.id).exists():
+			analytics.viewed_users.add(request.user)
+			analytics.views += 1
+			analytics.save()
+		return Response({"status": "View incremented", "views_count": analytics.views}, status=status.HTTP_200_OK)
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the throughput (requests/s) of `POST /api/posts/<slug>/increment_views/` "
+		"before the view buffer (a get_or_create, an exists(), an M2M insert and a row update "
+		"per view) and through blog_app.buffers.view_buffer, flushed every --batch views (as "
+		"the flush thread does every VIEW_BUFFER_MAX_PENDING views; the flushes are timed "
+		"too), on views of synthetic posts by signed-in readers in scratch databases. The real "
+		"databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--requests', type=int, default=5000, help="Views per measurement.")
+		parser.add_argument('--posts', type=int, default=1000, help="Posts the views are spread over.")
+		parser.add_argument('--readers', type=int, default=1000, help="Signed-in readers viewing the posts.")
+		parser.add_argument('--batch', type=int, default=1000, help="Views per buffered flush.")
+
+	def handle(self, *args, **options):
+		# A long interval keeps the buffers' own threads idle: the flushes are made here
+		with benchmarking.scratch_databases(), override_settings(
+			VIEW_BUFFER_FLUSH_INTERVAL=3600, VIEW_BUFFER_MAX_PENDING=10 ** 9,
+			ROLLUP_BUFFER_FLUSH_INTERVAL=3600, ROLLUP_BUFFER_MAX_PENDING=10 ** 9,
+		):
+			self.stdout.write(f"Creating {options['posts']} posts and {options['readers']} readers...")
+			benchmarking.create_posts(options['posts'], benchmarking.create_users(10, prefix='author'), published=1)
+			slugs = list(Post.objects.order_by('pk').values_list('slug', flat=True))
+			readers = list(CustomUser.objects.filter(pk__in=benchmarking.create_users(options['readers'])))
+
+			self.stdout.write(f"{'':<22} {'requests':>9} {'views':>7} {'seconds':>9} {'requests/s':>11}")
+			for name, view, batch in (
+				('one write per view', OriginalIncrementViewsView.as_view(), None),
+				('buffered', PostViewSet.as_view({'post': 'increment_views'}), options['batch']),
+			):
+				PostAnalytics.objects.all().delete()
+				PostAnalytics.objects.bulk_create(PostAnalytics(post_id=pk) for pk in Post.objects.values_list('pk', flat=True))
+				started = time.perf_counter()
+				for number in range(options['requests']):
+					# Each (reader, post) pair once, so that every request is a new unique view
+					slug = slugs[number % len(slugs)]
+					request = APIRequestFactory().post(f'/api/posts/{slug}/increment_views/')
+					force_authenticate(request, readers[number // len(slugs) % len(readers)])
+					response = view(request, slug=slug)
+					assert response.status_code == 200, response.data
+					if batch and (number + 1) % batch == 0:
+						self.flush()
+				if batch:
+					self.flush()
+				elapsed = time.perf_counter() - started
+				views = PostAnalytics.objects.aggregate(views=Sum('views'))['views']
+				self.stdout.write(
+					f"{name:<22} {options['requests']:>9} {views:>7} {elapsed:>9.2f} {options['requests'] / elapsed:>11.0f}"
+				)
+
+	def flush(self):
+		# The view buffer feeds the rollup buffer
+		for buffer in (view_buffer, rollup_buffer):
+			buffer.flush()
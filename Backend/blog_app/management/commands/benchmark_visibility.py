@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from blog_app import benchmarking
+from blog_app.models import CustomUser, Post
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the post listing of a signed-in user with the visibility rule written as an OR "
+		"filter plus DISTINCT (the original), as a UNION of two id lookups, and as Post.visible_to "
+		"(the current one): the count, the first page and a keyset page halfway down, on "
+		"synthetic posts in scratch databases. The real databases are not touched."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--posts', type=int, default=1_000_000, help="Synthetic posts to create.")
+		parser.add_argument('--authors', type=int, default=1000, help="Authors the posts are spread over.")
+		parser.add_argument('--published', type=float, default=0.9, help="Share of the posts that are published.")
+		parser.add_argument('--repeat', type=int, default=5, help="Repetitions per measurement (median).")
+
+	def handle(self, *args, **options):
+		with benchmarking.scratch_databases():
+			self.stdout.write(f"Creating {options['posts']} posts...")
+			author_ids = benchmarking.create_users(options['authors'])
+			benchmarking.create_posts(options['posts'], author_ids, published=options['published'])
+			with connection.cursor() as cursor:
+				cursor.execute('ANALYZE')  # As migration 0020 does
+			user = CustomUser.objects.get(pk=author_ids[0])
+			feed = Post.objects.feed()
+			middle = feed.filter(Post.visible_to(user))[int(options['posts'] * options['published'] / 2):].first()
+			rules = {
+				'OR + DISTINCT': feed.filter(Q(author=user) | Q(is_published=True)).distinct(),
+				'UNION': feed.filter(pk__in=Post.objects.filter(author=user).values('pk').union(
+					Post.objects.filter(is_published__in=[True]).values('pk'))),
+				'visible_to': feed.filter(Post.visible_to(user)),
+			}
+
+			self.stdout.write(f"{'rule':<15} {'count ms':>9} {'first page ms':>14} {'middle page ms':>15}")
+			for name, queryset in rules.items():
+				# The filter of KeysetPagination
+				deep = queryset.filter(
+					Q(created_at__lt=middle.created_at) | Q(created_at=middle.created_at, pk__lt=middle.pk),
+					created_at__lte=middle.created_at,
+				)
+				timings = [
+					benchmarking.measure(function, options['repeat'])
+					for function in (queryset.count, lambda: list(queryset[:10]), lambda: list(deep[:10]))
+				]
+				self.stdout.write(
+					f"{name:<15} {timings[0] * 1000:>9.1f} {timings[1] * 1000:>14.1f} {timings[2] * 1000:>15.1f}"
+				)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog_app import rollups
+
+
+class Command(BaseCommand):
+	help = (
+		"Compact hourly analytics rollups older than ANALYTICS_HOURLY_RETENTION_DAYS into daily rows "
+		"and drop daily rows past ANALYTICS_DAILY_RETENTION_DAYS. Meant to run daily (e.g. from cron)."
+	)
+
+	def handle(self, *args, **options):
+		days, removed = rollups.compact()
+		self.stdout.write(self.style.SUCCESS(f"Compacted {days} days, removed {removed} rollup rows."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_app import exporting
+
+
+class Command(BaseCommand):
+	help = "Export posts, comments, analytics and follows as NDJSON (one record per line)."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--output', '-o', help="File to write to (defaults to stdout).")
+		parser.add_argument(
+			'--models', default='', help=f"Comma-separated subset of: {', '.join(exporting.SOURCES)}."
+		)
+		parser.add_argument(
+			'--chunk-size', type=int, default=exporting.DEFAULT_CHUNK_SIZE, help="Rows fetched per database round trip."
+		)
+
+	def handle(self, *args, **options):
+		try:
+			models = exporting.parse_models(options['models'])
+		except ValueError as exc:
+			raise CommandError(str(exc))
+
+		lines = exporting.iter_ndjson(models, chunk_size=options['chunk_size'])
+		if not options['output']:
+			for line in lines:
+				self.stdout.write(line, ending='')
+			return
+
+		written = 0
+		with open(options['output'], 'w', encoding='utf-8') as output:
+			for line in lines:
+				output.write(line)
+				written += 1
+		self.stderr.write(self.style.SUCCESS(f"Exported {written} records to {options['output']}."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from blog_app import images
+from blog_app.models import CustomUser, Post
+
+
+class Command(BaseCommand):
+	help = "Generate the resized variants of post images and profile pictures that don't have them yet."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--force', action='store_true', help="Regenerate the variants of every image.")
+
+	def handle(self, *args, **options):
+		targets = [
+			(Post, 'image', 'image_variants', images.POST_IMAGE_VARIANTS),
+			(CustomUser, 'profile_picture', 'profile_picture_variants', images.PROFILE_PICTURE_VARIANTS),
+		]
+		for model, file_field, variants_field, sizes in targets:
+			rows = list(
+				model.objects.exclude(**{f'{file_field}__isnull': True}).exclude(**{file_field: ''})
+				.values_list('pk', file_field, variants_field)
+			)
+			generated = failed = 0
+			for pk, source, variants in rows:
+				if not options['force'] and (variants or {}).get('source') == source:
+					continue
+				try:
+					images.process(model, pk, file_field, variants_field, source, sizes)
+					generated += 1
+				except Exception as exc:
+					failed += 1
+					self.stderr.write(f"{model._meta.label} {pk}: {exc}")
+			self.stdout.write(self.style.SUCCESS(
+				f"{model._meta.verbose_name_plural}: generated variants for {generated} images ({failed} failed)."
+			))
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog_app import importing
+
+
+class Command(BaseCommand):
+	help = "Import posts, comments and analytics from an NDJSON file written by export_blog."
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help="NDJSON file to import, or '-' to read stdin.")
+		parser.add_argument(
+			'--batch-size', type=int, default=importing.DEFAULT_BATCH_SIZE, help="Records imported per transaction."
+		)
+		parser.add_argument(
+			'--skip-existing', action='store_true',
+			help="Skip posts whose slug already exists instead of importing them under a new slug.",
+		)
+
+	def handle(self, *args, **options):
+		importer = importing.Importer(batch_size=options['batch_size'], skip_existing=options['skip_existing'])
+		started = time.monotonic()
+		if options['path'] == '-':
+			report = importer.run(sys.stdin)
+		else:
+			with open(options['path'], encoding='utf-8') as source:
+				report = importer.run(source)
+		elapsed = time.monotonic() - started
+
+		for error in report['errors']:
+			self.stderr.write(f"line {error['line']}: {error['error']}")
+		imported = report['posts'] + report['comments'] + report['analytics']
+		self.stdout.write(self.style.SUCCESS(
+			f"Imported {report['posts']} posts, {report['comments']} comments and {report['analytics']} analytics rows "
+			f"({report['categories']} new categories, {report['skipped']} skipped, {report['errors_total']} errors) "
+			f"in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} rows/s)."
+		))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog_app.models import PostAnalytics
+from blog_app.routers import analytics_database
+from blog_app.sketches import ViewerSketch
+
+
+class Command(BaseCommand):
+	help = "Build viewer sketches from the existing viewed_users rows (run before enabling VIEW_TRACKING_BACKEND='sketch')."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=200, help="Posts converted per transaction.")
+		parser.add_argument(
+			'--clear', action='store_true', help="Delete the viewed_users rows of each post once its sketch is saved."
+		)
+
+	def handle(self, *args, **options):
+		batch_size = options['batch_size']
+		through = PostAnalytics.viewed_users.through
+		analytics_ids = list(
+			through.objects.order_by().values_list('postanalytics_id', flat=True).distinct()
+		)
+		converted = 0
+		for start in range(0, len(analytics_ids), batch_size):
+			chunk = analytics_ids[start:start + batch_size]
+			with transaction.atomic(using=analytics_database()):
+				rows = {row.pk: row for row in PostAnalytics.objects.filter(pk__in=chunk).only('id', 'viewer_sketch')}
+				sketches = {pk: row.get_viewer_sketch() for pk, row in rows.items()}
+				pairs = through.objects.filter(postanalytics_id__in=chunk).values_list('postanalytics_id', 'customuser_id')
+				for analytics_id, user_id in pairs.iterator(chunk_size=2000):
+					sketches[analytics_id].add(user_id)
+				for pk, row in rows.items():
+					row.viewer_sketch = sketches[pk].to_bytes()
+				PostAnalytics.objects.bulk_update(rows.values(), ['viewer_sketch'])
+				if options['clear']:
+					through.objects.filter(postanalytics_id__in=chunk).delete()
+			converted += len(rows)
+		self.stdout.write(self.style.SUCCESS(f"Built viewer sketches for {converted} posts."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+
+from blog_app.models import AnalyticsRollup, PostAnalytics
+from blog_app.routers import analytics_database
+
+
+class Command(BaseCommand):
+	help = (
+		"Move the analytics rows (counters, viewers and the time series) of the default database "
+		"into the separate analytics database (ANALYTICS_DATABASE), after `migrate --database "
+		"analytics`. Run it while the site is stopped; rows already copied are skipped, so it "
+		"can be run again after a failure."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=2000, help="Rows moved per transaction.")
+		parser.add_argument(
+			'--keep', action='store_true', help="Copy the rows but leave them in the default database."
+		)
+
+	def handle(self, *args, **options):
+		target = analytics_database()
+		if target == DEFAULT_DB_ALIAS:
+			raise CommandError("No separate analytics database is configured (set ANALYTICS_DATABASE_PATH).")
+		# Viewers before the analytics rows: deleting an analytics row deletes its viewers
+		for model in (PostAnalytics.viewed_users.through, AnalyticsRollup, PostAnalytics):
+			try:
+				moved = self.move(model, target, options['batch_size'], options['keep'])
+			except DatabaseError as exc:
+				raise CommandError(
+					f"Moving {model._meta.db_table} failed: {exc}. Create the tables with "
+					f"`manage.py migrate --database {target}` first."
+				)
+			self.stdout.write(f"{model._meta.db_table}: {moved} rows")
+		self.stdout.write(self.style.SUCCESS(f"Moved the analytics rows to the '{target}' database."))
+
+	def move(self, model, target, batch_size, keep):
+		"""Copy the rows of `model` in primary key order, deleting each batch once copied."""
+		source = model.objects.using(DEFAULT_DB_ALIAS).order_by('pk')
+		moved = last_pk = 0
+		while batch := list(source.filter(pk__gt=last_pk)[:batch_size]):
+			with transaction.atomic(using=target):
+				# Keeps the primary keys, which the viewers refer to
+				model.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+			if not keep:
+				source.filter(pk__in=[row.pk for row in batch]).delete()
+			last_pk = batch[-1].pk
+			moved += len(batch)
+		return moved
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_app import search
+
+
+class Command(BaseCommand):
+	help = "Rebuild the full-text search index of posts."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000, help="Posts indexed per batch.")
+
+	def handle(self, *args, **options):
+		if not search.is_available():
+			raise CommandError("The full-text index is not available on this database (requires SQLite with FTS5).")
+		indexed = search.rebuild(batch_size=options['batch_size'])
+		self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} posts."))
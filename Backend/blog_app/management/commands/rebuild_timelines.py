@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_app import timeline
+
+
+class Command(BaseCommand):
+	help = (
+		"Fan out the posts left out while their author was a celebrity, for the authors who no "
+		"longer are, then rebuild the materialized home timelines from the current follows and posts."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--user', help="Only rebuild the timeline of this username.")
+		parser.add_argument('--depth', type=int, help="Posts kept per timeline (defaults to TIMELINE_BACKFILL).")
+
+	def handle(self, *args, **options):
+		users = get_user_model().objects.order_by('pk')
+		if options['user']:
+			users = users.filter(username=options['user'])
+			if not users.exists():
+				raise CommandError(f"User '{options['user']}' does not exist.")
+
+		fanned_out = timeline.fan_out_pending()
+		rebuilt = 0
+		for user_id in users.values_list('pk', flat=True):
+			timeline.rebuild(user_id, depth=options['depth'])
+			rebuilt += 1
+		self.stdout.write(self.style.SUCCESS(f"Fanned out {fanned_out} posts, rebuilt {rebuilt} timelines."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from blog_app import counters
+
+
+class Command(BaseCommand):
+	help = "Recompute like and comment counters on PostAnalytics and repair any drift."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=500, help="Rows written per bulk statement.")
+
+	def handle(self, *args, **options):
+		created, repaired = counters.reconcile(batch_size=options['batch_size'])
+		self.stdout.write(self.style.SUCCESS(
+			f"Created {created} missing analytics rows, repaired {repaired} drifted rows."
+		))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from blog_app import caching
+
+
+class Command(BaseCommand):
+	help = "Show the hit/miss counters of the anonymous response cache."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--reset', action='store_true', help="Reset the counters after printing them.")
+
+	def handle(self, *args, **options):
+		stats = caching.stats()
+		self.stdout.write(f"hits: {stats['hits']}  misses: {stats['misses']}  hit rate: {stats['hit_rate']:.1%}")
+		if options['reset']:
+			caching.reset_stats()
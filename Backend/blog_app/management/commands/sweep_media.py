@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from blog_app import media_gc
+from blog_app.models import OrphanedFile
+
+
+class Command(BaseCommand):
+	help = "Delete queued orphaned media files in batches; --reconcile first queues unreferenced files found on disk."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=500, help="Queued files deleted per batch.")
+		parser.add_argument(
+			'--reconcile', action='store_true',
+			help="Scan the media upload directories for files no row references and queue them.",
+		)
+		parser.add_argument(
+			'--min-age', type=float, default=1.0,
+			help="Only reconcile files older than this many hours (younger ones may be uploads in progress).",
+		)
+		parser.add_argument(
+			'--dry-run', action='store_true', help="Report what would be queued and deleted without changing anything."
+		)
+
+	def handle(self, *args, **options):
+		if options['reconcile']:
+			orphans = media_gc.reconcile(min_age=timedelta(hours=options['min_age']), dry_run=options['dry_run'])
+			for name in orphans:
+				self.stdout.write(name)
+			self.stdout.write(self.style.SUCCESS(f"Found {len(orphans)} unreferenced files."))
+
+		if options['dry_run']:
+			self.stdout.write(f"{OrphanedFile.objects.count()} files are queued for deletion.")
+			return
+
+		deleted, kept, failed = media_gc.sweep(batch_size=options['batch_size'])
+		self.stdout.write(self.style.SUCCESS(
+			f"Deleted {deleted} files ({kept} were referenced again, {failed} failed and stay queued)."
+		))
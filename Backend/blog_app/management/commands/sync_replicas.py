@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+	help = (
+		"Copy the primary SQLite database into every replica (REPLICA_DATABASES), as a local "
+		"stand-in for replication. With --interval the copy repeats, so replicas lag behind "
+		"the primary by up to that many seconds."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--interval', type=float, default=0,
+			help="Seconds between copies; 0 copies once and exits.",
+		)
+
+	def handle(self, *args, **options):
+		primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+		if not primary['ENGINE'].endswith('sqlite3'):
+			raise CommandError("sync_replicas only copies SQLite databases; use the server's replication.")
+		replicas = [settings.DATABASES[alias]['NAME'] for alias in settings.REPLICA_DATABASES]
+		if not replicas:
+			raise CommandError("No replicas are configured (set DATABASE_REPLICAS).")
+
+		while True:
+			start = time.perf_counter()
+			source = sqlite3.connect(primary['NAME'])
+			try:
+				for name in replicas:
+					target = sqlite3.connect(name)
+					try:
+						# A consistent snapshot of the primary, written in one transaction
+						source.backup(target)
+					finally:
+						target.close()
+			finally:
+				source.close()
+			self.stdout.write(
+				f"Copied the primary to {len(replicas)} replica(s) in {(time.perf_counter() - start) * 1000:.0f} ms"
+			)
+			if not options['interval']:
+				break
+			time.sleep(options['interval'])
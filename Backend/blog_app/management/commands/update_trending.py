@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog_app import trending
+
+
+class Command(BaseCommand):
+	help = "Recompute every trending score (after changing TRENDING_WEIGHTS or TRENDING_HALF_LIFE_HOURS)."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=2000, help="Posts per UPDATE batch.")
+
+	def handle(self, *args, **options):
+		updated = trending.recompute(batch_size=options['batch_size'])
+		self.stdout.write(self.style.SUCCESS(f"Recomputed the trending scores of {updated} posts."))
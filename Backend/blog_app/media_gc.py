@@ -0,0 +1,126 @@
+"""
+Deferred deletion of media files.
+
+Requests never delete files themselves. When an image is replaced or its row deleted,
+the file and its resized variants are queued in the OrphanedFile table once the
+transaction commits (nothing is queued if it rolls back), and `manage.py sweep_media`
+deletes the queued files in batches. Before deleting, the sweeper re-checks that no row
+references a file again.
+
+`reconcile()` walks the media upload directories for files that no row references,
+e.g. left behind by a crash between a commit and its enqueue, and queues them too.
+"""
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import images
+from .models import OrphanedFile
+
+logger = logging.getLogger(__name__)
+
+# (model, file field, variants field, variant sizes) of every model that stores media
+MEDIA_FIELDS = (
+	('blog_app.Post', 'image', 'image_variants', images.POST_IMAGE_VARIANTS),
+	(settings.AUTH_USER_MODEL, 'profile_picture', 'profile_picture_variants', images.PROFILE_PICTURE_VARIANTS),
+)
+
+
+def enqueue(names):
+	"""Queue storage names for deletion once the current transaction commits."""
+	names = [name for name in dict.fromkeys(names) if name]
+	if not names:
+		return
+	transaction.on_commit(lambda: OrphanedFile.objects.bulk_create(
+		[OrphanedFile(name=name) for name in names], ignore_conflicts=True
+	))
+
+
+def discard(name, sizes=None):
+	"""Queue a file and every variant that may have been generated from it."""
+	if name:
+		enqueue([name, *images.variant_names(name, sizes or {})])
+
+
+def referenced_names(names):
+	"""Return the subset of `names` still used as an image by some row."""
+	referenced = set()
+	for label, file_field, _, _ in MEDIA_FIELDS:
+		referenced.update(
+			apps.get_model(label).objects.filter(**{f'{file_field}__in': names}).values_list(file_field, flat=True)
+		)
+	return referenced
+
+
+def sweep(batch_size=500, storage=default_storage):
+	"""
+	Delete the queued files in batches. Files that failed to delete stay queued.
+	Returns a tuple of (deleted, still referenced, failed).
+	"""
+	deleted = kept = failed = 0
+	last_pk = 0
+	while True:
+		batch = list(OrphanedFile.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+		if not batch:
+			break
+		last_pk = batch[-1].pk
+		referenced = referenced_names([orphan.name for orphan in batch])
+
+		done = []
+		for orphan in batch:
+			if orphan.name in referenced:
+				kept += 1
+			else:
+				try:
+					storage.delete(orphan.name)
+				except OSError:
+					logger.exception("Deleting %s failed", orphan.name)
+					failed += 1
+					continue
+				deleted += 1
+			done.append(orphan.pk)
+		OrphanedFile.objects.filter(pk__in=done).delete()
+	return deleted, kept, failed
+
+
+def _walk(storage, directory):
+	directories, files = storage.listdir(directory)
+	for name in files:
+		yield f'{directory}/{name}' if directory else name
+	for subdirectory in directories:
+		yield from _walk(storage, f'{directory}/{subdirectory}' if directory else subdirectory)
+
+
+def reconcile(min_age=timedelta(hours=1), storage=default_storage, dry_run=False):
+	"""
+	Queue the files of the media upload directories that no row references and that are
+	older than `min_age` (younger files may belong to an upload that is still being
+	saved). Returns the list of orphaned names.
+	"""
+	referenced = set()
+	directories = set()
+	for label, file_field, variants_field, _ in MEDIA_FIELDS:
+		model = apps.get_model(label)
+		directories.add(model._meta.get_field(file_field).upload_to.strip('/'))
+		rows = model.objects.exclude(**{file_field: ''}).exclude(**{f'{file_field}__isnull': True})
+		for name, variants in rows.values_list(file_field, variants_field).iterator(chunk_size=2000):
+			referenced.add(name)
+			referenced.update(images.recorded_names(variants))
+
+	cutoff = timezone.now() - min_age
+	orphans = []
+	for directory in sorted(directories):
+		if not storage.exists(directory):
+			continue
+		for name in _walk(storage, directory):
+			if name not in referenced and storage.get_modified_time(name) < cutoff:
+				orphans.append(name)
+
+	if orphans and not dry_run:
+		OrphanedFile.objects.bulk_create([OrphanedFile(name=name) for name in orphans], ignore_conflicts=True)
+	return orphans
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('blog_app', 'Post')
+    PostAnalytics = apps.get_model('blog_app', 'PostAnalytics')
+    Comment = apps.get_model('blog_app', 'Comment')
+    PostLike = apps.get_model('blog_app', 'PostLike')
+
+    missing = Post.objects.filter(post_analytics__isnull=True).values_list('pk', flat=True)
+    PostAnalytics.objects.bulk_create([PostAnalytics(post_id=pk) for pk in missing], batch_size=500)
+
+    comment_count = Comment.objects.filter(post=OuterRef('post_id')).order_by().values('post').annotate(
+        total=Count('pk')).values('total')
+    like_count = PostLike.objects.filter(post=OuterRef('post_id')).order_by().values('post').annotate(
+        total=Count('pk')).values('total')
+    PostAnalytics.objects.update(
+        comment_count=Coalesce(Subquery(comment_count), 0),
+        likes=Coalesce(Subquery(like_count), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0006_alter_postanalytics_viewed_users'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postanalytics',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
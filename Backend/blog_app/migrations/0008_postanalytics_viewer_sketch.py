@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0007_postanalytics_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postanalytics',
+            name='viewer_sketch',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        if 'ENABLE_FTS5' not in {row[0] for row in cursor.fetchall()}:
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS blog_app_post_fts USING fts5("
+            "title, content, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.execute(
+            "INSERT INTO blog_app_post_fts (rowid, title, content) SELECT id, title, content FROM blog_app_post"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS blog_app_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0008_postanalytics_viewer_sketch'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0010_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_published', 'created_at'], name='post_published_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'created_at'], name='post_author_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:29
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('blog_app', '0011_post_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['created_at'], name='user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='user_username_lower_idx'),
+        ),
+    ]
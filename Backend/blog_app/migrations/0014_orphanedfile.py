@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0013_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrphanedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:44
+
+from django.db import migrations, models
+
+from blog_app import trending
+
+
+def backfill_scores(apps, schema_editor):
+    PostAnalytics = apps.get_model('blog_app', 'PostAnalytics')
+
+    rows = list(PostAnalytics.objects.values_list('pk', 'post__created_at', 'views', 'likes', 'comment_count'))
+    updates = []
+    for pk, created_at, views, likes, comments in rows:
+        offset = trending.offset(created_at)
+        updates.append(PostAnalytics(
+            pk=pk, trending_offset=offset, trending_score=trending.score(views, likes, comments, offset)
+        ))
+    PostAnalytics.objects.bulk_update(updates, ['trending_offset', 'trending_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0015_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postanalytics',
+            name='trending_offset',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='postanalytics',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='postanalytics',
+            index=models.Index(fields=['trending_score', 'post'], name='analytics_trending_idx'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
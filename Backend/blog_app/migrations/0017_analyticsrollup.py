@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0016_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('views', models.IntegerField(default=0)),
+                ('likes', models.IntegerField(default=0)),
+                ('comments', models.IntegerField(default=0)),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='blog_app.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'bucket'], name='rollup_period_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'period', 'bucket'), name='rollup_post_period_bucket_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    # Every existing comment is top level: its path is its own zero-padded id
+    Comment = apps.get_model('blog_app', 'Comment')
+    comments = [Comment(pk=pk, path=f'{pk:010d}/') for pk in Comment.objects.values_list('pk', flat=True)]
+    Comment.objects.bulk_update(comments, ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0017_analyticsrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='blog_app.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'depth', 'created_at', 'id'], name='comment_post_depth_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent', 'created_at', 'id'], name='comment_parent_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['path'], name='comment_path_idx'),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0018_threaded_comments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analyticsrollup',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='blog_app.post'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='analytics',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='post_analytics', to='blog_app.postanalytics'),
+        ),
+        migrations.AlterField(
+            model_name='postanalytics',
+            name='post',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='post_analytics', to='blog_app.post'),
+        ),
+        migrations.AlterField(
+            model_name='postanalytics',
+            name='viewed_users',
+            field=models.ManyToManyField(blank=True, db_constraint=False, related_name='viewed_posts', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+def analyze(apps, schema_editor):
+    # Gives the SQLite planner the statistics it needs to walk post_created_idx newest
+    # first for listings where most posts are visible, instead of sorting every match
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("ANALYZE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0019_analytics_database'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='post_created_idx'),
+        ),
+        migrations.RunPython(analyze, migrations.RunPython.noop),
+    ]
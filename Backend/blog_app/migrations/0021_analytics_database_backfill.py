@@ -0,0 +1,57 @@
+from django.db import DEFAULT_DB_ALIAS, migrations
+from django.db.models import Count
+
+from blog_app import routers, trending
+
+
+def backfill_analytics(apps, schema_editor):
+    # Migrations 0007 and 0016 backfill the counters and trending scores on the default
+    # database. With a separate analytics database (blog_app.routers), its rows are
+    # recomputed here from the posts, likes and comments of the default database. Rows are
+    # only updated, never created, so `manage.py move_analytics` can still copy them over.
+    db_alias = schema_editor.connection.alias
+    if db_alias != routers.analytics_database():
+        return
+    PostAnalytics = apps.get_model('blog_app', 'PostAnalytics')
+    Post = apps.get_model('blog_app', 'Post')
+    Comment = apps.get_model('blog_app', 'Comment')
+    PostLike = apps.get_model('blog_app', 'PostLike')
+
+    def counts(model, post_ids):
+        return dict(
+            model.objects.using(DEFAULT_DB_ALIAS).filter(post_id__in=post_ids).order_by().values('post')
+            .annotate(total=Count('pk')).values_list('post', 'total')
+        )
+
+    rows = PostAnalytics.objects.using(db_alias).order_by('pk').only('pk', 'post_id', 'views')
+    last_pk = 0
+    while batch := list(rows.filter(pk__gt=last_pk)[:500]):
+        post_ids = [row.post_id for row in batch]
+        created = dict(Post.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=post_ids).values_list('pk', 'created_at'))
+        likes, comments = counts(PostLike, post_ids), counts(Comment, post_ids)
+        updates = []
+        for row in batch:
+            if row.post_id in created:
+                row.likes = likes.get(row.post_id, 0)
+                row.comment_count = comments.get(row.post_id, 0)
+                row.trending_offset = trending.offset(created[row.post_id])
+                row.trending_score = trending.score(row.views, row.likes, row.comment_count, row.trending_offset)
+                updates.append(row)
+        PostAnalytics.objects.using(db_alias).bulk_update(
+            updates, ['likes', 'comment_count', 'trending_offset', 'trending_score']
+        )
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0020_post_created_index'),
+    ]
+
+    operations = [
+        # The hint lets the analytics database run it (see AnalyticsRouter.allow_migrate)
+        migrations.RunPython(
+            backfill_analytics, migrations.RunPython.noop, hints={'model_name': 'postanalytics'}
+        ),
+    ]
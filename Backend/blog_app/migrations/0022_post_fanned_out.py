@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_fanned_out(apps, schema_editor):
+    # The published posts of every author but the celebrities (blog_app.timeline) were
+    # fanned out when they were published
+    Follow = apps.get_model('blog_app', 'Follow')
+    Post = apps.get_model('blog_app', 'Post')
+    celebrities = (
+        Follow.objects.values('followed').annotate(total=Count('pk'))
+        .filter(total__gt=getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)).values('followed')
+    )
+    Post.objects.filter(is_published=True).exclude(author__in=celebrities).update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_app', '0021_analytics_database_backfill'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_fanned_out, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('fanned_out', False), ('is_published', True)), fields=['author', 'created_at', 'id'], name='post_fanout_pending_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from autoslug import AutoSlugField
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F, Window
+from django.db.models.functions import Lower, RowNumber
 from django.utils.text import slugify
 from django.utils.timezone import now
 from django.contrib.auth import get_user_model
@@ -11,13 +14,40 @@ class CustomUser(AbstractUser):
 	is_user = models.BooleanField(default=True)  # Regular user role
 	date_of_birth = models.DateField(null=True, blank=True)
 	profile_picture = models.ImageField(upload_to="profile_pics/", null=True, blank=True)
+	# Resized copies of the profile picture, maintained by blog_app.images
+	profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 	bio = models.TextField(max_length=250, blank=True, null=True)
 
+	class Meta(AbstractUser.Meta):
+		indexes = [
+			# User directory: newest first, and case-insensitive username prefix search
+			models.Index(fields=['created_at'], name='user_created_idx'),
+			models.Index(Lower('username'), name='user_username_lower_idx'),
+		]
+
 	def __str__(self):
 		return self.username
 
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		# Remember the stored picture so that save() can tell when it is replaced
+		instance._stored_profile_picture = instance.__dict__.get('profile_picture')
+		return instance
+
+	def save(self, *args, **kwargs):
+		super().save(*args, **kwargs)
+
+		# Queue a replaced profile picture (and its variants) for deletion once the save commits
+		stored = getattr(self, '_stored_profile_picture', None)
+		if stored and stored != self.profile_picture.name:
+			from .images import PROFILE_PICTURE_VARIANTS
+			from .media_gc import discard
+			discard(str(stored), PROFILE_PICTURE_VARIANTS)
+		self._stored_profile_picture = self.profile_picture.name
+
 	@property
 	def role(self):
 		"""Determine user role based on flags."""
@@ -111,6 +141,27 @@ class Category(models.Model):
 		return self.name
 
 
+class PostManager(models.Manager):
+	"""Manager for Posts."""
+
+	def feed(self):
+		"""
+		Queryset used by every post listing endpoint.
+		Joins the author, category and analytics rows (which carry the denormalized view,
+		like and comment counters) so that serializing a page of posts costs a constant
+		number of queries. Analytics stored in their own database are prefetched instead
+		(one more query per page).
+		"""
+		from .routers import analytics_separate
+
+		queryset = self.get_queryset().select_related('author', 'category').order_by('-created_at', '-id')
+		if analytics_separate():
+			return queryset.prefetch_related(
+				models.Prefetch('post_analytics', queryset=PostAnalytics.objects.defer('viewer_sketch'))
+			)
+		return queryset.select_related('post_analytics').defer('post_analytics__viewer_sketch')
+
+
 class Post(models.Model):
 	title = models.CharField(max_length=255)
 	slug = models.SlugField(unique=True, blank=True)
@@ -121,12 +172,46 @@ class Post(models.Model):
 	is_published = models.BooleanField(default=False)
 	category = models.ForeignKey('Category', on_delete=models.SET_NULL, null=True, blank=True)
 	image = models.ImageField(upload_to='post_images/', blank=True, null=True)
-
-	# Relationship to PostAnalytics model
+	# Resized copies of the image, maintained by blog_app.images
+	image_variants = models.JSONField(default=dict, blank=True, editable=False)
+	# Whether the post was written into its author's followers' timelines (blog_app.timeline);
+	# published posts that were not are merged into the timelines at read time
+	fanned_out = models.BooleanField(default=False, editable=False)
+
+	# Relationship to PostAnalytics model. Never set (the analytics row points to its post);
+	# no cascade or constraint, as the analytics can live in another database
 	analytics = models.OneToOneField(
-		'PostAnalytics', on_delete=models.CASCADE, related_name='post_analytics', null=True, blank=True
+		'PostAnalytics', on_delete=models.DO_NOTHING, related_name='post_analytics', null=True, blank=True,
+		db_constraint=False,
 	)
 
+	objects = PostManager()
+
+	class Meta:
+		indexes = [
+			# Listing indexes: published posts and one author's posts, newest first
+			models.Index(fields=['is_published', 'created_at'], name='post_published_created_idx'),
+			models.Index(fields=['author', 'created_at'], name='post_author_created_idx'),
+			# Every post, newest first: lets a page of a filtered listing stop after a page of rows
+			models.Index(fields=['created_at', 'id'], name='post_created_idx'),
+			# The published posts left out of the timeline fan-out, per author, newest first
+			models.Index(
+				fields=['author', 'created_at', 'id'], condition=models.Q(fanned_out=False, is_published=True),
+				name='post_fanout_pending_idx',
+			),
+		]
+
+	@staticmethod
+	def visible_to(user):
+		"""
+		Filter for the posts `user` may list: their own and the published ones.
+		A single-table OR needs no DISTINCT. SQLite answers it from the (author) and
+		(is_published, created_at) indexes when counting, and walks (created_at, id)
+		newest first, stopping after a page, when listing. `is_published__in` renders as
+		`IN (1)`, which the index can match; a bare boolean column test cannot.
+		"""
+		return models.Q(author=user) | models.Q(is_published__in=[True])
+
 	def __str__(self):
 		return self.title
 
@@ -140,78 +225,198 @@ class Post(models.Model):
 
 	def increment_views(self):
 		"""Increment view count in PostAnalytics."""
-		if not self.analytics:
-			self.analytics = PostAnalytics.objects.create(post=self)
-		self.analytics.views += 1
-		self.analytics.save()
-		self.save()
+		from .counters import increment_views
+		increment_views(self.pk)
 
 	def increment_likes(self):
 		"""Increment the like count."""
-		if self.analytics:
-			self.analytics.likes += 1
-			self.analytics.save()
+		from .counters import adjust_likes
+		adjust_likes(self.pk, 1)
 
 	def decrement_likes(self):
 		"""Decrement the like count."""
-		if self.analytics:
-			self.analytics.likes -= 1
-			self.analytics.save()
+		from .counters import adjust_likes
+		adjust_likes(self.pk, -1)
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		# Remember the stored image and publication state so that save() and the signals can
+		# tell when they change
+		instance._stored_image = instance.__dict__.get('image')
+		instance._stored_published = instance.__dict__.get('is_published')
+		return instance
 
 	def save(self, *args, **kwargs):
-		# Handle image replacement
-		if self.pk:
-			old_instance = Post.objects.filter(pk=self.pk).first()
-			if old_instance and old_instance.image != self.image:
-				old_instance.image.delete(save=False)
-
 		# Ensure slug is generated if not provided
 		if not self.slug:
 			self.slug = slugify(self.title)
 
 		super().save(*args, **kwargs)
-	def delete(self, *args, **kwargs):
-		"""Delete the post and its associated image if exists."""
-		# Delete the image file if it exists
-		if self.image:
-			try:
-				# Get the file path of the image
-				image_path = self.image.path
-				# Check if the file exists and delete it
-				if os.path.isfile(image_path):
-					os.remove(image_path)
-			except Exception as e:
-				print(f"Error deleting image: {e}")
-
-		# Now delete the post itself
-		super().delete(*args, **kwargs)
+
+		# Queue a replaced image (and its variants) for deletion once the save commits
+		stored = getattr(self, '_stored_image', None)
+		if stored and stored != self.image.name:
+			from .images import POST_IMAGE_VARIANTS
+			from .media_gc import discard
+			discard(str(stored), POST_IMAGE_VARIANTS)
+		self._stored_image = self.image.name
+		self._stored_published = self.is_published
+
+
+class CommentManager(models.Manager):
+	"""Manager for Comments: the author and post are always joined, since every
+	representation of a comment shows them."""
+
+	def get_queryset(self):
+		return super().get_queryset().select_related('author', 'post')
+
+	def attach_first_replies(self, comments, limit):
+		"""
+		Set `first_replies` on each of `comments` to its `limit` oldest direct replies, with
+		one query for the whole list (replies numbered per parent with ROW_NUMBER()).
+		"""
+		by_id = {comment.pk: comment for comment in comments}
+		for comment in comments:
+			comment.first_replies = []
+		if not by_id or limit <= 0:
+			return comments
+		replies = self.get_queryset().filter(parent_id__in=by_id).annotate(
+			position=Window(RowNumber(), partition_by=[F('parent_id')], order_by=[F('created_at').asc(), F('id').asc()])
+		).filter(position__lte=limit).order_by('parent_id', 'created_at', 'id')
+		for reply in replies:
+			by_id[reply.parent_id].first_replies.append(reply)
+		return comments
 
 
 # Comment Model
 class Comment(models.Model):
+	# Deepest reply level; keeps `path` within its 255 characters
+	MAX_DEPTH = 16
+	PATH_SEGMENT_WIDTH = 10
+
 	post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
 	author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
 	content = models.TextField()
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Threading: `path` is the zero-padded ids of the comment's ancestors and itself
+	# ("0000000007/0000000042/"), so a subtree is one range scan on the path index and
+	# ordering by path lists a thread depth first.
+	parent = models.ForeignKey(
+		'self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies', db_index=False
+	)
+	path = models.CharField(max_length=255, default='', editable=False)
+	depth = models.PositiveSmallIntegerField(default=0, editable=False)
+	reply_count = models.PositiveIntegerField(default=0, editable=False)  # Direct replies
+
+	objects = CommentManager()
+
+	class Meta:
+		indexes = [
+			# Keyset pagination of a post's comments on (created_at, id)
+			models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+			# Top-level comments of a post (depth 0) and the replies of a comment, by (created_at, id)
+			models.Index(fields=['post', 'depth', 'created_at', 'id'], name='comment_post_depth_created_idx'),
+			models.Index(fields=['parent', 'created_at', 'id'], name='comment_parent_created_idx'),
+			models.Index(fields=['path'], name='comment_path_idx'),
+		]
 
 	def __str__(self):
 		return f"Comment by {self.author.username} on {self.post.title}"
 
+	@classmethod
+	def path_segment(cls, pk):
+		return f'{pk:0{cls.PATH_SEGMENT_WIDTH}d}/'
+
+	def save(self, *args, **kwargs):
+		creating = self._state.adding
+		if creating and self.parent_id:
+			self.depth = self.parent.depth + 1
+		super().save(*args, **kwargs)
+
+		# The path ends with the comment's own id, known only once it is inserted
+		if creating and not self.path:
+			self.path = (self.parent.path if self.parent_id else '') + self.path_segment(self.pk)
+			type(self)._base_manager.filter(pk=self.pk).update(path=self.path)
+
+	def subtree(self):
+		"""This comment and all of its replies at any depth, depth first."""
+		return Comment.objects.filter(path__gte=self.path, path__lt=self.path + '~').order_by('path')
 
+
+# Analytics models can be stored in a database of their own (ANALYTICS_DATABASE, see
+# blog_app.routers), so their relations to posts and users have no database constraint.
 class PostAnalytics(models.Model):
-	post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name="post_analytics")
+	post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name="post_analytics", db_constraint=False)
 	views = models.PositiveIntegerField(default=0)
 	likes = models.PositiveIntegerField(default=0)
-	viewed_users = models.ManyToManyField(get_user_model(), related_name='viewed_posts', blank=True)
+	comment_count = models.PositiveIntegerField(default=0)
+	viewed_users = models.ManyToManyField(
+		get_user_model(), related_name='viewed_posts', blank=True, db_constraint=False
+	)
+	# Serialized blog_app.sketches.ViewerSketch, used instead of `viewed_users` when
+	# VIEW_TRACKING_BACKEND is "sketch"
+	viewer_sketch = models.BinaryField(null=True, blank=True, editable=False)
+	# Time-decayed engagement score and its time term (see blog_app.trending)
+	trending_score = models.FloatField(default=0, editable=False)
+	trending_offset = models.FloatField(default=0, editable=False)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['trending_score', 'post'], name='analytics_trending_idx'),
+		]
 
 	def __str__(self):
 		return f"Analytics for {self.post.title}"
 
+	def get_viewer_sketch(self):
+		from .sketches import ViewerSketch
+		return ViewerSketch.from_bytes(self.viewer_sketch)
+
+	def unique_viewers(self):
+		"""Number of distinct authenticated viewers (estimated in sketch mode)."""
+		if getattr(settings, 'VIEW_TRACKING_BACKEND', 'm2m') == 'sketch':
+			return self.get_viewer_sketch().unique_count()
+		if hasattr(self, 'viewer_count'):
+			return self.viewer_count
+		return self.viewed_users.count()
+
 	def reset_analytics(self):
 		"""Method to reset views and likes."""
 		self.views = 0
 		self.likes = 0
-		self.save()
+		self.save(update_fields=['views', 'likes'])
+
+
+# Time-series analytics: net view/like/comment events per post and time bucket, written in
+# batches by blog_app.buffers.rollup_buffer. Hourly buckets older than the retention window
+# are compacted into daily ones (see blog_app.rollups).
+class AnalyticsRollup(models.Model):
+	HOUR = 'hour'
+	DAY = 'day'
+	PERIOD_CHOICES = [(HOUR, 'Hour'), (DAY, 'Day')]
+
+	post = models.ForeignKey(
+		Post, on_delete=models.CASCADE, related_name='rollups', db_index=False, db_constraint=False
+	)
+	period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+	bucket = models.DateTimeField()  # Start of the hour / day, in UTC
+	# Net counts: an unlike or a deleted comment is recorded in the bucket it happened in
+	views = models.IntegerField(default=0)
+	likes = models.IntegerField(default=0)
+	comments = models.IntegerField(default=0)
+
+	class Meta:
+		constraints = [
+			# Also serves the range queries of one post (or a set of posts)
+			models.UniqueConstraint(fields=['post', 'period', 'bucket'], name='rollup_post_period_bucket_unique'),
+		]
+		indexes = [
+			models.Index(fields=['period', 'bucket'], name='rollup_period_bucket_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} of post {self.post_id}"
 
 
 class Follow(models.Model):
@@ -221,6 +426,11 @@ class Follow(models.Model):
 
 	class Meta:
 		unique_together = ('follower', 'followed')  # Prevent duplicate follows
+		indexes = [
+			# Keyset pagination of follower / following lists on (created_at, id)
+			models.Index(fields=['followed', 'created_at', 'id'], name='follow_followed_created_idx'),
+			models.Index(fields=['follower', 'created_at', 'id'], name='follow_follower_created_idx'),
+		]
 
 	def __str__(self):
 		return f"{self.follower.username} follows {self.followed.username}"
@@ -231,6 +441,29 @@ class Follow(models.Model):
 			raise ValidationError("A user cannot follow themselves.")
 
 
+# Materialized home timeline: one row per (follower, post) written when a post is published
+# (see blog_app.timeline). Posts of authors with very many followers are not fanned out and
+# are merged in when the timeline is read instead.
+class TimelineEntry(models.Model):
+	user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='timeline', db_index=False)
+	post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+	author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+', db_index=False)
+	created_at = models.DateTimeField()  # The post's creation time, copied for ordering
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user', 'post'], name='timeline_user_post_unique'),
+		]
+		indexes = [
+			# Reading a timeline newest first, and dropping an author's posts on unfollow
+			models.Index(fields=['user', 'created_at', 'post'], name='timeline_user_created_idx'),
+			models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+		]
+
+	def __str__(self):
+		return f"Post {self.post_id} in the timeline of user {self.user_id}"
+
+
 # # Signal to create Profile when CustomUser is created
 # @receiver(post_save, sender=CustomUser)
 # def create_user_profile(sender, instance, created, **kwargs):
@@ -249,3 +482,12 @@ class PostLike(models.Model):
 
 	class Meta:
 		unique_together = ('user', 'post')  # Ensure a user can only like a post once
+
+
+# Media files no longer referenced by any row, waiting to be deleted by `manage.py sweep_media`
+class OrphanedFile(models.Model):
+	name = models.CharField(max_length=255, unique=True)  # Storage name, relative to MEDIA_ROOT
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	def __str__(self):
+		return self.name
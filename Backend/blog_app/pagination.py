@@ -1,4 +1,20 @@
-from rest_framework.pagination import PageNumberPagination
+import asyncio
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import timeline
+
+
+async def alist(queryset):
+	"""Evaluate a queryset with the async ORM."""
+	return [obj async for obj in queryset]
 
 
 class StandardPagination(PageNumberPagination):
@@ -9,3 +25,168 @@ class StandardPagination(PageNumberPagination):
 	page_size = 10  # Default number of items per page
 	page_size_query_param = 'page_size'  # Allow clients to modify the page size
 	max_page_size = 100  # Max number of items per page that can be requested
+
+
+class KeysetPagination(BasePagination):
+	"""
+	Cursor pagination keyed on (created_at, id), newest first (oldest first when
+	`newest_first` is False).
+	Each page is a `WHERE (created_at, id) < (last seen)` range scan, so deep pages cost
+	the same as the first one. Cursors are opaque base64 tokens; the total count is only
+	computed when `?with_count=true` is passed.
+	"""
+	page_size = 10
+	page_size_query_param = 'page_size'
+	max_page_size = 100
+	cursor_query_param = 'cursor'
+	count_query_param = 'with_count'
+	mode_query_param = 'pagination'
+	newest_first = True
+
+	@classmethod
+	def requested(cls, request):
+		"""Return True if the client asked for cursor pagination."""
+		params = request.query_params
+		return cls.cursor_query_param in params or params.get(cls.mode_query_param) == 'cursor'
+
+	def get_page_size(self, request):
+		try:
+			size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+		except ValueError:
+			return self.page_size
+		return max(1, min(size, self.max_page_size))
+
+	def encode_cursor(self, obj, reverse=False):
+		payload = {'k': [obj.created_at.isoformat(), obj.pk], 'r': reverse}
+		return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+	def decode_cursor(self, request):
+		token = request.query_params.get(self.cursor_query_param)
+		if not token:
+			return None, False
+		try:
+			payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+			created_at, pk = payload['k']
+			created_at = parse_datetime(created_at)
+			if created_at is None:
+				raise ValueError
+			return (created_at, int(pk)), bool(payload.get('r'))
+		except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+			raise NotFound("Invalid cursor.")
+
+	def wants_count(self, request):
+		return request.query_params.get(self.count_query_param) in ('true', '1')
+
+	def page_queryset(self, queryset, request):
+		"""Return (the rows of the requested page plus one, cursor position, reverse)."""
+		self.request = request
+		self.page_size = self.get_page_size(request)
+		position, reverse = self.decode_cursor(request)
+		# Walking backwards through a newest-first list reads oldest first, and vice versa
+		newest_first = self.newest_first != reverse
+		if position is not None:
+			created_at, pk = position
+			# The redundant bound on created_at alone gives SQLite a range to scan the index
+			# from, which the OR of the tie-break cannot (nor an OR in the queryset)
+			if newest_first:
+				queryset = queryset.filter(
+					Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk), created_at__lte=created_at
+				)
+			else:
+				queryset = queryset.filter(
+					Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk), created_at__gte=created_at
+				)
+		ordering = ('-created_at', '-pk') if newest_first else ('created_at', 'pk')
+		return queryset.order_by(*ordering)[:self.page_size + 1], position, reverse
+
+	def paginate_queryset(self, queryset, request, view=None):
+		self.count = queryset.count() if self.wants_count(request) else None
+		page, position, reverse = self.page_queryset(queryset, request)
+		return self.finish_page(list(page), position, reverse)
+
+	async def apaginate_queryset(self, queryset, request):
+		"""paginate_queryset() for async views, reading the page and the count concurrently."""
+		page, position, reverse = self.page_queryset(queryset, request)
+		if self.wants_count(request):
+			self.count, results = await asyncio.gather(queryset.acount(), alist(page))
+		else:
+			self.count, results = None, await alist(page)
+		return self.finish_page(results, position, reverse)
+
+	def finish_page(self, results, position, reverse):
+		has_more = len(results) > self.page_size
+		results = results[:self.page_size]
+		if reverse:
+			results.reverse()
+		return self.set_page(results, position, reverse, has_more)
+
+	def set_page(self, results, position, reverse, has_more):
+		"""Record the current page (in display order) and which links it has."""
+		if reverse:
+			self.has_next, self.has_previous = position is not None, has_more
+		else:
+			self.has_next, self.has_previous = has_more, position is not None
+		self.page = results
+		return results
+
+	def get_next_link(self):
+		if not self.has_next or not self.page:
+			return None
+		url = self.request.build_absolute_uri()
+		return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+	def get_previous_link(self):
+		if not self.has_previous:
+			return None
+		url = self.request.build_absolute_uri()
+		if not self.page:
+			return remove_query_param(url, self.cursor_query_param)
+		return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[0], reverse=True))
+
+	def get_paginated_data(self, data):
+		response = {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+		if self.count is not None:
+			response = {'count': self.count, **response}
+		return response
+
+	def get_paginated_response(self, data):
+		return Response(self.get_paginated_data(data))
+
+
+class FeedPagination(StandardPagination):
+	"""
+	Page-number pagination by default (kept for the existing screens), switching to
+	KeysetPagination when the request carries `?cursor=` or `?pagination=cursor`.
+	"""
+
+	def paginate_queryset(self, queryset, request, view=None):
+		self.keyset = KeysetPagination() if KeysetPagination.requested(request) else None
+		if self.keyset is not None:
+			return self.keyset.paginate_queryset(queryset, request, view)
+		return super().paginate_queryset(queryset, request, view)
+
+	def get_paginated_response(self, data):
+		if self.keyset is not None:
+			return self.keyset.get_paginated_response(data)
+		return super().get_paginated_response(data)
+
+
+class ReplyPagination(KeysetPagination):
+	"""KeysetPagination for the replies of a comment, which read oldest first."""
+	page_size = 20
+	newest_first = False
+
+
+class TimelinePagination(KeysetPagination):
+	"""
+	KeysetPagination over a user's home timeline, which is merged from two sources by
+	blog_app.timeline rather than read from a single queryset.
+	"""
+
+	def paginate_timeline(self, user, request):
+		self.request = request
+		self.page_size = self.get_page_size(request)
+		self.count = None
+		position, reverse = self.decode_cursor(request)
+		results, has_more = timeline.page(user, position, reverse, self.page_size)
+		return self.set_page(results, position, reverse, has_more)
@@ -0,0 +1,161 @@
+"""
+Time-series analytics: views, likes and comments per post and hour / day.
+
+Events are counted in memory by `blog_app.buffers.rollup_buffer` and added to hourly
+AnalyticsRollup rows in batches: the missing rows of a batch are inserted empty, then
+every row goes through one prepared `UPDATE ... SET views = views + %s, ...`
+(executemany), so concurrent writers never overwrite each other.
+
+Hourly rows older than ANALYTICS_HOURLY_RETENTION_DAYS are compacted into daily rows by
+`manage.py compact_rollups`, one day per transaction. A day is therefore stored either as
+hours or as one daily row, never both, and daily series add the two up.
+
+The rows may live in a separate analytics database (blog_app.routers), so posts are
+read with queries of their own rather than joined.
+"""
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import QuerySet, Sum
+from django.utils import timezone
+
+from . import routers
+from .models import AnalyticsRollup, Post
+
+HOUR = AnalyticsRollup.HOUR
+DAY = AnalyticsRollup.DAY
+STEPS = {HOUR: timedelta(hours=1), DAY: timedelta(days=1)}
+EVENTS = ('views', 'likes', 'comments')
+
+# Longest series returned by one query
+MAX_BUCKETS = 1000
+
+
+def truncate(moment, period):
+	"""Start of the hour / day (in UTC) containing `moment`."""
+	moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+	return moment.replace(hour=0) if period == DAY else moment
+
+
+def add(period, increments):
+	"""
+	Add event counts to rollup rows. `increments` maps (post id, bucket start) to a dict of
+	counts per event. Posts deleted in the meantime are skipped.
+	"""
+	increments = {key: counts for key, counts in increments.items() if any(counts.values())}
+	existing = set(Post.objects.filter(pk__in={post_id for post_id, _ in increments}).values_list('pk', flat=True))
+	increments = {key: counts for key, counts in increments.items() if key[0] in existing}
+	if not increments:
+		return 0
+
+	bucket_field = AnalyticsRollup._meta.get_field('bucket')
+	connection = connections[routers.analytics_database()]
+	quote = connection.ops.quote_name
+	assignments = ', '.join(f'{quote(event)} = {quote(event)} + %s' for event in EVENTS)
+	with transaction.atomic(using=connection.alias):
+		AnalyticsRollup.objects.bulk_create(
+			[AnalyticsRollup(post_id=post_id, period=period, bucket=bucket) for post_id, bucket in increments],
+			batch_size=500, ignore_conflicts=True,
+		)
+		with connection.cursor() as cursor:
+			cursor.executemany(
+				f"UPDATE {quote(AnalyticsRollup._meta.db_table)} SET {assignments} "
+				f"WHERE {quote('post_id')} = %s AND {quote('period')} = %s AND {quote('bucket')} = %s",
+				[
+					[counts.get(event, 0) for event in EVENTS]
+					+ [post_id, period, bucket_field.get_db_prep_save(bucket, connection)]
+					for (post_id, bucket), counts in increments.items()
+				],
+			)
+	return len(increments)
+
+
+def _sums(queryset, *group_by):
+	return queryset.values(*group_by).annotate(**{event: Sum(event) for event in EVENTS}).order_by()
+
+
+def _in_range(posts, period, start, end):
+	if routers.analytics_separate() and isinstance(posts, QuerySet):
+		# A query on the main database cannot be a subquery of one on the analytics database
+		posts = list(posts.values_list('pk', flat=True))
+	rows = AnalyticsRollup.objects.filter(post__in=posts, bucket__gte=start, bucket__lt=end)
+	if period == HOUR:
+		rows = rows.filter(period=HOUR)
+	return rows
+
+
+def series(posts, period, start, end):
+	"""
+	Summed counts of `posts` (a queryset or list of post ids) per bucket of `period` in
+	[start, end), as a list of {"bucket", "views", "likes", "comments"} with empty buckets
+	included. Hourly series only cover the hours that have not been compacted yet.
+	"""
+	start, end = truncate(start, period), truncate(end, period)
+	rows = _in_range(posts, period, start, end)
+	# Grouped on the stored bucket (hours are folded into days here rather than with a
+	# date function in SQL, which would be evaluated per row)
+	totals = defaultdict(lambda: dict.fromkeys(EVENTS, 0))
+	for row in _sums(rows, 'bucket'):
+		bucket = truncate(row['bucket'], period)
+		for event in EVENTS:
+			totals[bucket][event] += row[event] or 0
+
+	buckets = []
+	bucket = start
+	while bucket < end:
+		buckets.append({'bucket': bucket, **totals.get(bucket, dict.fromkeys(EVENTS, 0))})
+		bucket += STEPS[period]
+	return buckets
+
+
+def post_totals(posts, period, start, end, limit=10):
+	"""Counts per post over [start, end) for the `limit` most viewed of `posts`."""
+	start, end = truncate(start, period), truncate(end, period)
+	totals = list(_sums(_in_range(posts, period, start, end), 'post').order_by('-views', 'post')[:limit])
+	titles = {
+		pk: (slug, title)
+		for pk, slug, title in Post.objects.filter(pk__in=[row['post'] for row in totals]).values_list(
+			'pk', 'slug', 'title')
+	}
+	return [
+		{'post': row['post'], 'slug': titles[row['post']][0], 'title': titles[row['post']][1],
+		 **{event: row[event] for event in EVENTS}}
+		for row in totals if row['post'] in titles
+	]
+
+
+def hourly_retention():
+	return timedelta(days=getattr(settings, 'ANALYTICS_HOURLY_RETENTION_DAYS', 7))
+
+
+def compact(now=None):
+	"""
+	Fold the hourly rows of every day that ended more than the hourly retention ago into
+	daily rows, one day per transaction, then drop the daily rows older than
+	ANALYTICS_DAILY_RETENTION_DAYS (if set). Returns (days compacted, rows removed).
+	"""
+	cutoff = truncate((now or timezone.now()) - hourly_retention(), DAY)
+	hourly = AnalyticsRollup.objects.filter(period=HOUR)
+	days = removed = 0
+	while True:
+		oldest = hourly.filter(bucket__lt=cutoff).order_by('bucket').values_list('bucket', flat=True).first()
+		if oldest is None:
+			break
+		day = truncate(oldest, DAY)
+		with transaction.atomic(using=routers.analytics_database()):
+			rows = hourly.filter(bucket__gte=day, bucket__lt=day + STEPS[DAY])
+			add(DAY, {
+				(row['post'], day): {event: row[event] for event in EVENTS}
+				for row in _sums(rows, 'post')
+			})
+			removed += rows.delete()[0]
+		days += 1
+
+	daily_days = getattr(settings, 'ANALYTICS_DAILY_RETENTION_DAYS', None)
+	if daily_days:
+		removed += AnalyticsRollup.objects.filter(
+			period=DAY, bucket__lt=truncate(now or timezone.now(), DAY) - timedelta(days=daily_days)
+		).delete()[0]
+	return days, removed
@@ -0,0 +1,277 @@
+"""
+Database routing: analytics on their own database, primary / replica for the rest.
+
+AnalyticsRouter sends the analytics models (ANALYTICS_MODELS: the counters, their
+viewers and the time series) to the ANALYTICS_DATABASE alias when it is not `default`,
+so that the view and counter writes no longer share a lock with posts, comments and
+users. Their foreign keys to posts and users then cross databases: they have no
+database constraint, the code never joins across them (see `analytics_separate()`), and
+the rows of deleted posts and users are removed by signals. Their tables are also
+created on `default`, where they stay empty; `manage.py move_analytics` copies the rows
+of a shared database over.
+
+The other models are written to `default` (the primary). Reads made while serving a request go to
+one of the REPLICA_DATABASES aliases, picked round-robin or, with REPLICA_SELECTION =
+"least_loaded", as the replica with the fewest queries in flight. Reads stay on the
+primary:
+- inside a transaction on the primary, so a transaction never mixes the two;
+- for requests that are not GET / HEAD / OPTIONS, whose reads usually decide what to
+  write;
+- for the rest of a request once it has written (read-your-writes), and for
+  PRIMARY_PIN_SECONDS afterwards for requests from the same client (the user of the
+  bearer token, else the session, else the address), so a replica that lags behind
+  cannot hide a write from the client that made it;
+- for views with `use_primary = True`;
+- for the apps in PRIMARY_ONLY_APPS (sessions are read back right after being written);
+- outside requests (management commands, background threads), whose reads usually
+  decide what to write.
+
+The request state is kept by PrimaryPinningMiddleware. Locally, replicas can be SQLite
+files listed in DATABASE_REPLICAS and refreshed by `manage.py sync_replicas`, whose
+interval simulates replication lag.
+"""
+import hashlib
+import itertools
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_ONLY_APPS = {'sessions'}
+# Models (and the viewed_users through table) stored in ANALYTICS_DATABASE
+ANALYTICS_MODELS = {'postanalytics', 'postanalytics_viewed_users', 'analyticsrollup'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+	"""Routing state of one request: whether its reads are pinned to the primary."""
+
+	def __init__(self, pinned=False):
+		self.pinned = pinned
+		self.wrote = False
+
+
+_state = ContextVar('database_routing_state', default=None)
+_turn = itertools.count()
+_load = Counter()
+_load_lock = threading.Lock()
+
+
+def analytics_database():
+	return getattr(settings, 'ANALYTICS_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def analytics_separate():
+	"""True if the analytics models live in a database of their own."""
+	return analytics_database() != DEFAULT_DB_ALIAS
+
+
+def is_analytics(model):
+	"""
+	True for the analytics models. The historical models of data migrations (RunPython) are
+	left on the database being migrated; migration 0021 fills a separate analytics database.
+	"""
+	return (model._meta.app_label == 'blog_app' and model._meta.model_name in ANALYTICS_MODELS
+		and model.__module__ != '__fake__')
+
+
+def replica_aliases():
+	return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def pin_seconds():
+	return getattr(settings, 'PRIMARY_PIN_SECONDS', 5)
+
+
+def pin_to_primary():
+	"""Send the remaining reads of the current request to the primary."""
+	state = _state.get()
+	if state is not None:
+		state.pinned = True
+
+
+def token_user_id(raw_token):
+	"""The user id of a valid access token, None otherwise (checked without a query)."""
+	from rest_framework_simplejwt.authentication import JWTAuthentication
+	from rest_framework_simplejwt.exceptions import InvalidToken
+	from rest_framework_simplejwt.settings import api_settings
+
+	try:
+		return JWTAuthentication().get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+	except InvalidToken:
+		return None
+
+
+def client_of(request):
+	"""
+	Who a request comes from, for pinning: the user of its bearer token, else its session,
+	else (anonymous clients) its address. The view has not authenticated the request yet.
+	"""
+	from rest_framework_simplejwt.authentication import JWTAuthentication
+
+	authentication = JWTAuthentication()
+	header = authentication.get_header(request)
+	raw_token = authentication.get_raw_token(header) if header else None
+	user_id = token_user_id(raw_token) if raw_token else None
+	if user_id is not None:
+		return f'user:{user_id}'
+	session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+	if session_key:
+		return f'session:{session_key}'
+	return f"address:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def pin_key(client):
+	return f'db_pin:{hashlib.sha256(client.encode()).hexdigest()}'
+
+
+def carry_pin(request, access_token):
+	"""
+	Pin the user of a newly issued `access_token` if the client of `request` is pinned, so
+	that a user signing in right after writing (e.g. registering) keeps reading from the
+	primary with the new token.
+	"""
+	if replica_aliases() and pin_seconds() and cache.get(pin_key(client_of(request))) is not None:
+		cache.set(pin_key(f'user:{token_user_id(access_token)}'), True, timeout=pin_seconds())
+
+
+def choose_replica(replicas):
+	if getattr(settings, 'REPLICA_SELECTION', 'round_robin') == 'least_loaded':
+		# Ties are broken round-robin, so idle replicas share the reads
+		start = next(_turn)
+		ordered = replicas[start % len(replicas):] + replicas[:start % len(replicas)]
+		with _load_lock:
+			return min(ordered, key=lambda alias: _load[alias])
+	return replicas[next(_turn) % len(replicas)]
+
+
+def _count_query(execute, sql, params, many, context):
+	alias = context['connection'].alias
+	with _load_lock:
+		_load[alias] += 1
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		with _load_lock:
+			_load[alias] -= 1
+
+
+def track_load(connection):
+	"""Count the queries in flight on a new replica connection (for least_loaded)."""
+	if connection.alias in replica_aliases() and _count_query not in connection.execute_wrappers:
+		# First in the list, so that execute_wrapper() blocks still pop their own wrapper
+		connection.execute_wrappers.insert(0, _count_query)
+
+
+class AnalyticsRouter:
+	"""Sends the analytics models to ANALYTICS_DATABASE; defers to the next router otherwise."""
+
+	def db_for_read(self, model, **hints):
+		if analytics_separate() and is_analytics(model):
+			return analytics_database()
+		return None
+
+	db_for_write = db_for_read
+
+	def allow_relation(self, obj1, obj2, **hints):
+		if analytics_separate() and (is_analytics(obj1) or is_analytics(obj2)):
+			return True
+		return None
+
+	def allow_migrate(self, db, app_label, model_name=None, **hints):
+		# Only the analytics tables on the analytics database (and no data migrations,
+		# which read the other tables)
+		if analytics_separate() and db == analytics_database():
+			return app_label == 'blog_app' and model_name in ANALYTICS_MODELS
+		return None
+
+
+class PrimaryReplicaRouter:
+	"""Sends writes to the primary and the reads of requests to the replicas."""
+
+	def db_for_read(self, model, **hints):
+		replicas = replica_aliases()
+		state = _state.get()
+		if (not replicas or state is None or state.pinned or model._meta.app_label in PRIMARY_ONLY_APPS
+				or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+			return DEFAULT_DB_ALIAS
+		return choose_replica(replicas)
+
+	def db_for_write(self, model, **hints):
+		state = _state.get()
+		if state is not None:
+			state.pinned = state.wrote = True
+		return DEFAULT_DB_ALIAS
+
+	def allow_relation(self, obj1, obj2, **hints):
+		aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+		if obj1._state.db in aliases and obj2._state.db in aliases:
+			return True
+		return None
+
+	def allow_migrate(self, db, app_label, model_name=None, **hints):
+		# Replicas receive the schema from the primary
+		if db in replica_aliases():
+			return False
+		return None
+
+
+class PrimaryPinningMiddleware:
+	"""
+	Tracks the routing state of each request: pinned for unsafe methods, when the client
+	wrote within the last PRIMARY_PIN_SECONDS or the view sets `use_primary`, and from its
+	first write on.
+	Clients are the user of the bearer token, the session, or for anonymous requests the
+	address (see `client_of`).
+	"""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		if iscoroutinefunction(self.get_response):
+			markcoroutinefunction(self)
+
+	def __call__(self, request):
+		if iscoroutinefunction(self):
+			return self.__acall__(request)
+		state = RoutingState(pinned=request.method not in SAFE_METHODS or self.recently_wrote(request))
+		token = _state.set(state)
+		try:
+			response = self.get_response(request)
+		finally:
+			_state.reset(token)
+		self.remember(request, state)
+		return response
+
+	async def __acall__(self, request):
+		pinned = request.method not in SAFE_METHODS or (
+			bool(replica_aliases()) and await cache.aget(self.pin_key(request)) is not None)
+		state = RoutingState(pinned=pinned)
+		token = _state.set(state)
+		try:
+			response = await self.get_response(request)
+		finally:
+			_state.reset(token)
+		if state.wrote and replica_aliases() and pin_seconds():
+			await cache.aset(self.pin_key(request), True, timeout=pin_seconds())
+		return response
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+		if getattr(view_class, 'use_primary', False):
+			pin_to_primary()
+
+	def pin_key(self, request):
+		return pin_key(client_of(request))
+
+	def recently_wrote(self, request):
+		return bool(replica_aliases()) and cache.get(self.pin_key(request)) is not None
+
+	def remember(self, request, state):
+		if state.wrote and replica_aliases() and pin_seconds():
+			cache.set(self.pin_key(request), True, timeout=pin_seconds())
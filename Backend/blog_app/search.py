@@ -0,0 +1,107 @@
+"""
+Full-text search over post titles and content.
+
+On SQLite the posts are mirrored into an FTS5 virtual table (created by migration 0009
+and kept in sync by the Post signals), queried with BM25 ranking and prefix matching.
+Other databases, or SQLite builds without FTS5, fall back to `icontains` filtering.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+TABLE = 'blog_app_post_fts'
+# Relative BM25 weights of the (title, content) columns
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# FTS table presence, per database file
+_available = {}
+
+
+def is_available():
+	"""Return True if the FTS5 index exists on the default database."""
+	if connection.vendor != 'sqlite':
+		return False
+	key = connection.settings_dict['NAME']
+	if key not in _available:
+		_available[key] = TABLE in connection.introspection.table_names()
+	return _available[key]
+
+
+def build_match(query):
+	"""
+	Turn free text into an FTS5 MATCH expression: every word must match, as a prefix.
+	User input is never passed through as FTS syntax, so operators and quotes are inert.
+	"""
+	tokens = _TOKEN_RE.findall(query)
+	return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def filter_queryset(queryset, query):
+	"""
+	Restrict a Post queryset to the posts matching `query`, best match first.
+	The FTS table is joined into the queryset itself, so any other filter applies to every
+	match, and counts are exact.
+	"""
+	if not is_available():
+		return queryset.filter(Q(title__icontains=query) | Q(content__icontains=query))
+	match = build_match(query)
+	if not match:
+		return queryset.none()
+	posts = connection.ops.quote_name(queryset.model._meta.db_table)
+	# The unary + keeps SQLite from probing the index once per post (a full MATCH each time,
+	# when another filter such as the author is selective): the MATCH drives the join. Equal
+	# scores are ordered newest first, so that pages neither repeat nor skip posts
+	return queryset.extra(
+		tables=[TABLE],
+		where=[f'+{TABLE}.rowid = {posts}.id', f'{TABLE} MATCH %s'],
+		params=[match],
+		select={'search_rank': f'bm25({TABLE}, {TITLE_WEIGHT}, {CONTENT_WEIGHT})'},
+		order_by=['search_rank', '-id'],
+	)
+
+
+def index_posts(rows):
+	"""(Re)index an iterable of (id, title, content) tuples."""
+	rows = list(rows)
+	if not rows or not is_available():
+		return
+	with connection.cursor() as cursor:
+		cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+		cursor.executemany(f"INSERT INTO {TABLE} (rowid, title, content) VALUES (%s, %s, %s)", rows)
+
+
+def index_post(post):
+	index_posts([(post.pk, post.title, post.content)])
+
+
+def remove_post(post_id):
+	if not is_available():
+		return
+	with connection.cursor() as cursor:
+		cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [post_id])
+
+
+def rebuild(batch_size=1000):
+	"""Rebuild the whole index, reading posts in primary-key batches. Returns the number indexed."""
+	from .models import Post
+
+	if not is_available():
+		return 0
+	indexed = 0
+	last_pk = 0
+	with transaction.atomic(), connection.cursor() as cursor:
+		cursor.execute(f"DELETE FROM {TABLE}")
+		while True:
+			batch = list(
+				Post.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'title', 'content')[:batch_size]
+			)
+			if not batch:
+				break
+			cursor.executemany(f"INSERT INTO {TABLE} (rowid, title, content) VALUES (%s, %s, %s)", batch)
+			indexed += len(batch)
+			last_pk = batch[-1][0]
+	return indexed
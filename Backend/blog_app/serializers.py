@@ -1,10 +1,13 @@
 from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.exceptions import ValidationError
-from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.hashers import check_password
 
+from .images import variant_urls
 from .models import *
 
 CustomUser = get_user_model()
@@ -17,12 +20,18 @@ class RegisterSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = CustomUser
 		fields = ['username', 'email', 'password', 'date_of_birth', 'profile_picture', 'bio']
+		extra_kwargs = {
+			# Uniqueness is checked in validate(), in the same query as the email
+			'username': {'validators': [UnicodeUsernameValidator()]},
+		}
 
 	def validate(self, data):
-		# Validate email uniqueness
-		if CustomUser.objects.filter(username=data['username']).exists():
-			raise ValidationError("A user with this username already exists.")
-		if CustomUser.objects.filter(email=data['email']).exists():
+		# Validate username and email uniqueness with one query, before the password is hashed
+		taken = list(CustomUser.objects.filter(Q(username=data['username']) | Q(email=data['email'])).values_list(
+			'username', flat=True)[:2])
+		if data['username'] in taken:
+			raise ValidationError({'username': "A user with that username already exists."})
+		if taken:
 			raise ValidationError("A user with this email already exists.")
 		return data
 
@@ -39,7 +48,12 @@ class RegisterSerializer(serializers.ModelSerializer):
 		if 'profile_picture' in validated_data:
 			user.profile_picture = validated_data['profile_picture']
 
-		user.save()
+		try:
+			with transaction.atomic():
+				user.save()
+		except IntegrityError:
+			# The username was taken by a concurrent registration since validate()
+			raise serializers.ValidationError({'username': ["A user with that username already exists."]})
 		return user
 
 
@@ -68,19 +82,22 @@ class LoginSerializer(serializers.Serializer):
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
+	profile_picture_variants = serializers.SerializerMethodField()
+
 	class Meta:
 		model = CustomUser
-		fields = ['id', 'username', 'email', 'date_of_birth', 'profile_picture', 'is_admin', 'is_user', 'created_at',
-		          'updated_at', 'bio']
+		fields = ['id', 'username', 'email', 'date_of_birth', 'profile_picture', 'profile_picture_variants', 'is_admin',
+		          'is_user', 'created_at', 'updated_at', 'bio']
 		read_only_fields = ['is_admin', 'is_user', 'created_at', 'updated_at']
 
+	def get_profile_picture_variants(self, obj):
+		return variant_urls(obj.profile_picture, obj.profile_picture_variants, self.context.get('request'))
+
 	def update(self, instance, validated_data):
-		# Check if a new profile picture is provided
+		# Check if a new profile picture is provided (the replaced one is queued for
+		# deletion by CustomUser.save)
 		profile_picture = validated_data.pop("profile_picture", None)
 		if profile_picture:
-			# Remove the old profile picture if it exists
-			if instance.profile_picture and default_storage.exists(instance.profile_picture.name):
-				default_storage.delete(instance.profile_picture.name)
 			instance.profile_picture = profile_picture
 
 		# Update other fields dynamically
@@ -91,6 +108,19 @@ class UserProfileSerializer(serializers.ModelSerializer):
 		return instance
 
 
+class UserListSerializer(serializers.ModelSerializer):
+	"""Compact user representation for directory rows."""
+	profile_picture_variants = serializers.SerializerMethodField()
+
+	class Meta:
+		model = CustomUser
+		fields = ['id', 'username', 'profile_picture', 'profile_picture_variants', 'bio', 'created_at']
+		read_only_fields = fields
+
+	def get_profile_picture_variants(self, obj):
+		return variant_urls(obj.profile_picture, obj.profile_picture_variants, self.context.get('request'))
+
+
 class PasswordResetRequestSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
@@ -128,20 +158,26 @@ class PostSerializer(serializers.ModelSerializer):
 	author = UserProfileSerializer(read_only=True)
 	category = serializers.CharField(required=False)  # Accepts category name as a string
 	image = serializers.ImageField(required=False)
+	image_variants = serializers.SerializerMethodField()
 	analytics = serializers.SerializerMethodField()
 
 	class Meta:
 		model = Post
 		fields = '__all__'
 
+	def get_image_variants(self, obj):
+		return variant_urls(obj.image, obj.image_variants, self.context.get('request'))
+
 	def get_analytics(self, obj):
+		# Posts loaded through Post.objects.feed() carry the joined (or, with a separate
+		# analytics database, prefetched) analytics row, whose counter columns are kept up
+		# to date by blog_app.counters. Other posts read it from the analytics database.
 		try:
-			analytics = PostAnalytics.objects.get(post=obj)
-			comment_count = obj.comments.count()
+			analytics = obj.post_analytics
 			return {
 				'views': analytics.views,
 				'likes': analytics.likes,
-				'comments': comment_count
+				'comments': analytics.comment_count
 			}
 		except PostAnalytics.DoesNotExist:
 			return {
@@ -215,15 +251,39 @@ class CommentSerializer(serializers.ModelSerializer):
 	post_title = serializers.CharField(source='post.title',
 	                                   read_only=True)  # Assuming 'title' is a field in the Post model
 	post = serializers.SlugRelatedField(slug_field='slug', queryset=Post.objects.all())
+	parent = serializers.PrimaryKeyRelatedField(
+		queryset=Comment.objects.all(), required=False, allow_null=True
+	)  # Set to reply to a comment
 
 	class Meta:
 		model = Comment
 		fields = "__all__"
 
+	def validate(self, data):
+		parent = data.get('parent')
+		if self.instance is not None:
+			# Moving a comment would have to rewrite the paths of its whole subtree
+			if 'parent' in data and parent != self.instance.parent:
+				raise serializers.ValidationError({'parent': "A comment cannot be moved to another thread."})
+			return data
+		if parent is not None:
+			# A comment created through a post's URL (context['post']) is saved on that post
+			post = self.context.get('post') or data.get('post')
+			if post is not None and parent.post_id != post.pk:
+				raise serializers.ValidationError({'parent': "A reply must be on the same post as its parent."})
+			if parent.depth >= Comment.MAX_DEPTH:
+				raise serializers.ValidationError({'parent': "This thread is nested too deeply to reply to."})
+		return data
+
 	def create(self, validated_data):
 		return Comment.objects.create(**validated_data)
 
 
+class ThreadedCommentSerializer(CommentSerializer):
+	"""A top-level comment with its first replies (`first_replies`, see CommentManager)."""
+	replies = CommentSerializer(source='first_replies', many=True, read_only=True)
+
+
 # Category Serializer
 class CategorySerializer(serializers.ModelSerializer):
 	class Meta:
@@ -233,9 +293,11 @@ class CategorySerializer(serializers.ModelSerializer):
 
 # PostAnalytics Serializer
 class PostAnalyticsSerializer(serializers.ModelSerializer):
+	unique_viewers = serializers.IntegerField(read_only=True)
+
 	class Meta:
 		model = PostAnalytics
-		fields = ['id', 'post', 'views', 'likes']
+		fields = ['id', 'post', 'views', 'likes', 'unique_viewers', 'trending_score']
 
 
 class FollowSerializer(serializers.ModelSerializer):
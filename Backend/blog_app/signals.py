@@ -1,25 +1,226 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
 from django.db.models.signals import post_delete
+from django.db.models.signals import pre_delete
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from . import caching, images, media_gc, routers, search, sqlite, timeline, trending
+from .authentication import invalidate_user
+from .buffers import counter_buffer, rollup_buffer
 from .models import *
+from .serializers import UserProfileSerializer
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+	sqlite.configure(connection)
+	routers.track_load(connection)
 
 
 @receiver(post_save, sender=Post)
 def create_post_analytics(sender, instance, created, **kwargs):
-	if created and not hasattr(instance, 'analytics'):
-		PostAnalytics.objects.create(post=instance)
+	if created:
+		offset = trending.offset(instance.created_at)
+		create = lambda: PostAnalytics.objects.get_or_create(
+			post_id=instance.pk, defaults={'trending_offset': offset, 'trending_score': offset}
+		)
+		if routers.analytics_separate():
+			# The analytics database is not part of the transaction creating the post
+			transaction.on_commit(create)
+		else:
+			create()
+
+
+# Signals to delete the analytics rows of deleted posts and users stored in a separate
+# analytics database, which the delete cascade does not reach
+@receiver(post_delete, sender=Post)
+def delete_post_analytics(sender, instance, **kwargs):
+	if routers.analytics_separate():
+		post_id = instance.pk
+
+		def delete():
+			PostAnalytics.objects.filter(post_id=post_id).delete()
+			AnalyticsRollup.objects.filter(post_id=post_id).delete()
+
+		transaction.on_commit(delete)
 
 
-# Signal to handle likes when a PostLike instance is created
+@receiver(post_delete, sender=CustomUser)
+def delete_user_views(sender, instance, **kwargs):
+	if routers.analytics_separate():
+		user_id = instance.pk
+		transaction.on_commit(
+			lambda: PostAnalytics.viewed_users.through.objects.filter(customuser_id=user_id).delete()
+		)
+
+
+def record_rollup(post_id, event, amount):
+	"""Count an event in the analytics time series once the transaction commits."""
+	transaction.on_commit(lambda: rollup_buffer.record(post_id, event, amount))
+
+
+def adjust_counter(post_id, field, delta):
+	"""
+	Adjust a post counter in the current transaction, or, in SQLite single-writer mode and
+	with a separate analytics database (which is not part of the transaction), buffer the
+	change once the transaction commits so that it is written in a batch.
+	"""
+	if sqlite.single_writer() or routers.analytics_separate():
+		transaction.on_commit(lambda: counter_buffer.record(post_id, field, delta))
+	else:
+		counter_buffer.adjusters[field](post_id, delta)
+
+
+# Signals to keep the like counter in sync with PostLike rows
 @receiver(post_save, sender=PostLike)
 def handle_post_like(sender, instance, created, **kwargs):
 	if created:
-		instance.post.increment_likes()
+		adjust_counter(instance.post_id, 'likes', 1)
+		record_rollup(instance.post_id, 'likes', 1)
+
+
+@receiver(post_delete, sender=PostLike)
+def handle_post_unlike(sender, instance, **kwargs):
+	adjust_counter(instance.post_id, 'likes', -1)
+	record_rollup(instance.post_id, 'likes', -1)
 
 
-# Signal to delete the image file when the Post instance is deleted
+# Signals to keep the comment and reply counters in sync with Comment rows
+@receiver(post_save, sender=Comment)
+def handle_comment_created(sender, instance, created, **kwargs):
+	if created:
+		adjust_counter(instance.post_id, 'comment_count', 1)
+		record_rollup(instance.post_id, 'comments', 1)
+		if instance.parent_id:
+			Comment.objects.filter(pk=instance.parent_id).update(reply_count=F('reply_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def handle_comment_deleted(sender, instance, **kwargs):
+	adjust_counter(instance.post_id, 'comment_count', -1)
+	record_rollup(instance.post_id, 'comments', -1)
+	if instance.parent_id:
+		Comment.objects.filter(pk=instance.parent_id, reply_count__gt=0).update(reply_count=F('reply_count') - 1)
+
+
+# Signals to queue the image files of deleted rows for the media sweeper
 @receiver(post_delete, sender=Post)
 def delete_image_on_post_delete(sender, instance, **kwargs):
-	if instance.image:
-		instance.image.delete(save=False)
+	media_gc.discard(instance.image.name, images.POST_IMAGE_VARIANTS)
+
+
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=Admin)
+@receiver(post_delete, sender=User)
+def delete_profile_picture_on_user_delete(sender, instance, **kwargs):
+	media_gc.discard(instance.profile_picture.name, images.PROFILE_PICTURE_VARIANTS)
+
+
+# Signals to generate resized variants of uploaded images
+@receiver(post_save, sender=Post)
+def generate_post_image_variants(sender, instance, **kwargs):
+	if images.needs_variants(instance.image, instance.image_variants):
+		images.schedule(instance, 'image', 'image_variants', images.POST_IMAGE_VARIANTS)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Admin)
+@receiver(post_save, sender=User)
+def generate_profile_picture_variants(sender, instance, **kwargs):
+	if images.needs_variants(instance.profile_picture, instance.profile_picture_variants):
+		images.schedule(instance, 'profile_picture', 'profile_picture_variants', images.PROFILE_PICTURE_VARIANTS)
+
+
+# Signals to keep the full-text search index in sync with posts
+@receiver(post_save, sender=Post)
+def index_post_for_search(sender, instance, **kwargs):
+	search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_search(sender, instance, **kwargs):
+	search.remove_post(instance.pk)
+
+
+# Signals to keep the materialized home timelines in sync with posts and follows
+@receiver(post_save, sender=Post)
+def update_timelines(sender, instance, created, **kwargs):
+	was_published = False if created else getattr(instance, '_stored_published', None)
+	if instance.is_published and not was_published:
+		timeline.fan_out(instance)
+	elif not instance.is_published and was_published is not False:
+		timeline.retract(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_posts_to_timeline(sender, instance, created, **kwargs):
+	if created:
+		timeline.follow(instance.follower_id, instance.followed_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_unfollowed_posts_from_timeline(sender, instance, **kwargs):
+	timeline.unfollow(instance.follower_id, instance.followed_id)
+
+
+# Signals to invalidate cached anonymous responses affected by a write
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_responses(sender, instance, **kwargs):
+	caching.bump(caching.POST_LIST, caching.post_scope(instance.slug))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=PostLike)
+@receiver(post_delete, sender=PostLike)
+def invalidate_post_counter_responses(sender, instance, **kwargs):
+	slug = Post.objects.filter(pk=instance.post_id).values_list('slug', flat=True).first()
+	caching.bump(caching.POST_LIST, caching.post_scope(slug))
+
+
+@receiver(images.variants_generated, sender=Post)
+def invalidate_post_image_responses(sender, pk, **kwargs):
+	slug = Post.objects.filter(pk=pk).values_list('slug', flat=True).first()
+	caching.bump(caching.POST_LIST, caching.post_scope(slug))
+
+
+# Posts embed the name of their category: pre_delete, since the posts lose it with the row
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_category_responses(sender, instance, **kwargs):
+	caching.bump_posts(Post.objects.filter(category=instance), caching.CATEGORY_LIST)
+
+
+# Posts embed the profile of their author (PostSerializer.author); saves that change none
+# of its fields, such as the last_login update of a sign-in, leave the responses cached
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Admin)
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, created, update_fields=None, **kwargs):
+	if created or (update_fields and not set(update_fields) & set(UserProfileSerializer.Meta.fields)):
+		return
+	caching.bump_posts(Post.objects.filter(author_id=instance.pk))
+
+
+@receiver(images.variants_generated, sender=CustomUser)
+def invalidate_author_picture_responses(sender, pk, **kwargs):
+	caching.bump_posts(Post.objects.filter(author_id=pk))
+
+
+# Signals to drop the cached authenticated user (blog_app.authentication) when it changes
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Admin)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=Admin)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+	invalidate_user(instance.pk)
+
+
+@receiver(images.variants_generated, sender=CustomUser)
+def invalidate_cached_user_picture(sender, pk, **kwargs):
+	invalidate_user(pk)
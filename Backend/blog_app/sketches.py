@@ -0,0 +1,165 @@
+"""
+Compact probabilistic structures for unique-viewer tracking.
+
+A `ViewerSketch` pairs a scalable Bloom filter (answers "has this user already seen the
+post?" with a small false-positive rate and no false negatives) with a HyperLogLog
+(estimates the number of distinct viewers). Both serialize to a single byte string
+stored in `PostAnalytics.viewer_sketch`, replacing one `viewed_users` row per reader.
+"""
+import hashlib
+import math
+import struct
+
+from django.conf import settings
+
+SKETCH_VERSION = 1
+_HEADER = struct.Struct('<BBdIB')  # version, HLL precision, Bloom error rate, initial capacity, filter count
+_FILTER = struct.Struct('<IIIB')  # capacity, count, bit size, hash count
+
+
+def _hash(value):
+	"""Return two independent 64-bit hashes of `value`."""
+	digest = hashlib.blake2b(str(value).encode(), digest_size=16).digest()
+	return struct.unpack('<QQ', digest)
+
+
+class BloomFilter:
+	"""Fixed-size Bloom filter using double hashing."""
+
+	def __init__(self, capacity, size, hash_count, count=0, bits=None):
+		self.capacity = capacity
+		self.size = size
+		self.hash_count = hash_count
+		self.count = count
+		self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+
+	@classmethod
+	def for_error_rate(cls, capacity, error_rate):
+		"""Size a filter to hold `capacity` items at the given false-positive rate."""
+		size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+		return cls(capacity, size, max(1, round(size / capacity * math.log(2))))
+
+	def _positions(self, hashes):
+		h1, h2 = hashes
+		return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+	def __contains__(self, hashes):
+		return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(hashes))
+
+	def add(self, hashes):
+		for pos in self._positions(hashes):
+			self.bits[pos >> 3] |= 1 << (pos & 7)
+		self.count += 1
+
+	@property
+	def is_full(self):
+		return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+	"""
+	Bloom filter that grows by appending larger filters with tighter error rates, so the
+	overall false-positive rate stays below `error_rate` however many items are added.
+	"""
+	growth = 2
+	tightening = 0.5
+
+	def __init__(self, initial_capacity, error_rate, filters=None):
+		self.initial_capacity = initial_capacity
+		self.error_rate = error_rate
+		self.filters = filters or []
+
+	def __contains__(self, hashes):
+		return any(hashes in bloom for bloom in self.filters)
+
+	def add(self, hashes):
+		"""Add an item; returns False if it was (probably) already present."""
+		if hashes in self:
+			return False
+		if not self.filters or self.filters[-1].is_full:
+			level = len(self.filters)
+			self.filters.append(BloomFilter.for_error_rate(
+				self.initial_capacity * self.growth ** level,
+				self.error_rate * (1 - self.tightening) * self.tightening ** level,
+			))
+		self.filters[-1].add(hashes)
+		return True
+
+
+class HyperLogLog:
+	"""HyperLogLog cardinality estimator with 2**precision one-byte registers."""
+
+	def __init__(self, precision, registers=None):
+		self.precision = precision
+		self.m = 1 << precision
+		self.registers = registers if registers is not None else bytearray(self.m)
+
+	def add(self, hashes):
+		value = hashes[0]
+		index = value >> (64 - self.precision)
+		remaining = (value << self.precision) & 0xFFFFFFFFFFFFFFFF
+		rank = min(64 - self.precision, 64 - remaining.bit_length()) + 1
+		if rank > self.registers[index]:
+			self.registers[index] = rank
+
+	def estimate(self):
+		alpha = 0.7213 / (1 + 1.079 / self.m)
+		estimate = alpha * self.m * self.m / sum(2.0 ** -register for register in self.registers)
+		zeros = self.registers.count(0)
+		if estimate <= 2.5 * self.m and zeros:
+			# Small-range correction (linear counting)
+			estimate = self.m * math.log(self.m / zeros)
+		return round(estimate)
+
+
+class ViewerSketch:
+	"""Bloom filter + HyperLogLog for one post's viewers."""
+
+	def __init__(self, bloom=None, hll=None):
+		self.bloom = bloom or ScalableBloomFilter(
+			getattr(settings, 'VIEW_SKETCH_CAPACITY', 1000), getattr(settings, 'VIEW_SKETCH_ERROR_RATE', 0.01)
+		)
+		self.hll = hll or HyperLogLog(getattr(settings, 'VIEW_SKETCH_HLL_PRECISION', 12))
+
+	def add(self, user_id):
+		"""Record a viewer; returns True if they had (probably) not been seen before."""
+		hashes = _hash(user_id)
+		self.hll.add(hashes)
+		return self.bloom.add(hashes)
+
+	def __contains__(self, user_id):
+		return _hash(user_id) in self.bloom
+
+	def unique_count(self):
+		return self.hll.estimate()
+
+	def to_bytes(self):
+		parts = [
+			_HEADER.pack(SKETCH_VERSION, self.hll.precision, self.bloom.error_rate, self.bloom.initial_capacity,
+			             len(self.bloom.filters)),
+			bytes(self.hll.registers),
+		]
+		for bloom in self.bloom.filters:
+			parts.append(_FILTER.pack(bloom.capacity, bloom.count, bloom.size, bloom.hash_count))
+			parts.append(bytes(bloom.bits))
+		return b''.join(parts)
+
+	@classmethod
+	def from_bytes(cls, data):
+		if not data:
+			return cls()
+		data = bytes(data)
+		version, precision, error_rate, initial_capacity, filter_count = _HEADER.unpack_from(data)
+		if version != SKETCH_VERSION:
+			raise ValueError(f"Unsupported viewer sketch version {version}.")
+		offset = _HEADER.size
+		hll = HyperLogLog(precision, bytearray(data[offset:offset + (1 << precision)]))
+		offset += 1 << precision
+		filters = []
+		for _ in range(filter_count):
+			capacity, count, size, hash_count = _FILTER.unpack_from(data, offset)
+			offset += _FILTER.size
+			length = (size + 7) // 8
+			filters.append(BloomFilter(capacity, size, hash_count, count, bytearray(data[offset:offset + length])))
+			offset += length
+		return cls(ScalableBloomFilter(initial_capacity, error_rate, filters), hll)
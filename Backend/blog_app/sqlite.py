@@ -0,0 +1,57 @@
+"""
+SQLite production profile.
+
+Stock SQLite keeps a rollback journal: a committing writer locks out every reader, and a
+transaction that reads before it writes fails at once with "database is locked" when
+another connection holds the write lock, whatever the timeout. With SQLITE_PRODUCTION
+set, every new connection switches to WAL (readers no longer wait for the writer) and
+applies the pragmas below, and transactions start with BEGIN IMMEDIATE (see
+`DATABASES` in settings), so concurrent writers queue on the busy timeout instead of
+failing.
+
+With SQLITE_SINGLE_WRITER also set, counter and analytics writes (likes, comments,
+views and the time series) are buffered and written by one background thread in
+batched transactions (blog_app.buffers), so they no longer compete with requests for
+the write lock. Counters then lag by up to one flush interval.
+
+`manage.py benchmark_sqlite` measures writes per second and lock errors of each mode.
+"""
+from django.conf import settings
+
+# Applied in this order on every new connection; SQLITE_PRAGMAS overrides single values
+DEFAULT_PRAGMAS = {
+	'journal_mode': 'WAL',
+	# Commits are durable once checkpointed; a power loss can lose the last transactions
+	# but never corrupts the database in WAL mode
+	'synchronous': 'NORMAL',
+	'busy_timeout': 5000,  # Milliseconds a connection waits for a lock
+	'cache_size': -64000,  # Negative values are KiB (64 MB of page cache per connection)
+	'mmap_size': 256 * 1024 * 1024,
+	'temp_store': 'MEMORY',
+}
+
+
+def enabled():
+	return getattr(settings, 'SQLITE_PRODUCTION', False)
+
+
+def single_writer():
+	"""True if counter and analytics writes go through the single writer thread."""
+	return enabled() and getattr(settings, 'SQLITE_SINGLE_WRITER', False)
+
+
+def pragmas():
+	return {**DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def pragma_statements():
+	return [f'PRAGMA {name} = {value}' for name, value in pragmas().items()]
+
+
+def configure(connection):
+	"""Apply the production pragmas to a new Django SQLite connection, if enabled."""
+	if connection.vendor != 'sqlite' or not enabled():
+		return
+	with connection.cursor() as cursor:
+		for statement in pragma_statements():
+			cursor.execute(statement)
@@ -0,0 +1,31 @@
+"""
+Batched per-user counts (followers, following, posts).
+
+Each metric is one grouped aggregate over all requested users, so the cost of a page
+of users no longer grows with the number of users on it.
+"""
+from django.db.models import Count
+
+from .models import Follow, Post
+
+
+def _grouped_count(queryset, field, user_ids):
+	return dict(
+		queryset.filter(**{f'{field}__in': user_ids}).order_by().values_list(field).annotate(total=Count('pk'))
+	)
+
+
+def user_counts(user_ids):
+	"""Return {user_id: {"followers_count", "following_count", "post_count"}} for `user_ids`."""
+	user_ids = list(user_ids)
+	followers = _grouped_count(Follow.objects.all(), 'followed_id', user_ids)
+	following = _grouped_count(Follow.objects.all(), 'follower_id', user_ids)
+	posts = _grouped_count(Post.objects.all(), 'author_id', user_ids)
+	return {
+		user_id: {
+			'followers_count': followers.get(user_id, 0),
+			'following_count': following.get(user_id, 0),
+			'post_count': posts.get(user_id, 0),
+		}
+		for user_id in user_ids
+	}
@@ -1,3 +1,1751 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+	authentication, caching, counters, exporting, images, importing, media_gc, rollups, routers, search, timeline,
+	trending,
+)
+from .buffers import Flusher, counter_buffer, rollup_buffer, view_buffer
+from .models import (
+	Admin, AnalyticsRollup, Category, Comment, CustomUser, Follow, OrphanedFile, Post, PostAnalytics, PostLike,
+	TimelineEntry, User,
+)
+from .serializers import PostSerializer, RegisterSerializer, UserListSerializer, UserProfileSerializer
+from .sketches import ViewerSketch
+from .views import UserListView
+
+# Buffers write through and passwords hash cheaply, so that tests stay fast and never
+# leave work to a background thread
+TEST_SETTINGS = override_settings(
+	PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+	VIEW_BUFFER_FLUSH_INTERVAL=0,
+	ROLLUP_BUFFER_FLUSH_INTERVAL=0,
+	COUNTER_BUFFER_FLUSH_INTERVAL=0,
+)
+
+
+def make_user(username, **fields):
+	return CustomUser.objects.create_user(username, f'{username}@example.com', 'password', **fields)
+
+
+def make_post(author, title='A post', **fields):
+	fields.setdefault('content', 'Some content')
+	fields.setdefault('is_published', True)
+	post = Post.objects.create(author=author, title=title, **fields)
+	if routers.analytics_separate():
+		# The analytics row is only created once the post commits, which a TestCase never does
+		counters.ensure_analytics([post.pk])
+	return post
+
+
+def client_for(user=None):
+	client = APIClient()
+	if user is not None:
+		client.force_authenticate(user)
+	return client
+
+
+def run_in_threads(target, count):
+	"""Call `target(number)` from `count` threads at once; returns the exceptions raised."""
+	errors = []
+	start = threading.Barrier(count)
+
+	def run(number):
+		try:
+			start.wait()
+			target(number)
+		except Exception as exc:
+			errors.append(exc)
+		finally:
+			connection.close()
+
+	threads = [threading.Thread(target=run, args=(number,)) for number in range(count)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return errors
+
+
+def retry_locked(function, attempts=50):
+	"""Call `function`, retrying while stock SQLite reports "database is locked"."""
+	for attempt in range(attempts):
+		try:
+			return function()
+		except OperationalError as exc:
+			if 'locked' not in str(exc) or attempt == attempts - 1:
+				raise
+			time.sleep(random.uniform(0, min(0.2, 0.005 * 2 ** attempt)))
+
+
+class BlogTestMixin:
+	# The analytics database, when ANALYTICS_DATABASE_PATH gives it a file of its own
+	databases = {DEFAULT_DB_ALIAS, routers.analytics_database()}
+
+	def setUp(self):
+		super().setUp()
+		cache.clear()
+
+	def tearDown(self):
+		for buffer in (counter_buffer, view_buffer, rollup_buffer):
+			buffer.flush()
+		super().tearDown()
+
+
+@TEST_SETTINGS
+class BlogTestCase(BlogTestMixin, TestCase):
+	pass
+
+
+@TEST_SETTINGS
+class BlogTransactionTestCase(BlogTestMixin, TransactionTestCase):
+	"""For tests that write from several threads, which need committed data."""
+
+
+# ----------------------------------------------------------------
+# Post listings (Post.objects.feed())
+# ----------------------------------------------------------------
+class FeedQueryCountTests(BlogTestCase):
+	"""Listing posts costs the same number of queries whatever the number of posts."""
+
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.reader = make_user('reader')
+		self.client = client_for(self.author)
+
+	def add_posts(self, count):
+		# With a separate analytics database the counters are updated on commit
+		with self.captureOnCommitCallbacks(execute=True):
+			for number in range(count):
+				post = make_post(self.author, f'Post {Post.objects.count()}')
+				Comment.objects.create(post=post, author=self.reader, content='Nice')
+				PostLike.objects.create(post=post, user=self.reader)
+
+	def count_queries(self, path):
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(path)
+		self.assertEqual(response.status_code, 200)
+		return len(queries)
+
+	def test_query_count_does_not_grow_with_the_page(self):
+		paths = ['/api/posts/', '/api/posts/recent/?limit=20', f'/api/users/{self.author.pk}/posts/']
+		self.add_posts(2)
+		small = [self.count_queries(path) for path in paths]
+		self.add_posts(10)
+		self.assertEqual([self.count_queries(path) for path in paths], small)
+
+	def test_counters_are_read_from_the_feed(self):
+		self.add_posts(3)
+		results = self.client.get('/api/posts/').json()['results']
+		self.assertEqual(len(results), 3)
+		for post in results:
+			self.assertEqual(post['analytics'], {'views': 0, 'likes': 1, 'comments': 1})
+
+
+# ----------------------------------------------------------------
+# Counters (blog_app.counters)
+# ----------------------------------------------------------------
+class CounterTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.post = make_post(self.author)
+
+	def counts(self):
+		return counters.get_counts(self.post.pk)
+
+	def test_increments(self):
+		counters.increment_views(self.post.pk, 3)
+		counters.adjust_likes(self.post.pk, 2)
+		counters.adjust_likes(self.post.pk, -1)
+		self.assertEqual(self.counts(), {'views': 3, 'likes': 1, 'comment_count': 0})
+
+	def test_counters_never_drop_below_zero(self):
+		counters.adjust_likes(self.post.pk, -1)
+		self.assertEqual(self.counts()['likes'], 0)
+
+	def test_missing_analytics_row_is_created(self):
+		PostAnalytics.objects.filter(post=self.post).delete()
+		counters.adjust_comments(self.post.pk, 1)
+		self.assertEqual(self.counts()['comment_count'], 1)
+
+	def test_likes_and_comments_update_the_counters(self):
+		client = client_for(make_user('reader'))
+		# With a separate analytics database the counters are updated on commit
+		# (the like endpoint's own count is tested by AnalyticsDatabaseTests, whose requests commit)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.assertTrue(client.post(f'/api/posts/{self.post.slug}/like/').json()['is_liked'])
+		self.assertEqual(self.counts()['likes'], 1)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.assertFalse(client.post(f'/api/posts/{self.post.slug}/like/').json()['is_liked'])
+		self.assertEqual(self.counts()['likes'], 0)
+		with self.captureOnCommitCallbacks(execute=True):
+			comment = Comment.objects.create(post=self.post, author=self.author, content='Hi')
+		self.assertEqual(self.counts()['comment_count'], 1)
+		with self.captureOnCommitCallbacks(execute=True):
+			comment.delete()
+		self.assertEqual(self.counts()['comment_count'], 0)
+
+	def test_reconcile_repairs_drift(self):
+		PostLike.objects.create(post=self.post, user=self.author)
+		PostAnalytics.objects.filter(post=self.post).update(likes=7, comment_count=3)
+		PostAnalytics.objects.filter(post=make_post(self.author, 'Other')).delete()
+		self.assertEqual(counters.reconcile(), (1, 1))
+		self.assertEqual(self.counts(), {'views': 0, 'likes': 1, 'comment_count': 0})
+
+
+class ConcurrentCounterTests(BlogTransactionTestCase):
+	"""Concurrent writers never lose an increment."""
+
+	def setUp(self):
+		super().setUp()
+		self.post = make_post(make_user('author'))
+
+	def test_concurrent_increments_are_not_lost(self):
+		def increment(number):
+			for _ in range(25):
+				retry_locked(lambda: counters.increment_views(self.post.pk))
+
+		self.assertEqual(run_in_threads(increment, 8), [])
+		self.assertEqual(counters.get_counts(self.post.pk)['views'], 200)
+
+	def test_concurrent_likes_and_unlikes_keep_the_count_exact(self):
+		users = [make_user(f'reader{number}') for number in range(8)]
+
+		def toggle(number):
+			client = client_for(users[number])
+			for _ in range(5):
+				# A retried request may toggle twice, so only the total is checked below
+				response = retry_locked(lambda: client.post(f'/api/posts/{self.post.slug}/like/'))
+				assert response.status_code == 200, response.content
+
+		self.assertEqual(run_in_threads(toggle, len(users)), [])
+		self.assertEqual(
+			counters.get_counts(self.post.pk)['likes'], PostLike.objects.filter(post=self.post).count()
+		)
+
+
+class VisibilityTests(BlogTestCase):
+	"""Signed-in users list their own posts and the published ones (Post.visible_to)."""
+
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.other = make_user('other')
+		self.own_draft = make_post(self.author, 'My draft', is_published=False)
+		self.own_post = make_post(self.author, 'My post')
+		self.published = make_post(self.other, 'Published')
+		make_post(self.other, 'Their draft', is_published=False)
+
+	def test_own_drafts_and_published_posts_are_listed(self):
+		expected = [self.published.pk, self.own_post.pk, self.own_draft.pk]
+		for path in ('/api/posts/', '/api/posts/?pagination=cursor'):
+			results = client_for(self.author).get(path).json()['results']
+			self.assertEqual([post['id'] for post in results], expected, path)
+		# The async views authenticate the token themselves
+		token = RefreshToken.for_user(self.author).access_token
+		response = APIClient().get('/api/async/posts/', HTTP_AUTHORIZATION=f'Bearer {token}')
+		self.assertEqual([post['id'] for post in response.json()['results']], expected)
+
+	def test_listing_pages_walk_the_created_index(self):
+		for number in range(30):
+			make_post(self.other, f'Post {number}')
+		with connection.cursor() as cursor:
+			cursor.execute('ANALYZE')  # As migration 0020 does
+		queryset = Post.objects.feed().filter(Post.visible_to(self.author))
+		after = self.published
+		keyset = queryset.filter(  # As KeysetPagination filters the pages after the first
+			Q(created_at__lt=after.created_at) | Q(created_at=after.created_at, pk__lt=after.pk),
+			created_at__lte=after.created_at,
+		)
+		for page in (queryset[:10], keyset[:10]):
+			sql, params = page.query.sql_with_params()
+			self.assertNotIn('DISTINCT', sql)
+			with connection.cursor() as cursor:
+				cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+				plan = [row[-1] for row in cursor.fetchall()]
+			self.assertIn('USING INDEX post_created_idx', plan[0])
+			self.assertFalse(any('TEMP B-TREE' in step for step in plan), plan)
+
+# ----------------------------------------------------------------
+# Cursor pagination (blog_app.pagination.KeysetPagination)
+# ----------------------------------------------------------------
+class KeysetPaginationTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.client = client_for(self.author)
+		for number in range(7):
+			make_post(self.author, f'Post {number}')
+		# Ties on created_at are broken by id
+		Post.objects.filter(title__in=['Post 2', 'Post 3', 'Post 4']).update(created_at=timezone.now())
+
+	def feed_ids(self):
+		return list(Post.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+	def page(self, url, **params):
+		response = self.client.get(url, params)
+		self.assertEqual(response.status_code, 200)
+		return response.json()
+
+	def walk(self, url, **params):
+		"""Ids of every page, following the `next` links."""
+		ids = []
+		page = self.page(url, **params)
+		while True:
+			ids += [row['id'] for row in page['results']]
+			if not page['next']:
+				return ids
+			page = self.page(page['next'])
+
+	def test_pages_follow_a_stable_order(self):
+		self.assertEqual(self.walk('/api/posts/', pagination='cursor', page_size=2), self.feed_ids())
+		page = self.page('/api/posts/', pagination='cursor', page_size=2)
+		self.assertNotIn('count', page)
+		self.assertEqual(self.page('/api/posts/', pagination='cursor', with_count='true')['count'], 7)
+
+	def test_cursors_round_trip(self):
+		first = self.page('/api/posts/', pagination='cursor', page_size=3)
+		second = self.page(first['next'])
+		self.assertIsNone(first['previous'])
+		back = self.page(second['previous'])
+		self.assertEqual([row['id'] for row in back['results']], [row['id'] for row in first['results']])
+		self.assertEqual(self.page(back['next'])['results'], second['results'])
+
+	def test_posts_added_between_pages_are_neither_repeated_nor_skipped(self):
+		expected = self.feed_ids()
+		page = self.page('/api/posts/', pagination='cursor', page_size=2)
+		ids = [row['id'] for row in page['results']]
+		for number in range(3):
+			make_post(self.author, f'New post {number}')
+		ids += self.walk(page['next'])
+		self.assertEqual(ids, expected)
+
+	def test_an_invalid_cursor_is_not_found(self):
+		self.assertEqual(self.client.get('/api/posts/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+	def test_followers(self):
+		readers = [make_user(f'reader{number}') for number in range(5)]
+		for reader in readers:
+			Follow.objects.create(follower=reader, followed=self.author)
+		ids = self.walk(f'/api/users/{self.author.pk}/followers/', pagination='cursor', page_size=2)
+		self.assertEqual(ids, [reader.pk for reader in reversed(readers)])
+
+# ----------------------------------------------------------------
+# Full-text search (blog_app.search)
+# ----------------------------------------------------------------
+class SearchTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.other = make_user('other')
+
+	def search(self, query, **params):
+		# Authenticated, so that responses are never served from the response cache
+		return client_for(self.other).get('/api/posts/', {'q': query, **params}).json()
+
+	def test_title_matches_rank_first_and_words_match_as_prefixes(self):
+		in_content = make_post(self.author, 'Animals', content='A zebra crossing')
+		in_title = make_post(self.author, 'Zebras of the plains')
+		make_post(self.author, 'Horses')
+		results = self.search('zeb')['results']
+		self.assertEqual([post['id'] for post in results], [in_title.pk, in_content.pk])
+
+	def test_the_index_follows_edits_and_deletions(self):
+		post = make_post(self.author, 'Zebras')
+		post.title = 'Horses'
+		post.save()
+		self.assertEqual(self.search('zebras')['count'], 0)
+		self.assertEqual(self.search('horses')['count'], 1)
+		post.delete()
+		self.assertEqual(self.search('horses')['count'], 0)
+
+	def test_equal_scores_page_in_a_stable_order(self):
+		posts = [make_post(self.author, 'Zebras', slug=f'zebras-{number}', content='Zebras') for number in range(5)]
+		ids = []
+		for page in range(1, 6):
+			ids += [post['id'] for post in self.search('zebras', page=page, page_size=1)['results']]
+		self.assertEqual(ids, [post.pk for post in reversed(posts)])
+
+	def test_filters_apply_to_every_match(self):
+		if not search.is_available():
+			self.skipTest("SQLite was built without FTS5")
+		Post.objects.bulk_create(
+			Post(author=self.other, title=f'Zebra {number}', slug=f'zebra-{number}', content='Zebra', is_published=True)
+			for number in range(600)
+		)
+		search.rebuild()
+		mine = make_post(self.author, 'A zebra too', content='Mentioned once')
+		# The worst of 601 matches, past the 500 the search used to stop at
+		response = self.search('zebra', author=self.author.pk)
+		self.assertEqual([post['id'] for post in response['results']], [mine.pk])
+		self.assertEqual(self.search('zebra')['count'], 601)
+
+# ----------------------------------------------------------------
+# Unique viewers (blog_app.sketches)
+# ----------------------------------------------------------------
+class ViewerSketchTests(SimpleTestCase):
+	def test_estimates_survive_a_round_trip(self):
+		sketch = ViewerSketch()
+		missed = sum(not sketch.add(user_id) for user_id in range(5000))
+		self.assertLess(missed, 100)  # New viewers taken for repeat ones (Bloom false positives)
+		self.assertFalse(any(sketch.add(user_id) for user_id in range(5000)))  # No false negatives
+		loaded = ViewerSketch.from_bytes(sketch.to_bytes())
+		self.assertEqual(loaded.unique_count(), sketch.unique_count())
+		self.assertAlmostEqual(loaded.unique_count(), 5000, delta=250)
+		self.assertIn(42, loaded)
+
+
+class ViewTrackingTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.post = make_post(make_user('author'))
+		self.readers = [make_user(f'reader{number}') for number in range(3)]
+
+	@override_settings(VIEW_TRACKING_BACKEND='sketch')
+	def test_sketch_counts_each_viewer_once(self):
+		for reader in self.readers + self.readers[:1]:
+			view_buffer.record(self.post.pk, reader.pk)
+		view_buffer.record(self.post.pk)
+		analytics = PostAnalytics.objects.get(post=self.post)
+		self.assertEqual(analytics.views, 4)
+		self.assertEqual(analytics.unique_viewers(), 3)
+		self.assertFalse(analytics.viewed_users.exists())
+
+	def test_viewed_users_migrate_to_sketches(self):
+		for reader in self.readers:
+			view_buffer.record(self.post.pk, reader.pk)
+		call_command('migrate_viewed_users', '--clear', stdout=io.StringIO())
+		analytics = PostAnalytics.objects.get(post=self.post)
+		self.assertFalse(analytics.viewed_users.exists())
+		with override_settings(VIEW_TRACKING_BACKEND='sketch'):
+			self.assertEqual(analytics.unique_viewers(), 3)
+			view_buffer.record(self.post.pk, self.readers[0].pk)
+		self.assertEqual(PostAnalytics.objects.get(post=self.post).views, 3)
+
+# ----------------------------------------------------------------
+# Write-behind buffers (blog_app.buffers)
+# ----------------------------------------------------------------
+class FakeBuffer:
+	interval = 0.01
+
+	def __init__(self, error=None, failures=2):
+		self.error = error
+		self.failures = failures
+		self.flushes = 0
+
+	def flush(self):
+		self.flushes += 1
+		if self.error and self.flushes <= self.failures:
+			raise self.error
+
+
+class FlusherTests(SimpleTestCase):
+	def test_a_failing_buffer_does_not_stop_the_others(self):
+		broken, working = FakeBuffer(RuntimeError('broken')), FakeBuffer()
+		with self.assertLogs('blog_app.buffers', 'ERROR') as logs:
+			Flusher([broken, working]).flush()
+		self.assertEqual(working.flushes, 1)
+		self.assertIn('Flushing FakeBuffer failed', logs.output[0])
+
+	def test_the_thread_survives_failing_buffers(self):
+		broken, working = FakeBuffer(ValueError('broken')), FakeBuffer()
+		flusher = Flusher([broken, working])
+		with self.assertLogs('blog_app.buffers', 'ERROR'):
+			flusher.start()
+			deadline = time.monotonic() + 5
+			while working.flushes < 3 and time.monotonic() < deadline:
+				time.sleep(0.01)
+		self.assertGreaterEqual(working.flushes, 3)
+		self.assertTrue(flusher._thread.is_alive())
+
+
+# ----------------------------------------------------------------
+# Response cache (blog_app.caching)
+# ----------------------------------------------------------------
+class ResponseCacheTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.category = Category.objects.create(name='Travel')
+		self.author = make_user('author', bio='Hello')
+		self.post = make_post(self.author, category=self.category)
+		self.other = make_post(make_user('other'), 'Other')
+		self.detail = f'/api/posts/{self.post.slug}/'
+
+	def get(self, path):
+		response = client_for().get(path)
+		self.assertEqual(response.status_code, 200)
+		return response
+
+	def assertCached(self, *paths, cached=True):
+		for path in paths:
+			self.assertEqual(self.get(path)['X-Cache'], 'HIT' if cached else 'MISS', path)
+
+	def test_a_write_bumps_only_the_responses_it_affects(self):
+		other = f'/api/posts/{self.other.slug}/'
+		self.assertCached(self.detail, other, '/api/posts/', cached=False)
+		self.assertCached(self.detail, other, '/api/posts/')
+		with self.captureOnCommitCallbacks(execute=True):
+			PostLike.objects.create(post=self.post, user=self.author)
+		self.assertCached(self.detail, '/api/posts/', cached=False)
+		self.assertCached(other)
+		self.assertEqual(self.get(self.detail).data['analytics']['likes'], 1)
+
+	def test_posts_follow_changes_to_their_category_and_author(self):
+		self.assertCached(self.detail, '/api/categories/', cached=False)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.category.name = 'Food'
+			self.category.save()
+		self.assertCached('/api/categories/', cached=False)
+		self.assertEqual(self.get(self.detail).data['category'], 'Food')
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.author.bio = 'Updated'
+			self.author.save()
+		self.assertEqual(self.get(self.detail).data['author']['bio'], 'Updated')
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.category.delete()
+		self.assertIsNone(self.get(self.detail).data['category'])
+
+	def test_saves_outside_the_embedded_fields_keep_the_responses(self):
+		self.get(self.detail)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.author.last_login = timezone.now()
+			self.author.save(update_fields=['last_login'])
+		self.assertCached(self.detail)
+
+	def test_hits_and_misses_are_counted(self):
+		caching.reset_stats()
+		for _ in range(3):
+			self.get(self.detail)
+		client_for(self.author).get(self.detail)  # Not cached, not counted
+		self.assertEqual(caching.stats(), {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3})
+		output = io.StringIO()
+		call_command('response_cache_stats', '--reset', stdout=output)
+		self.assertEqual(output.getvalue().strip(), 'hits: 2  misses: 1  hit rate: 66.7%')
+		self.assertEqual(caching.stats()['hits'], 0)
+
+
+# ----------------------------------------------------------------
+# Conditional requests (blog_app.conditional)
+# ----------------------------------------------------------------
+class ConditionalRequestTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.post = make_post(self.author)
+		self.client = client_for()
+
+	def get(self, path, **headers):
+		return self.client.get(path, headers=headers)
+
+	def test_unchanged_posts_are_not_serialized_again(self):
+		for path in ('/api/posts/', f'/api/posts/{self.post.slug}/'):
+			etag = self.get(path)['ETag']
+			with mock.patch.object(PostSerializer, 'to_representation', side_effect=AssertionError("serialized")):
+				response = self.get(path, if_none_match=etag)
+			self.assertEqual(response.status_code, 304, path)
+			self.assertEqual(response['ETag'], etag)
+
+	def test_counters_change_the_etag_and_there_is_no_last_modified(self):
+		paths = ('/api/posts/', f'/api/posts/{self.post.slug}/')
+		before = [self.get(path) for path in paths]
+		with self.captureOnCommitCallbacks(execute=True):  # Bumps the response cache
+			client_for(make_user('reader')).post(f'/api/posts/{self.post.slug}/like/')
+		for path, response in zip(paths, before):
+			self.assertFalse(response.has_header('Last-Modified'))
+			changed = self.get(path, if_none_match=response['ETag'])
+			self.assertEqual(changed.status_code, 200, path)
+			self.assertNotEqual(changed['ETag'], response['ETag'])
+
+	def test_a_like_moving_between_posts_changes_the_list_etag(self):
+		other = make_post(self.author, 'Other')
+		reader = make_user('reader')
+		PostLike.objects.create(post=self.post, user=reader)
+		etag = client_for(reader).get('/api/posts/')['ETag']
+		with self.captureOnCommitCallbacks(execute=True):
+			PostLike.objects.filter(post=self.post).delete()
+			PostLike.objects.create(post=other, user=reader)
+		self.assertNotEqual(client_for(reader).get('/api/posts/')['ETag'], etag)
+
+	def test_the_list_etag_costs_no_query(self):
+		client = client_for(self.author)  # Never served from the response cache
+		etag = client.get('/api/posts/')['ETag']
+		with CaptureQueriesContext(connection) as queries:
+			response = client.get('/api/posts/', headers={'if-none-match': etag})
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(len(queries), 0)
+
+	def test_buffered_counters_change_the_list_etag(self):
+		etag = self.get('/api/posts/')['ETag']
+		with self.captureOnCommitCallbacks(execute=True):
+			counter_buffer.record(self.post.pk, 'likes', 1)
+		self.assertNotEqual(self.get('/api/posts/')['ETag'], etag)
+		etag = self.get('/api/posts/')['ETag']
+		with self.captureOnCommitCallbacks(execute=True):
+			view_buffer.record(self.post.pk)
+		self.assertNotEqual(self.get('/api/posts/')['ETag'], etag)
+
+	def test_validators_are_only_computed_when_needed(self):
+		self.get('/api/posts/')  # Cached
+		with CaptureQueriesContext(connection) as queries:
+			response = self.get('/api/posts/')
+		self.assertEqual(response['X-Cache'], 'HIT')
+		self.assertTrue(response.has_header('ETag'))
+		self.assertEqual(len(queries), 0)
+
+	def test_profiles_honour_if_modified_since(self):
+		response = client_for(self.author).get('/api/profile/')
+		with mock.patch.object(UserProfileSerializer, 'to_representation', side_effect=AssertionError("serialized")):
+			response = client_for(self.author).get(
+				f'/api/users/{self.author.username}/profile/', headers={'if-modified-since': response['Last-Modified']}
+			)
+		self.assertEqual(response.status_code, 304)
+
+
+# ----------------------------------------------------------------
+# User counts (blog_app.stats)
+# ----------------------------------------------------------------
+class UserStatsTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.users = [make_user(f'user{number}') for number in range(4)]
+		first, second, third, _ = self.users
+		for follower, followed in ((second, first), (third, first), (first, second)):
+			Follow.objects.create(follower=follower, followed=followed)
+		make_post(first, 'One')
+		make_post(first, 'Two')
+		make_post(third, 'Three')
+		self.client = client_for(first)
+
+	def stats(self, ids):
+		return self.client.get('/api/user/stats/', {'ids': ','.join(map(str, ids))})
+
+	def test_counts_of_every_requested_user(self):
+		first, second, third, fourth = (user.pk for user in self.users)
+		response = self.stats([third, first, 999, second, first, fourth])
+		self.assertEqual(response.status_code, 200)
+		# In request order, duplicates and unknown users left out
+		self.assertEqual(response.json(), [
+			{'id': third, 'followers_count': 0, 'following_count': 1, 'post_count': 1},
+			{'id': first, 'followers_count': 2, 'following_count': 1, 'post_count': 2},
+			{'id': second, 'followers_count': 1, 'following_count': 1, 'post_count': 0},
+			{'id': fourth, 'followers_count': 0, 'following_count': 0, 'post_count': 0},
+		])
+
+	def test_invalid_or_too_many_ids_are_rejected(self):
+		self.assertEqual(self.client.get('/api/user/stats/', {'ids': '1,x'}).status_code, 400)
+		self.assertEqual(self.stats(range(1, 202)).status_code, 400)
+
+	def test_query_count_does_not_grow_with_the_users(self):
+		def count_queries(ids):
+			with CaptureQueriesContext(connection) as queries:
+				self.assertEqual(self.stats(ids).status_code, 200)
+			return len(queries)
+
+		few = count_queries([user.pk for user in self.users[:2]])
+		many = [make_user(f'other{number}') for number in range(30)]
+		for user in many:
+			Follow.objects.create(follower=user, followed=self.users[0])
+			make_post(user, f'Post by {user.username}')
+		self.assertEqual(count_queries([user.pk for user in self.users + many]), few)
+
+
+# ----------------------------------------------------------------
+# User directory (UserListView)
+# ----------------------------------------------------------------
+class UserDirectoryTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.users = [make_user(name) for name in ('Alice', 'alfred', 'Bob', 'albert', 'carol')]
+		# Ties on created_at are broken by id
+		CustomUser.objects.filter(username__in=['Bob', 'albert']).update(created_at=timezone.now())
+		self.client = client_for(self.users[0])
+
+	def get(self, url, params=None):
+		response = self.client.get(url, params)
+		self.assertEqual(response.status_code, 200)
+		return response.json()
+
+	def usernames(self, page):
+		return [row['username'] for row in page['results']]
+
+	def test_pages_are_slim_rows_in_a_stable_order(self):
+		page = self.get('/api/users-list/', {'page_size': 2})
+		self.assertEqual(set(page), {'count', 'next', 'previous', 'results'})
+		self.assertEqual(page['count'], 5)
+		self.assertEqual(set(page['results'][0]), set(UserListSerializer.Meta.fields))
+
+		expected = list(
+			CustomUser.objects.order_by('-created_at', '-pk').values_list('username', flat=True)
+		)
+		names, page = [], self.get('/api/users-list/', {'pagination': 'cursor', 'page_size': 2})
+		while True:
+			names += self.usernames(page)
+			if not page['next']:
+				break
+			page = self.get(page['next'])
+		self.assertEqual(names, expected)
+		self.assertEqual(self.usernames(self.get(page['previous'])), expected[2:4])
+
+	def test_counts_are_embedded_on_request(self):
+		Follow.objects.create(follower=self.users[1], followed=self.users[0])
+		make_post(self.users[0])
+		rows = {row['username']: row for row in self.get('/api/users-list/', {'include_counts': 'true'})['results']}
+		self.assertEqual(
+			{name: rows['Alice'][name] for name in ('followers_count', 'following_count', 'post_count')},
+			{'followers_count': 1, 'following_count': 0, 'post_count': 1},
+		)
+		self.assertNotIn('post_count', self.get('/api/users-list/')['results'][0])
+
+	def test_the_search_is_a_case_insensitive_username_prefix(self):
+		page = self.get('/api/users-list/', {'search': 'AL'})
+		self.assertEqual(sorted(self.usernames(page)), ['Alice', 'albert', 'alfred'])
+		self.assertEqual(self.get('/api/users-list/', {'search': 'ob'})['count'], 0)
+
+		view = UserListView()
+		view.request = mock.Mock(query_params={'search': 'al'})
+		sql, params = view.get_queryset().query.sql_with_params()
+		with connection.cursor() as cursor:
+			cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+			plan = ' '.join(row[-1] for row in cursor.fetchall())
+		self.assertIn('user_username_lower_idx', plan)
+
+
+# ----------------------------------------------------------------
+# Image variants (blog_app.images)
+# ----------------------------------------------------------------
+def image_file(name='photo.png', size=(1200, 900)):
+	buffer = io.BytesIO()
+	Image.new('RGB', size, (200, 80, 40)).save(buffer, 'PNG')
+	return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def use_temporary_media(test):
+	"""Store the media of `test` in a temporary MEDIA_ROOT, with variants generated inline."""
+	media = tempfile.mkdtemp()
+	test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+	settings = test.settings(MEDIA_ROOT=media, IMAGE_PROCESSING_ASYNC=False)
+	settings.enable()
+	test.addCleanup(settings.disable)
+
+
+class ImageVariantTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		use_temporary_media(self)
+		self.author = make_user('author')
+
+	def test_uploaded_post_images_get_variants_listed_by_the_serializer(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			response = client_for(self.author).post(
+				'/api/posts/', {'title': 'Photo', 'content': 'Text', 'image': image_file()}, format='multipart'
+			)
+		self.assertEqual(response.status_code, 201)
+		post = Post.objects.get(pk=response.data['id'])
+		self.assertEqual(post.image_variants['source'], post.image.name)
+		for variant, box in images.POST_IMAGE_VARIANTS.items():
+			with Image.open(post.image.storage.path(post.image_variants[variant]['webp'])) as variant_image:
+				self.assertEqual(variant_image.size, min((1200, 900), (box[0], box[0] * 3 // 4)))
+
+		urls = client_for(self.author).get(f'/api/posts/{post.slug}/').data['image_variants']
+		self.assertEqual(set(urls), set(images.POST_IMAGE_VARIANTS))
+		self.assertTrue(urls['thumb']['webp'].endswith(post.image_variants['thumb']['webp']))
+		self.assertTrue(urls['thumb']['jpeg'].startswith('http://testserver/'))
+
+	def test_a_replaced_image_has_no_variants_until_they_are_regenerated(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			post = make_post(self.author, image=image_file())
+		post.image = image_file('other.png')
+		post.save()  # Variants scheduled, not generated yet
+		self.assertEqual(PostSerializer(post).data['image_variants'], {})
+		call_command('generate_image_variants', stdout=io.StringIO())
+		post.refresh_from_db()
+		self.assertEqual(set(PostSerializer(post).data['image_variants']), set(images.POST_IMAGE_VARIANTS))
+
+	def test_profile_pictures_saved_through_the_proxy_models_get_variants(self):
+		for proxy in (User, Admin):
+			user = proxy.objects.get(pk=self.author.pk) if proxy is User else proxy.objects.create(username='admin')
+			with self.captureOnCommitCallbacks(execute=True):
+				user.profile_picture = image_file(f'{proxy.__name__}.png', (400, 400))
+				user.save()
+			user = CustomUser.objects.get(pk=user.pk)
+			urls = UserProfileSerializer(user).data['profile_picture_variants']
+			self.assertEqual(set(urls), set(images.PROFILE_PICTURE_VARIANTS), proxy)
+
+
+# ----------------------------------------------------------------
+# Media cleanup (blog_app.media_gc)
+# ----------------------------------------------------------------
+class MediaCleanupTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		use_temporary_media(self)
+		self.author = make_user('author')
+
+	def upload_post(self, **fields):
+		with self.captureOnCommitCallbacks(execute=True):
+			return make_post(self.author, image=image_file(), **fields)
+
+	def exists(self, name):
+		return default_storage.exists(name)
+
+	def queued(self):
+		return set(OrphanedFile.objects.values_list('name', flat=True))
+
+	def sweep(self):
+		output = io.StringIO()
+		call_command('sweep_media', stdout=output)
+		return output.getvalue()
+
+	def test_replaced_and_deleted_images_are_queued_on_commit_and_swept(self):
+		post = self.upload_post()
+		first = [post.image.name, *images.recorded_names(post.image_variants)]
+		with self.captureOnCommitCallbacks(execute=True):
+			post.image = image_file('second.png')
+			post.save()
+		self.assertTrue(set(first) <= self.queued())
+		self.assertTrue(all(self.exists(name) for name in first))  # Not deleted by the request
+
+		post.refresh_from_db()
+		second = post.image.name
+		with self.captureOnCommitCallbacks(execute=True):
+			post.delete()
+		self.assertIn(second, self.queued())
+		self.assertIn(f'Deleted {len(self.queued())} files', self.sweep())
+		self.assertFalse(any(self.exists(name) for name in [*first, second]))
+		self.assertFalse(OrphanedFile.objects.exists())
+
+	def test_pictures_of_users_deleted_through_the_proxy_models_are_queued(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			user = User.objects.create(username='reader', profile_picture=image_file('reader.png'))
+		picture = CustomUser.objects.get(pk=user.pk).profile_picture.name
+		with self.captureOnCommitCallbacks(execute=True):
+			User.objects.get(pk=user.pk).delete()
+		self.assertIn(picture, self.queued())
+		self.sweep()
+		self.assertFalse(self.exists(picture))
+
+	def test_a_file_referenced_again_is_kept(self):
+		post = self.upload_post()
+		with self.captureOnCommitCallbacks(execute=True):
+			media_gc.discard(post.image.name)  # As if queued by a row that gave the file up
+		self.assertIn('Deleted 0 files (1 were referenced again', self.sweep())
+		self.assertTrue(self.exists(post.image.name))
+		self.assertFalse(OrphanedFile.objects.exists())
+
+	def test_reconcile_queues_old_unreferenced_files_only(self):
+		post = self.upload_post()
+		stray = default_storage.save('post_images/stray.png', image_file())
+		recent = default_storage.save('profile_pics/recent.png', image_file())
+		elsewhere = default_storage.save('exports/dump.json', ContentFile(b'{}'))
+		two_hours_ago = time.time() - 2 * 3600
+		for name in (post.image.name, *images.recorded_names(post.image_variants), stray, elsewhere):
+			os.utime(default_storage.path(name), (two_hours_ago, two_hours_ago))
+
+		# Referenced files, their variants, recent uploads and other directories are left alone
+		self.assertEqual(media_gc.reconcile(dry_run=True), [stray])
+		self.assertFalse(OrphanedFile.objects.exists())
+		self.assertEqual(media_gc.reconcile(), [stray])
+		self.assertEqual(self.queued(), {stray})
+		self.assertEqual(media_gc.reconcile(min_age=timedelta(0)), [stray, recent])
+
+		self.sweep()
+		self.assertFalse(self.exists(stray))
+		self.assertTrue(all(self.exists(name) for name in (post.image.name, elsewhere)))
+
+
+# ----------------------------------------------------------------
+# Bulk export (blog_app.exporting)
+# ----------------------------------------------------------------
+class ExportTests(BlogTestCase):
+	rows = 200_000
+	memory_bound = 8 * 2 ** 20
+
+	def test_export_streams_in_constant_memory(self):
+		admin = make_user('admin', is_admin=True)
+		post = make_post(admin)
+		Comment.objects.bulk_create(
+			(Comment(post=post, author=admin, content=f'Comment {number}') for number in range(self.rows)),
+			batch_size=5000,
+		)
+		response = client_for(admin).get('/api/export/', {'models': 'post,comment'})
+		self.assertEqual(response.status_code, 200)
+
+		lines = size = 0
+		tracemalloc.start()
+		try:
+			for chunk in response.streaming_content:
+				lines += chunk.count(b'\n')
+				size += len(chunk)
+			peak = tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+		self.assertEqual(lines, 1 + self.rows)
+		self.assertGreater(size, 2 * self.memory_bound)  # The export could not fit in the bound
+		self.assertLess(peak, self.memory_bound)
+
+
+class ImportTests(BlogTestCase):
+	def test_imported_published_posts_reach_the_followers_timelines(self):
+		author = make_user('author')
+		reader = make_user('reader')
+		Follow.objects.create(follower=reader, followed=author)
+		records = [
+			{'title': 'Published', 'is_published': True, 'created_at': '2024-01-02T03:04:05Z'},
+			{'title': 'Draft', 'is_published': False},
+		]
+		report = importing.Importer().run(
+			json.dumps({'model': 'post', 'data': {**data, 'content': 'Text', 'author_username': 'author'}})
+			for data in records
+		)
+		self.assertEqual(report['posts'], 2)
+
+		entry = TimelineEntry.objects.get(user=reader)
+		self.assertEqual(entry.post.title, 'Published')
+		self.assertEqual(entry.created_at, entry.post.created_at)
+		self.assertEqual(entry.created_at.year, 2024)
+
+	def test_comment_threads_survive_an_export_and_import(self):
+		author = make_user('author')
+		post = make_post(author, 'Threads')
+		root = Comment.objects.create(post=post, author=author, content='Root')
+		reply = Comment.objects.create(post=post, author=author, content='Reply', parent=root)
+		Comment.objects.create(post=post, author=author, content='Nested', parent=reply)
+		dump = list(exporting.iter_ndjson(['post', 'comment']))
+
+		report = importing.Importer(batch_size=2).run(dump)  # The thread spans batches
+		self.assertEqual((report['comments'], report['errors_total']), (3, 0))
+		copy = Post.objects.exclude(pk=post.pk).get()
+		comments = {comment.content: comment for comment in Comment.objects.filter(post=copy)}
+		self.assertEqual(comments['Reply'].parent, comments['Root'])
+		self.assertEqual(comments['Nested'].parent, comments['Reply'])
+		self.assertEqual([comment.depth for comment in comments['Root'].subtree()], [0, 1, 2])
+		self.assertEqual((comments['Root'].reply_count, comments['Reply'].reply_count), (1, 1))
+
+
+# ----------------------------------------------------------------
+# Home timelines (blog_app.timeline)
+# ----------------------------------------------------------------
+@override_settings(TIMELINE_FANOUT_LIMIT=2)
+class TimelineTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.reader = make_user('reader')
+		self.author = make_user('author')
+		self.celebrity = make_user('celebrity')
+		self.fans = [make_user(f'fan{number}') for number in range(2)]
+		for follower in self.fans:
+			self.follow(follower, self.celebrity)  # One more follower makes a celebrity
+		self.follow(self.reader, self.author)
+		self.follow(self.reader, self.celebrity)
+
+	def follow(self, follower, author):
+		Follow.objects.create(follower=follower, followed=author)
+		cache.delete(timeline.CELEBRITIES_CACHE_KEY)
+
+	def feed(self, url='/api/posts/following/', user=None, **params):
+		response = client_for(user or self.reader).get(url, params)
+		self.assertEqual(response.status_code, 200)
+		return response.json()
+
+	def ids(self, user=None):
+		return [post['id'] for post in self.feed(user=user, page_size=50)['results']]
+
+	def test_published_posts_are_fanned_out_to_the_followers(self):
+		post = make_post(self.author, 'Published')
+		make_post(self.author, 'Draft', is_published=False)
+		self.assertEqual(list(TimelineEntry.objects.values_list('user', 'post')), [(self.reader.pk, post.pk)])
+		self.assertEqual(self.ids(), [post.pk])
+		post.is_published = False
+		post.save()
+		self.assertEqual(self.ids(), [])
+
+	def test_celebrities_posts_are_merged_at_read_time(self):
+		older = make_post(self.author, 'Older')
+		post = make_post(self.celebrity, 'Famous')
+		newer = make_post(self.author, 'Newer')
+		self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+		self.assertEqual(self.ids(), [newer.pk, post.pk, older.pk])
+		self.assertEqual(self.ids(self.fans[0]), [post.pk])
+
+	def test_posts_published_as_a_celebrity_stay_once_the_author_is_not(self):
+		post = make_post(self.celebrity, 'Famous')
+		Follow.objects.filter(follower=self.fans[0]).delete()
+		cache.delete(timeline.CELEBRITIES_CACHE_KEY)
+		later = make_post(self.celebrity, 'Later')  # Fanned out
+		self.assertEqual(self.ids(), [later.pk, post.pk])
+
+		call_command('rebuild_timelines', stdout=io.StringIO())
+		post.refresh_from_db()
+		self.assertTrue(post.fanned_out)
+		self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post=post).exists())
+		self.assertEqual(self.ids(), [later.pk, post.pk])
+
+	def test_new_followers_of_a_celebrity_get_the_posts_fanned_out_before(self):
+		before = make_post(self.author, 'Before')
+		for follower in self.fans:
+			self.follow(follower, self.author)
+		after = make_post(self.author, 'After')
+		newcomer = make_user('newcomer')
+		self.follow(newcomer, self.author)
+		self.assertEqual(self.ids(newcomer), [after.pk, before.pk])
+
+	def test_unfollowing_removes_both_kinds_of_posts(self):
+		make_post(self.author, 'Fanned out')
+		make_post(self.celebrity, 'Merged')
+		Follow.objects.filter(follower=self.reader).delete()
+		self.assertEqual(self.ids(), [])
+		self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+	def test_pages_walk_both_sources_in_both_directions(self):
+		posts = [make_post(self.celebrity if number % 3 else self.author, f'Post {number}') for number in range(9)]
+		# Ties on created_at are broken by id, across the two sources
+		Post.objects.filter(pk__in=[posts[3].pk, posts[4].pk, posts[5].pk]).update(created_at=timezone.now())
+		TimelineEntry.objects.filter(post__in=posts[3:6]).update(created_at=Post.objects.get(pk=posts[3].pk).created_at)
+		expected = list(Post.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+		pages = [self.feed(page_size=2)]
+		while pages[-1]['next']:
+			pages.append(self.feed(pages[-1]['next']))
+		self.assertEqual([post['id'] for page in pages for post in page['results']], expected)
+		self.assertIsNone(pages[0]['previous'])
+		back = [pages[-1]]
+		while back[-1]['previous']:
+			back.append(self.feed(back[-1]['previous']))
+		self.assertEqual([page['results'] for page in reversed(back)], [page['results'] for page in pages])
+
+	def test_merged_posts_are_read_from_the_partial_index(self):
+		pending = timeline.pending_posts(self.reader).order_by('-created_at', '-id').values_list('created_at', 'id')
+		# The first page, and one after a position (as timeline.page reads them)
+		for page in (pending, pending.filter(timeline._after((timezone.now(), 1), False, 'created_at', 'id'))):
+			sql, params = page[:11].query.sql_with_params()
+			with connection.cursor() as cursor:
+				cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+				plan = [row[-1] for row in cursor.fetchall()]
+			self.assertIn('USING INDEX post_fanout_pending_idx', plan[0])
+
+
+# ----------------------------------------------------------------
+# Trending posts (blog_app.trending)
+# ----------------------------------------------------------------
+class TrendingTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.reader = make_user('reader')
+
+	def analytics(self, post):
+		return PostAnalytics.objects.get(post=post)
+
+	def age(self, post, hours):
+		"""Move a post `hours` into the past and rewrite its offset."""
+		Post.objects.filter(pk=post.pk).update(created_at=timezone.now() - timedelta(hours=hours))
+		call_command('update_trending', stdout=io.StringIO())
+
+	def test_score_follows_likes_comments_and_views(self):
+		post = make_post(self.author)
+		offset = self.analytics(post).trending_offset
+		self.assertAlmostEqual(offset, trending.offset(post.created_at))
+		self.assertAlmostEqual(self.analytics(post).trending_score, offset)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			client_for(self.reader).post(f'/api/posts/{post.slug}/like/')
+			Comment.objects.create(post=post, author=self.reader, content='Hi')
+		view_buffer.record(post.pk, self.reader.pk)
+		view_buffer.record(post.pk)
+		# ln(1 + 2 views + 5 * 1 like + 10 * 1 comment) + offset
+		self.assertAlmostEqual(self.analytics(post).trending_score, math.log(18) + offset)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			client_for(self.reader).post(f'/api/posts/{post.slug}/like/')
+		self.assertAlmostEqual(self.analytics(post).trending_score, math.log(13) + offset)
+
+	def test_engagement_decays_with_age(self):
+		new, old = make_post(self.author, 'New'), make_post(self.author, 'Old')
+		view_buffer.record(new.pk)
+		counters.adjust_likes(old.pk, 1)
+		# Two half-lives: the old post needs more than 4 times the engagement of the new one
+		self.age(old, 48)
+		self.assertEqual(trending.top(), [new, old])
+		counters.adjust_comments(old.pk, 1)
+		self.assertEqual(trending.top(), [old, new])
+		self.age(old, 96)
+		self.assertEqual(trending.top(), [new, old])
+
+	def test_top_skips_unpublished_posts(self):
+		posts = [make_post(self.author, f'Post {number}') for number in range(30)]
+		for number, post in enumerate(posts):
+			counters.increment_views(post.pk, number)
+		# The best ones are unpublished, beyond the first chunk of candidates
+		Post.objects.filter(pk__in=[post.pk for post in posts[5:]]).update(is_published=False)
+		self.assertEqual(trending.top(3), [posts[4], posts[3], posts[2]])
+		self.assertEqual(trending.top(10), posts[4::-1])
+
+	def test_equal_scores_rank_the_newest_post_first(self):
+		posts = [make_post(self.author, f'Post {number}') for number in range(3)]
+		PostAnalytics.objects.update(trending_offset=0, trending_score=0)
+		self.assertEqual(trending.top(), posts[::-1])
+
+	def test_endpoint(self):
+		posts = [make_post(self.author, f'Post {number}') for number in range(3)]
+		counters.adjust_comments(posts[0].pk, 1)
+		response = client_for(self.reader).get('/api/posts/trending/?limit=2')
+		self.assertEqual([post['id'] for post in response.json()], [posts[0].pk, posts[2].pk])
+		self.assertEqual(client_for(self.reader).get('/api/posts/trending/?limit=x').status_code, 400)
+
+	@override_settings(TRENDING_HALF_LIFE_HOURS=1, TRENDING_WEIGHTS={'views': 0, 'likes': 0, 'comments': 1})
+	def test_update_trending_applies_new_settings(self):
+		post = make_post(self.author)
+		counters.increment_views(post.pk, 100)
+		counters.adjust_comments(post.pk, 1)
+		output = io.StringIO()
+		call_command('update_trending', stdout=output)
+		self.assertIn('Recomputed the trending scores of 1 posts.', output.getvalue())
+		analytics = self.analytics(post)
+		self.assertAlmostEqual(analytics.trending_offset, trending.offset(post.created_at))
+		self.assertAlmostEqual(analytics.trending_offset, (post.created_at - trending.EPOCH).total_seconds() * math.log(2) / 3600)
+		self.assertAlmostEqual(analytics.trending_score, math.log(2) + analytics.trending_offset)
+
+
+# ----------------------------------------------------------------
+# Analytics time series (blog_app.rollups)
+# ----------------------------------------------------------------
+class RollupTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.reader = make_user('reader')
+		self.post = make_post(self.author)
+		self.hour = rollups.truncate(timezone.now(), rollups.HOUR)
+
+	def rows(self, period=rollups.HOUR):
+		return {
+			(post_id, bucket): (views, likes, comments)
+			for post_id, bucket, views, likes, comments in AnalyticsRollup.objects.filter(period=period).values_list(
+				'post_id', 'bucket', 'views', 'likes', 'comments')
+		}
+
+	def counts(self, response):
+		return [[bucket[event] for event in rollups.EVENTS] for bucket in response.json()['series']]
+
+	def test_events_are_added_to_the_hour(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			client_for(self.reader).post(f'/api/posts/{self.post.slug}/like/')
+			Comment.objects.create(post=self.post, author=self.reader, content='Hi')
+		view_buffer.record(self.post.pk, self.reader.pk)
+		view_buffer.record(self.post.pk)
+		self.assertEqual(self.rows(), {(self.post.pk, self.hour): (2, 1, 1)})
+		with self.captureOnCommitCallbacks(execute=True):
+			client_for(self.reader).post(f'/api/posts/{self.post.slug}/like/')
+		self.assertEqual(self.rows(), {(self.post.pk, self.hour): (2, 0, 1)})
+
+	def test_add_accumulates_and_skips_deleted_posts(self):
+		other = make_post(self.author, 'Other')
+		increments = {(self.post.pk, self.hour): {'views': 2}, (other.pk, self.hour): {'likes': 1}}
+		other.delete()
+		self.assertEqual(rollups.add(rollups.HOUR, increments), 1)
+		rollups.add(rollups.HOUR, {(self.post.pk, self.hour): {'views': 3, 'comments': 1}})
+		self.assertEqual(self.rows(), {(self.post.pk, self.hour): (5, 0, 1)})
+
+	def test_series_endpoint(self):
+		start = self.hour - timedelta(hours=3)
+		rollup_buffer.record(self.post.pk, 'views', 4, at=start + timedelta(minutes=30))
+		rollup_buffer.record(self.post.pk, 'likes', 1, at=start + timedelta(hours=2))
+		analytics = PostAnalytics.objects.get(post=self.post)
+		client = client_for()
+		response = client.get(f'/api/analytics/{analytics.pk}/series/', {
+			'interval': 'hour', 'start': start.isoformat(), 'end': self.hour.isoformat(),
+		})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.counts(response), [[4, 0, 0], [0, 0, 0], [0, 1, 0]])
+		self.assertEqual(response.json()['totals'], {'views': 4, 'likes': 1, 'comments': 0})
+		# Days add up their hours
+		response = client.get(f'/api/analytics/{analytics.pk}/series/', {'start': start.date().isoformat()})
+		self.assertEqual(response.json()['totals'], {'views': 4, 'likes': 1, 'comments': 0})
+
+		for params in ({'interval': 'week'}, {'start': 'yesterday'}, {'start': '2026-01-02', 'end': '2026-01-01'},
+					   {'interval': 'hour', 'start': '2020-01-01', 'end': '2026-01-01'}):
+			self.assertEqual(client.get(f'/api/analytics/{analytics.pk}/series/', params).status_code, 400, params)
+
+	def test_author_endpoint_counts_drafts_for_the_author_only(self):
+		draft = make_post(self.author, 'Draft', is_published=False)
+		other = make_post(self.reader, 'Not theirs')
+		for post, views in ((self.post, 2), (draft, 5), (other, 7)):
+			rollup_buffer.record(post.pk, 'views', views)
+		url = f'/api/analytics/authors/{self.author.username}/'
+		response = client_for(self.reader).get(url, {'interval': 'hour'})
+		self.assertEqual(response.json()['totals']['views'], 2)
+		self.assertEqual([post['slug'] for post in response.json()['top_posts']], [self.post.slug])
+		response = client_for(self.author).get(url, {'interval': 'hour'})
+		self.assertEqual(response.json()['totals']['views'], 7)
+		self.assertEqual([post['slug'] for post in response.json()['top_posts']], [draft.slug, self.post.slug])
+		self.assertEqual(client_for().get('/api/analytics/authors/nobody/').status_code, 404)
+
+	@override_settings(ANALYTICS_HOURLY_RETENTION_DAYS=2)
+	def test_compact_rollups_keeps_the_daily_totals(self):
+		other = make_post(self.author, 'Other')
+		for hours in range(0, 24 * 5, 5):
+			rollup_buffer.record(self.post.pk, 'views', hours, at=self.hour - timedelta(hours=hours))
+			rollup_buffer.record(other.pk, 'comments', 1, at=self.hour - timedelta(hours=hours))
+		start, end = self.hour - timedelta(days=6), self.hour + timedelta(hours=1)
+		before = rollups.series([self.post.pk, other.pk], rollups.DAY, start, end)
+		hourly = len(self.rows())
+
+		output = io.StringIO()
+		call_command('compact_rollups', stdout=output)
+		cutoff = rollups.truncate(timezone.now() - timedelta(days=2), rollups.DAY)
+		days = (cutoff - rollups.truncate(self.hour - timedelta(hours=24 * 5 - 5), rollups.DAY)).days
+		kept = {key for key in self.rows() if key[1] >= cutoff}
+		self.assertEqual(set(self.rows()), kept)
+		self.assertEqual(len(self.rows(rollups.DAY)), days * 2)
+		self.assertIn(f'Compacted {days} days, removed {hourly - len(kept)} rollup rows.', output.getvalue())
+		self.assertEqual(rollups.series([self.post.pk, other.pk], rollups.DAY, start, end), before)
+		self.assertEqual(rollups.compact(), (0, 0))
+
+
+# ----------------------------------------------------------------
+# Cached authentication (blog_app.authentication)
+# ----------------------------------------------------------------
+class CachedAuthenticationTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = make_user('reader', bio='Hello')
+		self.headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+	def shared_cache(self):
+		"""A cache shared between processes (files), in place of the local memory one."""
+		location = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+		return self.settings(CACHES={
+			'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+		})
+
+	def test_users_are_not_cached_in_a_process_local_cache(self):
+		self.assertEqual(authentication.cache_timeout(), 0)
+		self.assertEqual(APIClient().get('/api/profile/', **self.headers).status_code, 200)
+		self.assertIsNone(cache.get(authentication.user_cache_key(self.user.pk)))
+
+	def test_only_the_authentication_fields_are_cached(self):
+		with self.shared_cache():
+			for _ in range(2):
+				response = APIClient().get('/api/profile/', **self.headers)
+				self.assertEqual(response.status_code, 200)
+				# Fields outside the cached ones are read from the database
+				self.assertEqual((response.data['email'], response.data['bio']), ('reader@example.com', 'Hello'))
+			state = cache.get(authentication.user_cache_key(self.user.pk))
+			self.assertEqual(set(state) - {'password_digest'}, set(authentication.CACHED_FIELDS))
+			self.assertNotIn(self.user.password, state.values())
+
+	def test_the_cached_user_saves_a_query_until_the_user_is_saved(self):
+		key = authentication.user_cache_key(self.user.pk)
+
+		def list_queries():
+			with CaptureQueriesContext(connection) as queries:
+				self.assertEqual(APIClient().get('/api/posts/', **self.headers).status_code, 200)
+			return [query['sql'] for query in queries]
+
+		with self.shared_cache():
+			self.assertEqual(authentication.cache_timeout(), 60)
+			uncached = list_queries()
+			self.assertIsNotNone(cache.get(key))
+			cached = list_queries()
+			self.assertEqual(len(cached), len(uncached) - 1)
+			self.assertFalse([sql for sql in cached if 'blog_app_customuser' in sql])
+
+			with self.captureOnCommitCallbacks(execute=True):
+				response = client_for(self.user).put('/api/profile/', {'bio': 'Updated'})
+			self.assertEqual(response.status_code, 200)
+			self.assertIsNone(cache.get(key))
+			self.assertEqual(len(list_queries()), len(uncached))
+			self.assertEqual(len(list_queries()), len(cached))
+
+	def test_a_deactivated_user_is_rejected_once_saved(self):
+		with self.shared_cache():
+			self.assertEqual(APIClient().get('/api/profile/', **self.headers).status_code, 200)
+			with self.captureOnCommitCallbacks(execute=True):
+				self.user.is_active = False
+				self.user.save()
+			self.assertEqual(APIClient().get('/api/profile/', **self.headers).status_code, 401)
+
+
+# ----------------------------------------------------------------
+# Login and registration (blog_app.throttling)
+# ----------------------------------------------------------------
+class LoginAndRegistrationTests(BlogTestCase):
+	def login(self, address, username='victim'):
+		return APIClient(REMOTE_ADDR=address).post(
+			'/api/login/', {'username': username, 'password': 'wrong'}, format='json'
+		).status_code
+
+	def test_login_attempts_are_throttled_per_client_and_username(self):
+		make_user('victim')
+		self.assertNotIn(429, [self.login('10.0.0.1') for _ in range(10)])
+		self.assertEqual(self.login('10.0.0.1'), 429)
+		# Neither the account from elsewhere nor other accounts from the same client are locked
+		self.assertNotEqual(self.login('10.0.0.2'), 429)
+		self.assertNotEqual(self.login('10.0.0.1', 'someone-else'), 429)
+
+	def test_a_username_taken_during_registration_is_a_validation_error(self):
+		make_user('taken')
+		# As if the other registration committed between validate() and save()
+		with mock.patch.object(RegisterSerializer, 'validate', side_effect=lambda data: data):
+			response = APIClient().post(
+				'/api/register/', {'username': 'taken', 'email': 'new@example.com', 'password': 'password'}
+			)
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('username', response.data)
+
+
+# ----------------------------------------------------------------
+# Comment threads
+# ----------------------------------------------------------------
+class CommentThreadTests(BlogTestCase):
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.post = make_post(self.author)
+
+	def comment(self, parent=None, content='A comment'):
+		return Comment.objects.create(post=self.post, author=self.author, parent=parent, content=content)
+
+	def walk(self, url, **params):
+		"""The ids of every page from `url` following `next`, then back following `previous`."""
+		pages = [client_for().get(url, params).json()]
+		while pages[-1]['next']:
+			pages.append(client_for().get(pages[-1]['next']).json())
+		back = [pages[-1]]
+		while back[-1]['previous']:
+			back.append(client_for().get(back[-1]['previous']).json())
+		ids = lambda pages: [[comment['id'] for comment in page['results']] for page in pages]
+		return ids(pages), ids(reversed(back))
+
+	def test_top_level_comments_page_newest_first_with_their_first_replies(self):
+		threads = [self.comment(content=f'Thread {number}') for number in range(5)]
+		replies = [self.comment(threads[0], f'Reply {number}') for number in range(4)]
+		self.comment(replies[0], 'Nested')
+		# Ties on created_at are broken by id
+		Comment.objects.filter(pk__in=[threads[1].pk, threads[2].pk]).update(created_at=threads[1].created_at)
+
+		forward, backward = self.walk(f'/api/posts/{self.post.slug}/comments_list/', page_size=2, replies=2)
+		expected = [thread.pk for thread in reversed(threads)]
+		self.assertEqual(forward, [expected[0:2], expected[2:4], expected[4:]])
+		self.assertEqual(backward, forward)
+
+		page = client_for().get(f'/api/posts/{self.post.slug}/comments_list/', {'replies': 2}).json()
+		first = next(comment for comment in page['results'] if comment['id'] == threads[0].pk)
+		self.assertEqual([reply['id'] for reply in first['replies']], [replies[0].pk, replies[1].pk])
+		self.assertEqual(first['reply_count'], 4)
+		self.assertEqual(first['author']['email'], 'author@example.com')
+
+	def test_replies_page_oldest_first(self):
+		thread = self.comment()
+		replies = [self.comment(thread, f'Reply {number}') for number in range(5)]
+		self.comment(replies[0], 'Nested')
+		self.comment(content='Another thread')
+		Comment.objects.filter(pk__in=[replies[2].pk, replies[3].pk]).update(created_at=replies[2].created_at)
+
+		forward, backward = self.walk(f'/api/comments/{thread.pk}/replies/', page_size=2)
+		expected = [reply.pk for reply in replies]
+		self.assertEqual(forward, [expected[0:2], expected[2:4], expected[4:]])
+		self.assertEqual(backward, forward)
+
+	def test_a_page_costs_the_same_queries_however_big_the_threads(self):
+		def queries(url):
+			with CaptureQueriesContext(connection) as captured:
+				self.assertEqual(client_for().get(url).status_code, 200)
+			return len(captured)
+
+		thread = self.comment()
+		self.comment(thread)
+		urls = [
+			f'/api/posts/{self.post.slug}/comments_list/?page_size=20&replies=5',
+			f'/api/comments/{thread.pk}/replies/?page_size=20',
+		]
+		small = [queries(url) for url in urls]
+		for number in range(25):
+			parent = self.comment(content=f'Thread {number}')
+			for _ in range(6):
+				self.comment(parent, 'Reply')
+			self.comment(thread, f'Reply {number}')
+		self.assertEqual([queries(url) for url in urls], small)
+
+	def test_a_reply_must_be_on_the_post_of_its_url(self):
+		author, post = self.author, self.post
+		other = make_post(author, 'Other')
+		parent = Comment.objects.create(post=other, author=author, content='Elsewhere')
+		# The body names the parent's post, the URL another one
+		response = client_for(author).post(
+			f'/api/posts/{post.slug}/comment/', {'post': other.slug, 'content': 'Reply', 'parent': parent.pk}
+		)
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('parent', response.data)
+		self.assertFalse(Comment.objects.filter(post=post).exists())
+
+
+# ----------------------------------------------------------------
+# Async read endpoints (blog_app.async_views)
+# ----------------------------------------------------------------
+class AsyncViewTests(BlogTestCase):
+	"""The async endpoints answer like their sync counterparts."""
+
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.reader = make_user('reader')
+		self.admin = make_user('admin', is_admin=True, is_user=False)
+		self.category = Category.objects.create(name='Django', slug='django')
+		self.post = make_post(self.author, 'Django tips', content='About django', category=self.category)
+		make_post(self.author, 'A draft about django', is_published=False)
+		make_post(self.reader, 'Python notes')
+		Follow.objects.create(follower=self.reader, followed=self.author)
+
+	def get_both(self, path, user=None, **params):
+		"""The responses of the sync endpoint at `path` and of its async variant."""
+		headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'} if user else {}
+		return [APIClient().get(f'/api{prefix}{path}', params, **headers) for prefix in ('', '/async')]
+
+	def test_post_lists_match(self):
+		for user in (None, self.author, self.reader):
+			for params in (
+				{}, {'q': 'django'}, {'q': 'django', 'is_published': 'true'}, {'category': 'django'},
+				{'is_published': 'false'}, {'username': 'reader'}, {'author': str(self.author.pk)},
+			):
+				sync, asynchronous = self.get_both('/posts/', user, pagination='cursor', **params)
+				self.assertEqual((sync.status_code, asynchronous.status_code), (200, 200), params)
+				self.assertEqual(asynchronous.json()['results'], sync.json()['results'], (user, params))
+		sync, asynchronous = self.get_both('/posts/', q='django', is_published='true')
+		self.assertEqual([post['id'] for post in asynchronous.json()['results']], [self.post.pk])
+
+	def test_post_list_errors_match(self):
+		for params in ({'category': 'unknown'}, {'author': 'me'}):
+			sync, asynchronous = self.get_both('/posts/', **params)
+			self.assertEqual((sync.status_code, asynchronous.status_code), (400, 400), params)
+			self.assertEqual(asynchronous.json(), sync.json())
+
+	def test_post_details_match(self):
+		sync, asynchronous = self.get_both(f'/posts/{self.post.slug}/')
+		self.assertEqual(asynchronous.json(), sync.json())
+		sync, asynchronous = self.get_both('/posts/missing/')
+		self.assertEqual((sync.status_code, asynchronous.status_code), (404, 404))
+
+	def test_profiles_match(self):
+		sync, asynchronous = self.get_both('/users/author/profile/', self.reader)
+		data = asynchronous.json()
+		self.assertEqual({field: data[field] for field in sync.json()}, sync.json())
+		self.assertEqual((data['followers_count'], data['following_count'], data['post_count']), (1, 0, 2))
+		# Other users' profiles are those of regular users, but anyone can read their own
+		sync, asynchronous = self.get_both('/users/admin/profile/', self.reader)
+		self.assertEqual((sync.status_code, asynchronous.status_code), (404, 404))
+		sync, asynchronous = self.get_both('/profile/', self.admin)
+		self.assertEqual((sync.status_code, asynchronous.status_code), (200, 200))
+		self.assertEqual(asynchronous.json()['username'], sync.json()['username'])
+
+
+# ----------------------------------------------------------------
+# Primary / replica routing (blog_app.routers)
+# ----------------------------------------------------------------
+@override_settings(REPLICA_DATABASES=['replica1', 'replica2'], PRIMARY_PIN_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+	"""Routing decisions only: the replica aliases are never connected to."""
+
+	def setUp(self):
+		cache.clear()
+		self.router = routers.PrimaryReplicaRouter()
+		self.middleware = routers.PrimaryPinningMiddleware(self.view)
+
+	def view(self, request):
+		"""Reads once, writes if asked to, then reads again; returns where the reads went."""
+		reads = [self.router.db_for_read(Post)]
+		if 'write' in request.GET:
+			self.router.db_for_write(Post)
+			reads.append(self.router.db_for_read(Post))
+		return HttpResponse(','.join(reads))
+
+	def request(self, client, write=False, method='get', **headers):
+		request = getattr(RequestFactory(), method)('/', {'write': 1} if write else {}, REMOTE_ADDR=client, **headers)
+		return self.middleware(request).content.decode().split(',')
+
+	def test_reads_go_to_the_replicas_until_the_client_writes(self):
+		self.assertIn(self.request('10.0.0.1')[0], ['replica1', 'replica2'])
+		self.assertEqual(self.request('10.0.0.1', method='post'), ['default'])
+		# Read-your-writes within the request that wrote
+		first, after_write = self.request('10.0.0.1', write=True)
+		self.assertIn(first, ['replica1', 'replica2'])
+		self.assertEqual(after_write, 'default')
+
+	def test_a_write_pins_the_clients_next_reads_until_the_pin_expires(self):
+		self.request('10.0.0.1', write=True)
+		# The replicas may not have the write yet: this client reads from the primary...
+		self.assertEqual(self.request('10.0.0.1'), ['default'])
+		# ...other clients keep reading from the replicas
+		self.assertIn(self.request('10.0.0.2')[0], ['replica1', 'replica2'])
+
+		later = time.time() + 6  # Past PRIMARY_PIN_SECONDS, when the replicas have caught up
+		with mock.patch('time.time', return_value=later):
+			self.assertIn(self.request('10.0.0.1')[0], ['replica1', 'replica2'])
+
+	def test_pins_follow_the_user_or_the_session_rather_than_the_address(self):
+		token = lambda pk: {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(CustomUser(pk=pk)).access_token}'}
+		self.request('10.0.0.1', write=True, **token(1))
+		# The same user from another address (a phone on another network) stays pinned...
+		self.assertEqual(self.request('10.0.0.9', **token(1)), ['default'])
+		# ...but not the other users and anonymous clients behind the same address (a NAT)
+		self.assertIn(self.request('10.0.0.1', **token(2))[0], ['replica1', 'replica2'])
+		self.assertIn(self.request('10.0.0.1')[0], ['replica1', 'replica2'])
+
+		self.request('10.0.0.2', write=True, HTTP_COOKIE='sessionid=abc')
+		self.assertEqual(self.request('10.0.0.3', HTTP_COOKIE='sessionid=abc'), ['default'])
+		self.assertIn(self.request('10.0.0.2')[0], ['replica1', 'replica2'])
+		# An invalid token counts as anonymous
+		self.request('10.0.0.4', write=True)
+		self.assertEqual(self.request('10.0.0.4', HTTP_AUTHORIZATION='Bearer invalid'), ['default'])
+
+	def test_views_can_require_the_primary(self):
+		def view(request):
+			# As Django's handler does once the view is resolved
+			self.middleware.process_view(request, view, (), {})
+			return HttpResponse(self.router.db_for_read(Post))
+
+		view.view_class = type('PrimaryView', (), {'use_primary': True})
+		response = routers.PrimaryPinningMiddleware(view)(RequestFactory().get('/', REMOTE_ADDR='10.0.0.1'))
+		self.assertEqual(response.content, b'default')
+
+	def test_reads_outside_requests_go_to_the_primary(self):
+		self.assertEqual(self.router.db_for_read(Post), 'default')
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], PRIMARY_PIN_SECONDS=5)
+class ReplicaReadTests(BlogTransactionTestCase):
+	"""Reads through a replica file that lags behind the primary until `sync_replicas` runs."""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		# The replica is only configured for this test case, so the test runner neither
+		# checks nor creates it; it is allowed once added
+		cls.location = tempfile.mkdtemp()
+		replica = {**settings.DATABASES['default'], 'NAME': os.path.join(cls.location, 'replica.sqlite3')}
+		cls.replica_settings = mock.patch.dict(settings.DATABASES, {'replica1': replica})
+		cls.replica_settings.start()
+		cls.databases = {*cls.databases, 'replica1'}
+
+	@classmethod
+	def tearDownClass(cls):
+		super().tearDownClass()
+		connections['replica1'].close()
+		del connections['replica1']
+		cls.replica_settings.stop()
+		shutil.rmtree(cls.location, ignore_errors=True)
+
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.reader = make_user('reader')
+		self.post = make_post(self.author, 'Replicated')
+		self.sync()
+
+	def sync(self):
+		call_command('sync_replicas', stdout=io.StringIO())
+
+	def signed_in(self, user, address='10.0.0.1'):
+		client = APIClient(REMOTE_ADDR=address)
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+		return client
+
+	def test_a_pinned_client_reads_its_writes_from_the_primary(self):
+		author, reader = self.signed_in(self.author), self.signed_in(self.reader)
+		response = author.patch(f'/api/posts/{self.post.slug}/', {'title': 'Edited'})
+		self.assertEqual(response.status_code, 200)
+		slug = f'/api/posts/{self.post.slug}/'
+		# The replica lags: other clients, even behind the same address, still read the old title...
+		self.assertEqual(reader.get(slug).json()['title'], 'Replicated')
+		# ...the author reads the edit from the primary, from any address
+		self.assertEqual(author.get(slug).json()['title'], 'Edited')
+		self.assertEqual(self.signed_in(self.author, '10.0.0.9').get(slug).json()['title'], 'Edited')
+
+		self.sync()
+		self.assertEqual(reader.get(slug).json()['title'], 'Edited')
+
+	def test_a_new_user_signing_in_reads_from_the_primary(self):
+		anonymous = APIClient(REMOTE_ADDR='10.0.0.2')
+		response = anonymous.post('/api/register/', {
+			'username': 'newcomer', 'email': 'newcomer@example.com', 'password': 'A-long-password-1',
+		})
+		self.assertEqual(response.status_code, 201, response.content)
+		access = anonymous.post('/api/login/', {'username': 'newcomer', 'password': 'A-long-password-1'}).json()['access']
+		# The replica has no row for the new user yet: its first requests authenticate on the primary
+		client = APIClient(REMOTE_ADDR='10.0.0.3')
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+		self.assertEqual(client.get('/api/profile/').json()['username'], 'newcomer')
+
+
+# ----------------------------------------------------------------
+# Separate analytics database (blog_app.routers.AnalyticsRouter)
+# ----------------------------------------------------------------
+class AnalyticsDatabaseTests(BlogTransactionTestCase):
+	"""
+	The analytics models in a database of their own: the one ANALYTICS_DATABASE_PATH gives
+	them, else a file created for this test case.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.location = tempfile.mkdtemp()
+		cls.created = not routers.analytics_separate()
+		if cls.created:
+			# As for the replica of ReplicaReadTests, the runner neither checks nor creates it
+			analytics = {**settings.DATABASES['default'], 'NAME': os.path.join(cls.location, 'analytics.sqlite3')}
+			cls.database_settings = mock.patch.dict(settings.DATABASES, {'analytics': analytics})
+			cls.database_settings.start()
+			cls.analytics_settings = override_settings(ANALYTICS_DATABASE='analytics')
+			cls.analytics_settings.enable()
+		cls.alias = routers.analytics_database()
+		cls.databases = {*cls.databases, cls.alias}
+		if cls.created:
+			call_command('migrate', database='analytics', verbosity=0)
+
+	@classmethod
+	def tearDownClass(cls):
+		super().tearDownClass()
+		if cls.created:
+			connections['analytics'].close()
+			del connections['analytics']
+			cls.analytics_settings.disable()
+			cls.database_settings.stop()
+		shutil.rmtree(cls.location, ignore_errors=True)
+
+	def setUp(self):
+		super().setUp()
+		self.author = make_user('author')
+		self.reader = make_user('reader')
+
+	def create_post(self, title='Split'):
+		# Not make_post(), which creates the analytics row itself
+		return Post.objects.create(author=self.author, title=title, content='Some content', is_published=True)
+
+	def rows(self, using):
+		return PostAnalytics.objects.using(using)
+
+	def test_the_analytics_row_is_created_once_the_post_commits(self):
+		with transaction.atomic():
+			post = self.create_post()
+			self.assertFalse(self.rows(self.alias).filter(post_id=post.pk).exists())
+		self.assertTrue(self.rows(self.alias).filter(post_id=post.pk).exists())
+		self.assertFalse(self.rows(DEFAULT_DB_ALIAS).exists())
+
+		with transaction.atomic():
+			self.create_post('Rolled back')
+			transaction.set_rollback(True)
+		self.assertEqual(self.rows(self.alias).count(), 1)
+
+		post.delete()
+		self.assertFalse(self.rows(self.alias).exists())
+
+	def test_likes_comments_and_views_are_counted_once_committed(self):
+		post = self.create_post()
+		client = client_for(self.reader)
+		self.assertEqual(client.post(f'/api/posts/{post.slug}/like/').json()['likes_count'], 1)
+		with transaction.atomic():
+			comment = Comment.objects.create(post=post, author=self.reader, content='Hi')
+			self.assertEqual(counters.get_counts(post.pk)['comment_count'], 0)
+		view_buffer.record(post.pk, self.reader.pk)
+		self.assertEqual(counters.get_counts(post.pk), {'views': 1, 'likes': 1, 'comment_count': 1})
+		rollup = AnalyticsRollup.objects.using(self.alias).get(post=post, period=AnalyticsRollup.HOUR)
+		self.assertEqual((rollup.views, rollup.likes, rollup.comments), (1, 1, 1))
+
+		self.assertEqual(client.post(f'/api/posts/{post.slug}/like/').json()['likes_count'], 0)
+		comment.delete()
+		self.assertEqual(counters.get_counts(post.pk), {'views': 1, 'likes': 0, 'comment_count': 0})
+		feed = client.get('/api/posts/').json()['results']
+		self.assertEqual(feed[0]['analytics'], {'views': 1, 'likes': 0, 'comments': 0})
+
+	def test_deleting_a_user_deletes_their_views(self):
+		post = self.create_post()
+		view_buffer.record(post.pk, self.reader.pk)
+		viewers = PostAnalytics.viewed_users.through.objects.using(self.alias)
+		self.assertEqual(viewers.count(), 1)
+		self.reader.delete()
+		self.assertEqual(viewers.count(), 0)
+
+	def test_move_analytics(self):
+		# Rows written while the analytics still shared the default database
+		with override_settings(ANALYTICS_DATABASE=DEFAULT_DB_ALIAS):
+			posts = [self.create_post(f'Post {number}') for number in range(3)]
+			view_buffer.record(posts[0].pk, self.reader.pk)
+			PostLike.objects.create(post=posts[1], user=self.reader)
+			with self.assertRaises(CommandError):
+				call_command('move_analytics', stdout=io.StringIO())
+		self.assertEqual(self.rows(DEFAULT_DB_ALIAS).count(), 3)
+		self.assertFalse(self.rows(self.alias).exists())
+
+		call_command('move_analytics', '--keep', '--batch-size=2', stdout=io.StringIO())
+		self.assertEqual(self.rows(DEFAULT_DB_ALIAS).count(), 3)
+		# Run again, the rows already copied are skipped
+		out = io.StringIO()
+		call_command('move_analytics', stdout=out)
+		self.assertIn('blog_app_postanalytics: 3 rows', out.getvalue())
+		self.assertFalse(self.rows(DEFAULT_DB_ALIAS).exists())
+		self.assertFalse(AnalyticsRollup.objects.using(DEFAULT_DB_ALIAS).exists())
+		self.assertEqual(counters.get_counts(posts[0].pk), {'views': 1, 'likes': 0, 'comment_count': 0})
+		self.assertEqual(counters.get_counts(posts[1].pk), {'views': 0, 'likes': 1, 'comment_count': 0})
+		self.assertEqual(
+			list(PostAnalytics.viewed_users.through.objects.using(self.alias).values_list('customuser_id', flat=True)),
+			[self.reader.pk],
+		)
+		self.assertEqual(AnalyticsRollup.objects.using(self.alias).count(), 2)
+
+	def test_migration_0021_backfills_the_counters(self):
+		post, other = self.create_post(), self.create_post('Other')
+		PostLike.objects.create(post=post, user=self.reader)
+		PostLike.objects.create(post=post, user=self.author)
+		Comment.objects.create(post=post, author=self.reader, content='Hi')
+		# Rows copied before the likes and comments were counted on the analytics database
+		self.rows(self.alias).update(likes=0, comment_count=0, trending_offset=0, trending_score=0)
+
+		backfill = importlib.import_module('blog_app.migrations.0021_analytics_database_backfill').backfill_analytics
+		apps = MigrationLoader(connection).project_state(('blog_app', '0021_analytics_database_backfill')).apps
+		# Only the analytics database is backfilled
+		backfill(apps, mock.Mock(connection=connections[DEFAULT_DB_ALIAS]))
+		self.assertFalse(self.rows(self.alias).filter(likes__gt=0).exists())
+		backfill(apps, mock.Mock(connection=connections[self.alias]))
+
+		offset = trending.offset(post.created_at)
+		row = self.rows(self.alias).get(post_id=post.pk)
+		self.assertEqual((row.likes, row.comment_count), (2, 1))
+		self.assertAlmostEqual(row.trending_offset, offset)
+		self.assertAlmostEqual(row.trending_score, trending.score(0, 2, 1, offset))
+		row = self.rows(self.alias).get(post_id=other.pk)
+		self.assertEqual((row.likes, row.comment_count), (0, 0))
+		self.assertAlmostEqual(row.trending_score, trending.offset(other.created_at))
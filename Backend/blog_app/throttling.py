@@ -0,0 +1,42 @@
+"""
+Rate limits for the endpoints that hash passwords.
+
+Throttles run in APIView.initial(), before the view body, so a flood of login or
+registration attempts is rejected with 429 before any password is hashed. The rates
+are the "login", "login_username" and "register" entries of DEFAULT_THROTTLE_RATES, and
+the attempt history lives in the default cache.
+"""
+import hashlib
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class ClientRateThrottle(SimpleRateThrottle):
+	"""Requests per client IP address (authenticated or not)."""
+
+	def get_cache_key(self, request, view):
+		return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginRateThrottle(ClientRateThrottle):
+	scope = 'login'
+
+
+class RegisterRateThrottle(ClientRateThrottle):
+	scope = 'register'
+
+
+class LoginUsernameRateThrottle(SimpleRateThrottle):
+	"""
+	Login attempts against one username from one client IP address. Keyed on both, so
+	that failed attempts from elsewhere cannot lock the owner of the account out.
+	"""
+	scope = 'login_username'
+
+	def get_cache_key(self, request, view):
+		username = str(request.data.get('username') or '').strip().lower()
+		if not username:
+			return None
+		# Hashed to keep arbitrary user input out of cache keys
+		ident = hashlib.sha256(f'{self.get_ident(request)}\n{username}'.encode()).hexdigest()
+		return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -0,0 +1,173 @@
+"""
+Home timeline of the posts published by the authors a user follows.
+
+Fan-out on write: when a post is published, one TimelineEntry row is written for each
+follower of its author, so reading a timeline is a range scan of the reader's own rows.
+Posts of authors with more than TIMELINE_FANOUT_LIMIT followers ("celebrities") are not
+fanned out, which would cost one row per follower per post. Each post records whether
+it was (`Post.fanned_out`): the published posts that were not are read from a partial
+index when a timeline is read and merged with the materialized entries (fan-out on
+read), whatever the author's follower count has become since.
+
+Entries follow the social graph: following an author copies their latest fanned out
+posts into the follower's timeline, and unfollowing removes them.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Follow, Post, TimelineEntry
+
+CELEBRITIES_CACHE_KEY = 'timeline:celebrities'
+
+
+def fanout_limit():
+	return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def celebrity_ids():
+	"""Ids of the authors whose posts are not fanned out (cached for a few minutes)."""
+	ids = cache.get(CELEBRITIES_CACHE_KEY)
+	if ids is None:
+		ids = set(
+			Follow.objects.values('followed').annotate(total=Count('pk'))
+			.filter(total__gt=fanout_limit()).values_list('followed', flat=True)
+		)
+		cache.set(CELEBRITIES_CACHE_KEY, ids, timeout=getattr(settings, 'TIMELINE_CELEBRITY_CACHE_TIMEOUT', 300))
+	return ids
+
+
+def fan_out(post, batch_size=1000):
+	"""Write `post` into the timeline of every follower of its author. Returns the number of rows."""
+	return fan_out_many([post], batch_size)
+
+
+def fan_out_many(posts, batch_size=1000):
+	"""
+	Fan out several posts (e.g. a batch of imported ones) with one query for the followers
+	of all their authors, and record on each whether it was (celebrities' posts are not).
+	Returns the number of rows.
+	"""
+	celebrities = celebrity_ids()
+	posts = list(posts)
+	for post in posts:
+		post.fanned_out = post.author_id not in celebrities
+	for fanned_out in (True, False):
+		Post.objects.filter(pk__in=[post.pk for post in posts if post.fanned_out == fanned_out]).update(
+			fanned_out=fanned_out
+		)
+	posts = [post for post in posts if post.fanned_out]
+	followers = defaultdict(list)
+	for follower_id, author_id in Follow.objects.filter(
+		followed_id__in={post.author_id for post in posts}
+	).values_list('follower_id', 'followed_id'):
+		followers[author_id].append(follower_id)
+	entries = [
+		TimelineEntry(user_id=user_id, post_id=post.pk, author_id=post.author_id, created_at=post.created_at)
+		for post in posts for user_id in followers[post.author_id]
+	]
+	TimelineEntry.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+	return len(entries)
+
+
+def retract(post_id):
+	"""Remove a post from every timeline (e.g. when it is unpublished)."""
+	TimelineEntry.objects.filter(post_id=post_id).delete()
+
+
+def fan_out_pending(batch_size=1000):
+	"""
+	Fan out the published posts left out while their author was a celebrity, for the
+	authors who no longer are. Returns the number of posts.
+	"""
+	pending = Post.objects.filter(fanned_out=False, is_published=True).exclude(author_id__in=celebrity_ids())
+	pending = pending.order_by('pk').only('pk', 'author_id', 'created_at')
+	count = last_pk = 0
+	while batch := list(pending.filter(pk__gt=last_pk)[:batch_size]):
+		fan_out_many(batch, batch_size)
+		count += len(batch)
+		last_pk = batch[-1].pk
+	return count
+
+
+def follow(follower_id, author_id):
+	"""Copy the author's latest fanned out posts into the new follower's timeline."""
+	posts = Post.objects.filter(author_id=author_id, is_published__in=[True], fanned_out=True).order_by(
+		'-created_at', '-id'
+	)
+	TimelineEntry.objects.bulk_create(
+		[
+			TimelineEntry(user_id=follower_id, post_id=post_id, author_id=author_id, created_at=created_at)
+			for post_id, created_at in posts.values_list('id', 'created_at')[:getattr(settings, 'TIMELINE_BACKFILL', 100)]
+		],
+		ignore_conflicts=True,
+	)
+
+
+def unfollow(follower_id, author_id):
+	"""Remove the author's posts from the former follower's timeline."""
+	TimelineEntry.objects.filter(user_id=follower_id, author_id=author_id).delete()
+
+
+def rebuild(user_id, depth=None):
+	"""Recreate a user's timeline from the posts of the authors they follow."""
+	depth = depth or getattr(settings, 'TIMELINE_BACKFILL', 100)
+	author_ids = Follow.objects.filter(follower_id=user_id).values('followed_id')
+	posts = Post.objects.filter(author_id__in=author_ids, is_published__in=[True], fanned_out=True).order_by(
+		'-created_at', '-id'
+	)
+	TimelineEntry.objects.filter(user_id=user_id).delete()
+	TimelineEntry.objects.bulk_create([
+		TimelineEntry(user_id=user_id, post_id=post_id, author_id=author_id, created_at=created_at)
+		for post_id, author_id, created_at in posts.values_list('id', 'author_id', 'created_at')[:depth]
+	])
+
+
+def pending_posts(user):
+	"""The published posts of the authors `user` follows that were not fanned out."""
+	# Literal conditions, which SQLite matches against those of post_fanout_pending_idx
+	return Post.objects.filter(
+		fanned_out=False, is_published=True, author_id__in=Follow.objects.filter(follower=user).values('followed_id')
+	)
+
+
+def _after(position, reverse, field, tiebreaker):
+	"""Keyset condition selecting the rows after (or before, when reversing) `position`."""
+	created_at, pk = position
+	op = 'gt' if reverse else 'lt'
+	# The redundant bound keeps SQLite on a range of the index rather than an OR of two
+	after = Q(**{f'{field}__{op}': created_at}) | Q(**{field: created_at, f'{tiebreaker}__{op}': pk})
+	return after & Q(**{f'{field}__{op}e': created_at})
+
+
+def page(user, position=None, reverse=False, size=10):
+	"""
+	Return one page of `user`'s timeline as a list of posts, newest first, and whether
+	more posts follow in the direction of travel. `position` is the (created_at, post id)
+	keyset the page starts after; `reverse` walks towards newer posts.
+
+	The materialized entries and the followed authors' posts that were not fanned out are
+	each read with a LIMIT of size + 1 along their own index, then merged.
+	"""
+	direction = '' if reverse else '-'
+	entries = TimelineEntry.objects.filter(user=user)
+	if position is not None:
+		entries = entries.filter(_after(position, reverse, 'created_at', 'post_id'))
+	keys = list(entries.order_by(f'{direction}created_at', f'{direction}post_id').values_list('created_at', 'post_id')[
+		:size + 1])
+
+	pending = pending_posts(user)
+	if position is not None:
+		pending = pending.filter(_after(position, reverse, 'created_at', 'id'))
+	keys += pending.order_by(f'{direction}created_at', f'{direction}id').values_list('created_at', 'id')[:size + 1]
+
+	keys = sorted(set(keys), reverse=not reverse)
+	has_more = len(keys) > size
+	post_ids = [post_id for _, post_id in keys[:size]]
+	if reverse:
+		post_ids.reverse()
+
+	posts = Post.objects.feed().in_bulk(post_ids)
+	return [posts[post_id] for post_id in post_ids if post_id in posts], has_more
@@ -0,0 +1,132 @@
+"""
+Trending posts: engagement with exponential time decay.
+
+A post's trending value is its weighted engagement decayed by its age,
+
+	(1 + w_views * views + w_likes * likes + w_comments * comments) * 2 ** (-age / half_life)
+
+which ranks the same as its logarithm. Taking the logarithm splits it into an engagement
+term and a term that only depends on when the post was created (the current time adds
+the same constant to every post, so it can be dropped):
+
+	trending_score = ln(1 + weighted engagement) + created_at * ln(2) / half_life
+
+The second term is stored per post as `trending_offset`, so the score never has to be
+decayed over time: it only changes when a counter changes, and is rewritten in the same
+UPDATE as the counter. Reading the top posts is a walk down the `trending_score` index.
+After changing the weights or the half-life, run `manage.py update_trending`.
+"""
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Ln
+
+# Offsets are measured from a fixed epoch to keep them small
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+DEFAULT_WEIGHTS = {'views': 1.0, 'likes': 5.0, 'comments': 10.0}
+
+
+def half_life():
+	"""The half-life of engagement, in seconds."""
+	return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24) * 3600
+
+
+def weights():
+	return {**DEFAULT_WEIGHTS, **getattr(settings, 'TRENDING_WEIGHTS', {})}
+
+
+def offset(created_at):
+	"""The time term of the score of a post created at `created_at`."""
+	return (created_at - EPOCH).total_seconds() * math.log(2) / half_life()
+
+
+def score(views, likes, comments, trending_offset):
+	"""Compute a score in Python (same formula as `score_expression`)."""
+	w = weights()
+	return math.log(1 + w['views'] * views + w['likes'] * likes + w['comments'] * comments) + trending_offset
+
+
+def score_expression(views=F('views'), likes=F('likes'), comments=F('comment_count')):
+	"""
+	The score as a database expression over the PostAnalytics columns. The counters can
+	be replaced by expressions, so an UPDATE that changes a counter can write the matching
+	score in the same statement.
+	"""
+	w = weights()
+	engagement = (
+		Value(1.0) + Value(w['views']) * Cast(views, FloatField()) + Value(w['likes']) * Cast(likes, FloatField())
+		+ Value(w['comments']) * Cast(comments, FloatField())
+	)
+	return Ln(engagement) + F('trending_offset')
+
+
+def refresh(post_ids, batch_size=500):
+	"""Rewrite the scores of the given posts from their current counters."""
+	from .models import PostAnalytics
+
+	post_ids = list(post_ids)
+	for start in range(0, len(post_ids), batch_size):
+		PostAnalytics.objects.filter(post_id__in=post_ids[start:start + batch_size]).update(
+			trending_score=score_expression()
+		)
+
+
+def recompute(batch_size=2000):
+	"""Recompute every offset and score (after the weights or the half-life changed)."""
+	from django.db import connections, transaction
+
+	from .models import Post, PostAnalytics
+	from .routers import analytics_database
+
+	connection = connections[analytics_database()]
+	quote = connection.ops.quote_name
+	table = quote(PostAnalytics._meta.db_table)
+	updated = 0
+	last_pk = 0
+	with transaction.atomic(using=connection.alias):
+		while True:
+			batch = list(
+				Post.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'created_at')[:batch_size]
+			)
+			if not batch:
+				break
+			with connection.cursor() as cursor:
+				cursor.executemany(
+					f"UPDATE {table} SET {quote('trending_offset')} = %s WHERE {quote('post_id')} = %s",
+					[(offset(created_at), pk) for pk, created_at in batch],
+				)
+			updated += len(batch)
+			last_pk = batch[-1][0]
+		PostAnalytics.objects.update(trending_score=score_expression())
+	return updated
+
+
+def top(limit=10):
+	"""
+	The `limit` highest scoring published posts, best first.
+	The analytics rows are walked down the score index in chunks, skipping unpublished
+	posts, so the cost depends on `limit` rather than on the number of posts.
+	"""
+	from .models import Post, PostAnalytics
+
+	ranked = PostAnalytics.objects.order_by('-trending_score', '-post_id').values_list('post_id', flat=True)
+	chunk = max(limit * 2, 20)
+	post_ids = []
+	start = 0
+	while len(post_ids) < limit:
+		candidates = list(ranked[start:start + chunk])
+		if not candidates:
+			break
+		# Filtered here rather than with is_published, which would let SQLite pick an index on
+		# it over the primary key lookups
+		published = {pk for pk, is_published in Post.objects.filter(pk__in=candidates).values_list(
+			'pk', 'is_published') if is_published}
+		post_ids += [post_id for post_id in candidates if post_id in published]
+		start += chunk
+	post_ids = post_ids[:limit]
+
+	posts = Post.objects.feed().in_bulk(post_ids)
+	return [posts[post_id] for post_id in post_ids if post_id in posts]
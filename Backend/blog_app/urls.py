@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import *
 
 router = DefaultRouter()
@@ -19,6 +20,17 @@ urlpatterns = [
 	path('users-list/', UserListView.as_view(), name='user-list'),
 	path('users/<str:username>/profile/', UserProfileView.as_view(), name='user-profile'),
 
+	# Async variants of the read endpoints, for ASGI deployments (blog_app.async_views)
+	path('async/posts/', async_views.post_list, name='async-post-list'),
+	path('async/posts/<slug:slug>/', async_views.post_detail, name='async-post-detail'),
+	path('async/profile/', async_views.profile, name='async-profile'),
+	path('async/users/<str:username>/profile/', async_views.profile, name='async-user-profile'),
+	path('async/users/<int:id>/followers/', async_views.followers, name='async-user-followers'),
+	path('async/users/<int:id>/following/', async_views.following, name='async-user-following'),
+	path('async/user/<int:user_id>/post-count/', async_views.post_count, name='async-user-post-count'),
+	path('async/user/<int:user_id>/followers-count/', async_views.followers_count, name='async-user-followers-count'),
+	path('async/user/<int:user_id>/following-count/', async_views.following_count, name='async-user-following-count'),
+
 	# Include all routes from the router
 	path('', include(router.urls)),
 
@@ -39,6 +51,7 @@ urlpatterns = [
 	path('user/<int:user_id>/post-count/', UserPostCountView.as_view(), name='user-post-count'),
 	path('user/<int:user_id>/followers-count/', UserFollowersCountView.as_view(), name='user-followers-count'),
 	path('user/<int:user_id>/following-count/', UserFollowingCountView.as_view(), name='user-following-count'),
+	path('user/stats/', UserStatsView.as_view(), name='user-stats'),
 	path('users/<int:user_id>/posts/', UserPostsView.as_view(), name='user-posts'),
 
 	# Post CRUD
@@ -52,4 +65,8 @@ urlpatterns = [
 	# Password reset endpoints
 	path('password-reset-request/', PasswordResetRequestView.as_view(), name='password-reset-request'),
 	path('password-reset/<int:uid>/<str:token>/', PasswordResetView.as_view(), name='password-reset'),
+
+	# Bulk export / import (admins only)
+	path('export/', ExportView.as_view(), name='export'),
+	path('import/', ImportView.as_view(), name='import'),
 ]
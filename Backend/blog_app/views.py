@@ -1,20 +1,35 @@
-from django.db.models import Q  # Include Prefetch here
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum  # Include Prefetch here
+from django.db.models.functions import Lower
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions
-from rest_framework import viewsets, status
+from rest_framework import generics, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from .pagination import StandardPagination
+from . import caching, counters, exporting, importing, rollups, routers, search, trending
+from .authentication import CachedJWTAuthentication
+from .buffers import counter_buffer, view_buffer
+from .conditional import conditional_response, lazy, make_etag, with_validators
+from .pagination import FeedPagination, KeysetPagination, ReplyPagination, TimelinePagination
+from .stats import user_counts
+from .throttling import LoginRateThrottle, LoginUsernameRateThrottle, RegisterRateThrottle
 from .serializers import *
+# After the star import, which brings in Django's ValidationError (a 500, not a 400)
+from rest_framework.exceptions import ParseError, ValidationError
+import time
 import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.core.cache import cache
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 CustomUser = get_user_model()
 
@@ -24,6 +39,7 @@ class RegisterView(APIView):
 	Handles user registration.
 	"""
 	parser_classes = (MultiPartParser, FormParser)  # Allows handling of multipart/form-data
+	throttle_classes = [RegisterRateThrottle]  # Checked before the password is hashed
 
 	def post(self, request):
 		serializer = RegisterSerializer(data=request.data)
@@ -37,10 +53,13 @@ class LoginView(APIView):
 	"""
 	Handles user login and JWT token generation.
 	"""
+	# Floods are rejected before authenticate() hashes the password
+	throttle_classes = [LoginRateThrottle, LoginUsernameRateThrottle]
 
 	def post(self, request):
 		serializer = LoginSerializer(data=request.data)
 		if serializer.is_valid():
+			routers.carry_pin(request, serializer.validated_data['access'])
 			return Response(serializer.validated_data, status=status.HTTP_200_OK)
 		return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -49,48 +68,96 @@ class UserProfileView(APIView):
 	"""
 	Handles user profile details (retrieve and update).
 	"""
-	authentication_classes = [JWTAuthentication]
+	authentication_classes = [CachedJWTAuthentication]
 	permission_classes = [permissions.IsAuthenticated]
 
 	def get(self, request, username=None):
 		# If username is provided in the URL, fetch that user's profile
 		if username:
-			try:
-				user = User.objects.get(username=username)
-				serializer = UserProfileSerializer(user)
-				return Response(serializer.data, status=status.HTTP_200_OK)
-			except User.DoesNotExist:
+			# Only the validators are read up front; the full row is loaded if it changed
+			state = User.objects.filter(username=username).values('pk', 'updated_at').first()
+			if state is None:
 				return Response(
 					{"detail": "User not found."},
 					status=status.HTTP_404_NOT_FOUND
 				)
-		
-		# If no username is provided, return the authenticated user's profile
-		serializer = UserProfileSerializer(request.user)
-		return Response(serializer.data, status=status.HTTP_200_OK)
+			return conditional_response(
+				request, lambda: (make_etag('profile', state['pk'], state['updated_at']), state['updated_at']),
+				lambda: Response(UserProfileSerializer(User.objects.get(pk=state['pk'])).data, status=status.HTTP_200_OK)
+			)
+
+		# If no username is provided, return the authenticated user's profile. request.user
+		# may only carry the fields cached for authentication, so the row is re-read to build it
+		user = request.user
+		return conditional_response(
+			request, lambda: (make_etag('profile', user.pk, user.updated_at), user.updated_at),
+			lambda: Response(UserProfileSerializer(CustomUser.objects.get(pk=user.pk)).data, status=status.HTTP_200_OK)
+		)
 
 	def put(self, request):
-		# Update user details using partial data
-		serializer = UserProfileSerializer(request.user, data=request.data, partial=True)
+		# Update user details using partial data. The row is re-read rather than saving the
+		# (possibly cached) request.user over changes made since it was cached.
+		user = CustomUser.objects.get(pk=request.user.pk)
+		serializer = UserProfileSerializer(user, data=request.data, partial=True)
 		if serializer.is_valid():
 			serializer.save()
 			return Response(serializer.data, status=status.HTTP_200_OK)
 		return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserListView(APIView):
+class UserListView(generics.ListAPIView):
 	"""
-	Fetch all registered users.
+	Paginated directory of registered users, newest first: a page object (`count`, `next`,
+	`previous`, `results`) rather than the bare list of every user it used to return, with
+	`?pagination=cursor` for keyset pages.
+	`?search=<prefix>` filters on a case-insensitive username prefix (served by the
+	LOWER(username) index); `?include_counts=true` embeds follower/following/post counts.
 	"""
+	serializer_class = UserListSerializer
+	pagination_class = FeedPagination
 
-	def get(self, request):
-		# Fetch all users
-		users = CustomUser.objects.filter(is_user=True)
+	def get_queryset(self):
+		queryset = CustomUser.objects.filter(is_user=True).only(*UserListSerializer.Meta.fields)
+		prefix = self.request.query_params.get('search', '').strip().lower()
+		if prefix:
+			# A range on the indexed expression instead of LIKE, which SQLite can't serve from an index
+			queryset = queryset.annotate(username_lower=Lower('username')).filter(
+				username_lower__gte=prefix, username_lower__lt=prefix + '\U0010ffff'
+			)
+		return queryset.order_by('-created_at', '-pk')
 
-		# Serialize the data
-		serializer = UserProfileSerializer(users, many=True)
+	def list(self, request, *args, **kwargs):
+		response = super().list(request, *args, **kwargs)
 
-		return Response(serializer.data, status=status.HTTP_200_OK)
+		# Optionally embed follower/following/post counts (three grouped queries per page)
+		if request.query_params.get('include_counts') in ('true', '1'):
+			rows = response.data['results']
+			counts = user_counts([row['id'] for row in rows])
+			for row in rows:
+				row.update(counts[row['id']])
+
+		return response
+
+
+class UserStatsView(APIView):
+	"""
+	Batch version of the followers/following/post count views.
+	`?ids=1,2,3` returns the counts of every listed user with one grouped query per metric.
+	"""
+	max_ids = 200
+
+	def get(self, request, *args, **kwargs):
+		try:
+			ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+		except ValueError:
+			raise ParseError("The 'ids' query parameter must be a comma-separated list of integers.")
+		if len(ids) > self.max_ids:
+			raise ParseError(f"At most {self.max_ids} ids can be requested at once.")
+
+		existing = set(CustomUser.objects.filter(pk__in=ids).values_list('pk', flat=True))
+		ids = [user_id for user_id in dict.fromkeys(ids) if user_id in existing]
+		counts = user_counts(ids)
+		return Response([{'id': user_id, **counts[user_id]} for user_id in ids], status=status.HTTP_200_OK)
 
 
 class PasswordResetRequestView(APIView):
@@ -153,14 +220,14 @@ class PostViewSet(viewsets.ModelViewSet):
 	queryset = Post.objects.all()
 	serializer_class = PostSerializer
 	permission_classes = [IsAuthenticatedOrReadOnly]  # Allows read-only access to unauthenticated users
-	pagination_class = StandardPagination
+	pagination_class = FeedPagination
 	lookup_field = 'slug'  # Use slug instead of ID for unique identification.
 
 	def get_queryset(self):
 		"""
 		Apply filters based on query parameters.
 		"""
-		queryset = Post.objects.all()
+		queryset = Post.objects.feed()
 		user = self.request.user
 		params = self.request.query_params
 
@@ -178,7 +245,7 @@ class PostViewSet(viewsets.ModelViewSet):
 				raise ValidationError("The 'author' query parameter must be a valid integer.")
 		query = params.get('q')
 		if query:
-			queryset = queryset.filter(title__icontains=query)
+			queryset = search.filter_queryset(queryset, query)
 
 		category_slug = params.get('category')
 		if category_slug:
@@ -193,19 +260,48 @@ class PostViewSet(viewsets.ModelViewSet):
 			is_published = is_published.lower() in ['true', '1', 't', 'y', 'yes']
 			queryset = queryset.filter(is_published=is_published)
 
-		# If authenticated, allow viewing user-specific posts
+		# If authenticated, allow viewing user-specific posts.
 		if user.is_authenticated:
-			queryset = queryset.filter(Q(author=user) | Q(is_published=True)).distinct()
+			queryset = queryset.filter(Post.visible_to(user))
 
 		return queryset
 
 	@action(detail=False, methods=['get'], url_path='recent')
 	def recent_posts(self, request):
 		limit = int(request.query_params.get('limit', 5))  # Default limit is 5
-		recent_posts = Post.objects.order_by('-created_at')[:limit]  # Fetch recent posts
+		recent_posts = Post.objects.feed().order_by('-created_at')[:limit]  # Fetch recent posts
 		serializer = PostSerializer(recent_posts, many=True)
 		return Response(serializer.data)
 
+	@action(detail=False, methods=['get'], url_path='trending')
+	def trending_posts(self, request):
+		"""
+		The highest ranked published posts by engagement decayed with age (`?limit=`, 10 by
+		default, at most 100). Anonymous responses may be up to RESPONSE_CACHE_TIMEOUT old.
+		"""
+		try:
+			limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+		except ValueError:
+			raise ParseError("limit must be an integer.")
+
+		def build():
+			serializer = PostSerializer(trending.top(limit), many=True, context=self.get_serializer_context())
+			return Response(serializer.data)
+
+		return caching.cached_response(request, 'post-trending', [caching.POST_LIST], build)
+
+	@action(detail=False, methods=['get'], url_path='following', permission_classes=[IsAuthenticated])
+	def following(self, request):
+		"""
+		Home timeline: published posts of the authors the user follows, newest first.
+		Cursor paginated (`?cursor=`, `?page_size=`); served from the materialized
+		timeline, see blog_app.timeline.
+		"""
+		paginator = TimelinePagination()
+		posts = paginator.paginate_timeline(request.user, request)
+		serializer = PostSerializer(posts, many=True, context=self.get_serializer_context())
+		return paginator.get_paginated_response(serializer.data)
+
 	def perform_create(self, serializer):
 		"""
 		Automatically set the author of the post as the logged-in user.
@@ -220,50 +316,56 @@ class PostViewSet(viewsets.ModelViewSet):
 		post = get_object_or_404(Post, slug=slug)
 		user = request.user
 
-		# Check if the user has already liked the post
-		like, created = PostLike.objects.get_or_create(user=user, post=post)
-
-		if not created:  # User already liked the post, so "unlike"
-			like.delete()  # Remove like
-			post.decrement_likes()  # Decrement the likes count
-			is_liked = False
-		else:  # User has not liked the post, so "like"
-			post.increment_likes()  # Increment the likes count
-			is_liked = True
+		# The like counter is adjusted atomically by the PostLike signals (once the block
+		# commits when it lives in a separate analytics database)
+		with transaction.atomic():
+			like, created = PostLike.objects.get_or_create(user=user, post=post)
 
-		# Ensure PostAnalytics is linked and updated
-		post_analytics, created = PostAnalytics.objects.get_or_create(post=post)  # Get or create PostAnalytics
+			if not created:  # User already liked the post, so "unlike"
+				like.delete()  # Remove like
+				is_liked = False
+			else:  # User has not liked the post, so "like"
+				is_liked = True
 
-		# Update the likes count based on the PostLike relationship
-		post_analytics.likes = post.likes.count()  # This assumes you have a related manager for likes in the Post model
-		post_analytics.save()
+		# Plus the change still buffered in SQLite single-writer mode
+		likes_count = counters.get_counts(post.pk)['likes'] + counter_buffer.pending(post.pk, 'likes')
 
 		# Return the updated likes count and like status
 		return Response({
 			"detail": "You liked this post." if is_liked else "You unliked this post.",
 			"is_liked": is_liked,
-			"likes_count": post_analytics.likes,  # Send the updated likes count
+			"likes_count": likes_count,  # Send the updated likes count
 		}, status=status.HTTP_200_OK)
 
 	# Comment submission view
 	@action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
 	def comment(self, request, slug=None):
 		post = get_object_or_404(Post, slug=slug)
-		serializer = CommentSerializer(data=request.data)
+		serializer = CommentSerializer(data=request.data, context={'post': post})
 		if serializer.is_valid():
 			serializer.save(post=post, author=request.user)
 			return Response(serializer.data, status=status.HTTP_201_CREATED)
 		return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 	@action(detail=True, methods=['get'])
-	def comments_list(self, request, slug=None):	
+	def comments_list(self, request, slug=None):
 		"""
-		Retrieve all comments made on the specified post.
+		Top-level comments of the post, newest first and cursor paginated (`?cursor=`,
+		`?page_size=`), each with its `?replies=` oldest replies (3 by default, at most 20).
+		Further replies are read from /api/comments/<id>/replies/. A page costs the same
+		number of queries whatever its size.
 		"""
-		post = get_object_or_404(Post, slug=slug)
-		comments = Comment.objects.filter(post=post)
-		serializer = CommentSerializer(comments, many=True)
-		return Response(serializer.data, status=200)
+		post = get_object_or_404(Post.objects.only('pk'), slug=slug)
+		try:
+			replies = min(max(int(request.query_params.get('replies', 3)), 0), 20)
+		except ValueError:
+			raise ParseError("replies must be an integer.")
+
+		paginator = KeysetPagination()
+		comments = paginator.paginate_queryset(Comment.objects.filter(post=post, depth=0), request)
+		Comment.objects.attach_first_replies(comments, replies)
+		serializer = ThreadedCommentSerializer(comments, many=True, context=self.get_serializer_context())
+		return paginator.get_paginated_response(serializer.data)
 
 	@action(detail=True, methods=["post"], permission_classes=[IsAuthenticatedOrReadOnly])
 	def increment_views(self, request, slug=None):
@@ -271,28 +373,27 @@ class PostViewSet(viewsets.ModelViewSet):
 		Increment the view count of a post only for unique visitors.
 		Authenticated users are tracked via the `viewed_users` field,
 		and anonymous users are tracked using session data.
+		Views are buffered and written in batches by `blog_app.buffers.view_buffer`, so the
+		returned count is the stored count plus the views still waiting to be flushed.
 		"""
-		post = get_object_or_404(Post, slug=slug)
-
-		# Ensure PostAnalytics exists
-		analytics, _ = PostAnalytics.objects.get_or_create(post=post)
+		post = Post.objects.filter(slug=slug).values('pk', *counters.joined_counters('views')).first()
+		if post is None:
+			raise Http404("No Post matches the given query.")
+		counters.fill_counters(post, 'views')
 
 		if request.user.is_authenticated:
-			# Check if the user has already viewed the post
-			if not analytics.viewed_users.filter(id=request.user.id).exists():
-				analytics.viewed_users.add(request.user)
-				analytics.views += 1
-				analytics.save()
+			# Uniqueness against `viewed_users` is resolved when the buffer is flushed
+			view_buffer.record(post['pk'], request.user.id)
 		else:
 			# Handle anonymous users using session
-			session_key = f"viewed_post_{post.slug}"
+			session_key = f"viewed_post_{slug}"
 			if not request.session.get(session_key, False):
 				request.session[session_key] = True  # Mark as viewed
-				analytics.views += 1
-				analytics.save()
+				view_buffer.record(post['pk'])
 
+		views_count = (post['post_analytics__views'] or 0) + view_buffer.pending(post['pk'])
 		return Response(
-			{"status": "View incremented", "views_count": analytics.views},
+			{"status": "View incremented", "views_count": views_count},
 			status=status.HTTP_200_OK
 		)
 
@@ -300,16 +401,48 @@ class PostViewSet(viewsets.ModelViewSet):
 	def list(self, request, *args, **kwargs):
 		"""
 		List all posts with optional filtering.
-		This method is automatically handled by ModelViewSet.
+		Honours If-None-Match, and anonymous responses are served from the response cache.
+		"""
+		validators = lazy(lambda: (self.list_etag(request), None))
+		build = lambda: with_validators(super(PostViewSet, self).list(request, *args, **kwargs), validators)
+		return conditional_response(
+			request, validators, lambda: caching.cached_response(request, 'post-list', [caching.POST_LIST], build)
+		)
+
+	def list_etag(self, request):
+		"""
+		ETag of a post listing, from the version stamp of the response cache's post-list
+		scope: every write that changes a listing bumps it, including the counter and view
+		flushes of blog_app.buffers, so no query is needed. There is no Last-Modified:
+		likes, comments, views and deletions change the listing without moving any
+		`updated_at`.
 		"""
-		return super().list(request, *args, **kwargs)
+		version, = caching.get_versions([caching.POST_LIST])
+		return make_etag('post-list', request.user.pk, sorted(request.query_params.lists()), version)
 
 	def retrieve(self, request, *args, **kwargs):
 		"""
 		Retrieve a specific post by its slug.
-		This method is automatically handled by ModelViewSet.
-		"""
-		return super().retrieve(request, *args, **kwargs)
+		Honours If-None-Match, and anonymous responses are served from the response cache.
+		"""
+		slug = kwargs.get('slug')
+
+		def post_etag():
+			# No Last-Modified, as the counters change without moving `updated_at`
+			counter_fields = ('views', 'likes', 'comment_count')
+			state = Post.objects.filter(slug=slug).values(
+				'pk', 'updated_at', 'author__updated_at', 'category__name', *counters.joined_counters(*counter_fields),
+			).first()
+			if state is None:
+				return None, None  # 404
+			counters.fill_counters(state, *counter_fields)
+			return make_etag('post', *state.values()), None
+
+		validators = lazy(post_etag)
+		build = lambda: with_validators(super(PostViewSet, self).retrieve(request, *args, **kwargs), validators)
+		return conditional_response(
+			request, validators, lambda: caching.cached_response(request, 'post-detail', [caching.post_scope(slug)], build)
+		)
 
 	def update(self, request, *args, **kwargs):
 		"""
@@ -349,7 +482,7 @@ class PostViewSet(viewsets.ModelViewSet):
 
 	def get_object(self):
 		slug = self.kwargs['slug']
-		return get_object_or_404(Post, slug=slug)
+		return get_object_or_404(Post.objects.feed(), slug=slug)
 
 
 # Profile View (CRUD for the authenticated user's profile)
@@ -402,6 +535,12 @@ class FollowViewSet(viewsets.ViewSet):
 		"""
 		target_user = get_object_or_404(CustomUser, id=pk)
 		followers = Follow.objects.filter(followed=target_user).select_related('follower')
+		if KeysetPagination.requested(request):
+			paginator = KeysetPagination()
+			page = paginator.paginate_queryset(followers, request, view=self)
+			return paginator.get_paginated_response(
+				UserProfileSerializer([follow.follower for follow in page], many=True).data
+			)
 		serialized_data = UserProfileSerializer([follow.follower for follow in followers], many=True).data
 
 		return Response(serialized_data, status=status.HTTP_200_OK)
@@ -413,6 +552,12 @@ class FollowViewSet(viewsets.ViewSet):
 		"""
 		target_user = get_object_or_404(CustomUser, id=pk)
 		following = Follow.objects.filter(follower=target_user).select_related('followed')
+		if KeysetPagination.requested(request):
+			paginator = KeysetPagination()
+			page = paginator.paginate_queryset(following, request, view=self)
+			return paginator.get_paginated_response(
+				UserProfileSerializer([follow.followed for follow in page], many=True).data
+			)
 		serialized_data = UserProfileSerializer([follow.followed for follow in following], many=True).data
 
 		return Response(serialized_data, status=status.HTTP_200_OK)
@@ -455,11 +600,21 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
 		return obj.author == request.user
 
 
+
+class IsAdminRole(permissions.BasePermission):
+	"""
+	Allows access only to admins and superusers.
+	"""
+
+	def has_permission(self, request, view):
+		user = request.user
+		return bool(user and user.is_authenticated and (user.is_admin or user.is_superuser))
+
 class CommentViewSet(viewsets.ModelViewSet):
 	queryset = Comment.objects.all()
 	serializer_class = CommentSerializer
 	permission_classes = [permissions.IsAuthenticated, IsAuthorOrReadOnly]
-	pagination_class = StandardPagination
+	pagination_class = FeedPagination
 
 	def get_queryset(self):
 		post_id = self.request.query_params.get('post_id', None)
@@ -479,6 +634,40 @@ class CommentViewSet(viewsets.ModelViewSet):
 	def perform_create(self, serializer):
 		serializer.save(author=self.request.user)
 
+	@action(detail=True, methods=['get'], permission_classes=[IsAuthenticatedOrReadOnly])
+	def replies(self, request, pk=None):
+		"""Direct replies of a comment, oldest first and cursor paginated (`?cursor=`)."""
+		comment = get_object_or_404(Comment.objects.select_related(None).only('pk'), pk=pk)
+		paginator = ReplyPagination()
+		replies = paginator.paginate_queryset(Comment.objects.filter(parent=comment), request)
+		serializer = CommentSerializer(replies, many=True, context=self.get_serializer_context())
+		return paginator.get_paginated_response(serializer.data)
+
+	@action(detail=True, methods=['get'], permission_classes=[IsAuthenticatedOrReadOnly])
+	def thread(self, request, pk=None):
+		"""
+		A comment and its replies at every depth, depth first (each has its `depth` for
+		indenting). Read from the path index `?page_size=` (100, at most 500) comments at a
+		time; `next` continues after the last one.
+		"""
+		comment = get_object_or_404(Comment.objects.select_related(None).only('pk', 'path'), pk=pk)
+		try:
+			size = min(max(int(request.query_params.get('page_size', 100)), 1), 500)
+		except ValueError:
+			raise ParseError("page_size must be an integer.")
+		subtree = comment.subtree()
+		after = request.query_params.get('after')
+		if after:
+			subtree = subtree.filter(path__gt=after)
+		comments = list(subtree[:size + 1])
+
+		next_link = None
+		if len(comments) > size:
+			comments = comments[:size]
+			next_link = replace_query_param(request.build_absolute_uri(), 'after', comments[-1].path)
+		serializer = CommentSerializer(comments, many=True, context=self.get_serializer_context())
+		return Response({'next': next_link, 'results': serializer.data})
+
 	def update(self, request, *args, **kwargs):
 		comment = self.get_object()
 		if comment.author != request.user:
@@ -499,6 +688,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
 	serializer_class = CategorySerializer
 	permission_classes = []  # No authentication required
 
+	def list(self, request, *args, **kwargs):
+		return caching.cached_response(
+			request, 'category-list', [caching.CATEGORY_LIST], lambda: super(CategoryViewSet, self).list(request, *args, **kwargs)
+		)
+
 
 # PostAnalytics ViewSet (View post analytics like views and likes)
 class PostAnalyticsViewSet(viewsets.ReadOnlyModelViewSet):
@@ -506,6 +700,72 @@ class PostAnalyticsViewSet(viewsets.ReadOnlyModelViewSet):
 	serializer_class = PostAnalyticsSerializer
 	permission_classes = []  # No authentication required
 
+	def get_queryset(self):
+		if getattr(settings, 'VIEW_TRACKING_BACKEND', 'm2m') == 'sketch':
+			return PostAnalytics.objects.all()
+		# Count viewers in the same query instead of once per row
+		return PostAnalytics.objects.defer('viewer_sketch').annotate(viewer_count=Count('viewed_users'))
+
+	def series_range(self, request):
+		"""
+		Read `?interval=` (hour or day, default day) and the `?start=` / `?end=` dates or
+		datetimes (UTC unless given an offset). Defaults to the last 30 days / 48 hours.
+		"""
+		period = request.query_params.get('interval', rollups.DAY)
+		if period not in rollups.STEPS:
+			raise ParseError("interval must be 'hour' or 'day'.")
+
+		bounds = {}
+		for name in ('start', 'end'):
+			value = request.query_params.get(name)
+			if not value:
+				continue
+			moment = parse_datetime(value)
+			if moment is None and parse_date(value) is not None:
+				moment = datetime.combine(parse_date(value), datetime.min.time())
+			if moment is None:
+				raise ParseError(f"{name} must be an ISO 8601 date or datetime.")
+			bounds[name] = moment if timezone.is_aware(moment) else timezone.make_aware(moment, dt_timezone.utc)
+
+		end = bounds.get('end') or timezone.now() + rollups.STEPS[period]
+		default_span = timedelta(days=30) if period == rollups.DAY else timedelta(hours=48)
+		start = bounds.get('start') or end - default_span
+		buckets = (rollups.truncate(end, period) - rollups.truncate(start, period)) / rollups.STEPS[period]
+		if buckets <= 0:
+			raise ParseError("start must be before end.")
+		if buckets > rollups.MAX_BUCKETS:
+			raise ParseError(f"At most {rollups.MAX_BUCKETS} buckets can be requested at once.")
+		return period, rollups.truncate(start, period), rollups.truncate(end, period)
+
+	def series_response(self, posts, period, start, end, **extra):
+		series = rollups.series(posts, period, start, end)
+		totals = {event: sum(bucket[event] for bucket in series) for event in rollups.EVENTS}
+		return Response({**extra, 'interval': period, 'start': start, 'end': end, 'totals': totals, 'series': series})
+
+	@action(detail=True, methods=['get'])
+	def series(self, request, pk=None):
+		"""Views, likes and comments of one post per hour or day (see `series_range`)."""
+		analytics = get_object_or_404(PostAnalytics.objects.only('id', 'post_id'), pk=pk)
+		period, start, end = self.series_range(request)
+		return self.series_response([analytics.post_id], period, start, end, post=analytics.post_id)
+
+	@action(detail=False, methods=['get'], url_path=r'authors/(?P<username>[^/.]+)')
+	def author(self, request, username=None):
+		"""
+		Summed views, likes and comments of an author's posts per hour or day, with the
+		most viewed posts of the range. Drafts are only counted for the author themselves.
+		"""
+		author = get_object_or_404(CustomUser, username=username)
+		period, start, end = self.series_range(request)
+		posts = Post.objects.filter(author=author)
+		if request.user != author:
+			posts = posts.filter(is_published__in=[True])
+		posts = posts.values('pk')
+		return self.series_response(
+			posts, period, start, end, author=author.username,
+			top_posts=rollups.post_totals(posts, period, start, end),
+		)
+
 
 # PostLike ViewSet (View and manage post likes)
 class PostLikeViewSet(viewsets.ModelViewSet):
@@ -585,6 +845,53 @@ class UserPostsView(APIView):
 			return Response({"detail": "You cannot view posts of another user."}, status=403)
 
 		# Fetch posts for the given user ID
-		posts = Post.objects.filter(author_id=user_id)  # Assuming Post has a `user` field (ForeignKey to User)
+		posts = Post.objects.feed().filter(author_id=user_id)
 		serializer = PostSerializer(posts, many=True)
 		return Response(serializer.data)
+
+
+class ExportView(APIView):
+	"""
+	Stream posts, comments, analytics and follows as NDJSON (admins only).
+	`?models=post,comment` restricts the export; rows are read in chunks so memory use
+	does not grow with the size of the tables.
+	"""
+	permission_classes = [IsAdminRole]
+
+	def get(self, request, *args, **kwargs):
+		try:
+			models = exporting.parse_models(request.query_params.get('models', ''))
+		except ValueError as exc:
+			raise ParseError(str(exc))
+
+		response = StreamingHttpResponse(exporting.iter_ndjson(models), content_type='application/x-ndjson')
+		response['Content-Disposition'] = 'attachment; filename="blog-export.ndjson"'
+		return response
+
+
+class ImportView(APIView):
+	"""
+	Import an NDJSON dump in the export format (admins only).
+	The dump is sent either as the raw request body or as a multipart `file` upload.
+	"""
+	permission_classes = [IsAdminRole]
+
+	def post(self, request, *args, **kwargs):
+		if request.content_type.startswith('multipart/'):
+			source = request.FILES.get('file')
+			if source is None:
+				raise ParseError("Upload the dump as a 'file' field.")
+		else:
+			source = request.stream
+			if source is None:
+				raise ParseError("The request body is empty.")
+
+		importer = importing.Importer(skip_existing=request.query_params.get('skip_existing') in ('true', '1'))
+		started = time.monotonic()
+		report = importer.run(source)
+		elapsed = time.monotonic() - started
+
+		imported = report['posts'] + report['comments'] + report['analytics']
+		report['seconds'] = round(elapsed, 3)
+		report['rows_per_second'] = round(imported / elapsed) if elapsed else imported
+		return Response(report, status=status.HTTP_200_OK)
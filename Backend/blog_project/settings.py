@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'blog_app.routers.PrimaryPinningMiddleware',  # Before anything that reads the database
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,13 +86,73 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than an in-memory database, so that tests can write from threads
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# SQLite production profile (blog_app.sqlite): WAL plus the pragmas of
+# blog_app.sqlite.DEFAULT_PRAGMAS (overridden by SQLITE_PRAGMAS) on every new connection,
+# and write transactions that wait for the lock instead of failing with "database is
+# locked". SQLITE_SINGLE_WRITER also funnels counter and analytics writes through one
+# background thread. Both are switched on with environment variables of the same name.
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', '').lower() in ('1', 'true', 'yes')
+SQLITE_SINGLE_WRITER = os.environ.get('SQLITE_SINGLE_WRITER', '').lower() in ('1', 'true', 'yes')
+SQLITE_PRAGMAS = {}
+if SQLITE_PRODUCTION:
+    DATABASES['default']['OPTIONS'] = {
+        'transaction_mode': 'IMMEDIATE',  # Take the write lock at BEGIN (Django 5.1+)
+        'timeout': 5,  # Seconds to wait for it
+    }
+
+# Analytics database (blog_app.routers.AnalyticsRouter): with ANALYTICS_DATABASE_PATH set,
+# the analytics models (view / like / comment counters, viewers and the time series) live
+# in a SQLite file of their own, so their writes no longer take the lock of the main
+# database. Create its tables with `manage.py migrate --database analytics` and copy the
+# existing rows over with `manage.py move_analytics`.
+ANALYTICS_DATABASE = 'default'
+if os.environ.get('ANALYTICS_DATABASE_PATH'):
+    DATABASES['analytics'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['ANALYTICS_DATABASE_PATH'],
+        'TEST': {'NAME': BASE_DIR / 'test_analytics.sqlite3'},
+    }
+    ANALYTICS_DATABASE = 'analytics'
+
+# Read replicas (blog_app.routers): the reads of requests go to REPLICA_DATABASES, picked
+# "round_robin" or "least_loaded", and writes to the primary. A client's reads stay on the
+# primary for PRIMARY_PIN_SECONDS after it writes. DATABASE_REPLICAS lists the SQLite files
+# of the replicas (comma separated); `manage.py sync_replicas` copies the primary into them.
+DATABASE_ROUTERS = ['blog_app.routers.AnalyticsRouter', 'blog_app.routers.PrimaryReplicaRouter']
+REPLICA_DATABASES = []
+for number, path in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'},  # Tests read the test primary through the replica aliases
+    }
+    REPLICA_DATABASES.append(f'replica{number}')
+REPLICA_SELECTION = 'round_robin'
+PRIMARY_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# New passwords are hashed with scrypt at the cost of PASSWORD_HASH_PROFILE
+# ("interactive", "moderate" or "sensitive", see blog_app.hashers); PASSWORD_HASH_PARAMETERS
+# overrides single parameters, e.g. {'scrypt': {'work_factor': 2 ** 15}}. Existing PBKDF2
+# hashes keep working and are upgraded at the next login. Measure a profile on the target
+# machine with `manage.py benchmark_auth`.
+PASSWORD_HASHERS = [
+    'blog_app.hashers.ScryptPasswordHasher',
+    'blog_app.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+PASSWORD_HASH_PROFILE = 'interactive'
+PASSWORD_HASH_PARAMETERS = {}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -124,8 +186,6 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
-import os
-
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -138,10 +198,15 @@ AUTH_USER_MODEL = 'blog_app.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'blog_app.authentication.CachedJWTAuthentication',
 
     ),
-   
+    # Rates of the login / registration throttles (blog_app.throttling)
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '30/min',  # per client IP
+        'login_username': '10/min',  # per client IP and username
+        'register': '20/hour',  # per client IP
+    },
 }
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Your React frontend
@@ -157,3 +222,77 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_LIFETIME_LATE_USER': timedelta(days=30),
 }
 
+# Buffered view counter (blog_app.buffers): seconds between background flushes and the
+# number of buffered views that triggers an early flush. An interval of 0 writes through.
+VIEW_BUFFER_FLUSH_INTERVAL = 5
+VIEW_BUFFER_MAX_PENDING = 1000
+
+# Buffered like / comment counter changes (blog_app.buffers.counter_buffer), with the same
+# two settings. Only used in SQLite single-writer mode and with a separate analytics
+# database; otherwise counters are updated in the transaction that changes them.
+COUNTER_BUFFER_FLUSH_INTERVAL = 1
+COUNTER_BUFFER_MAX_PENDING = 1000
+
+# How unique viewers are tracked: "m2m" stores one PostAnalytics.viewed_users row per
+# (post, user); "sketch" keeps a compact Bloom filter + HyperLogLog per post instead.
+# Run `manage.py migrate_viewed_users` before switching an existing database to "sketch".
+VIEW_TRACKING_BACKEND = 'm2m'
+VIEW_SKETCH_CAPACITY = 1000  # Viewers held by the first Bloom filter before it grows
+VIEW_SKETCH_ERROR_RATE = 0.01
+VIEW_SKETCH_HLL_PRECISION = 12
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog-cache',
+    }
+}
+# A cache shared by every worker process, which CachedJWTAuthentication needs to cache
+# users (see AUTH_USER_CACHE_TIMEOUT): REDIS_URL (e.g. redis://localhost:6379/0, needs the
+# `redis` package), or CACHE_DIRECTORY for files shared by the processes of one host.
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+elif os.environ.get('CACHE_DIRECTORY'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['CACHE_DIRECTORY'],
+    }
+
+# Seconds anonymous post/category responses stay in the response cache (0 disables it)
+RESPONSE_CACHE_TIMEOUT = 60
+
+# Resized image variants (blog_app.images): generated on a thread pool after the upload
+# commits, or inline when IMAGE_PROCESSING_ASYNC is False.
+IMAGE_PROCESSING_ASYNC = True
+IMAGE_WORKERS = 2
+IMAGE_VARIANT_QUALITY = 80
+
+# Home timeline (blog_app.timeline): posts are fanned out to the timelines of their
+# author's followers unless the author has more than TIMELINE_FANOUT_LIMIT followers, in
+# which case they are merged in at read time. TIMELINE_BACKFILL posts are copied into a
+# timeline when a user follows an author.
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_CELEBRITY_CACHE_TIMEOUT = 300
+TIMELINE_BACKFILL = 100
+
+# Trending posts (blog_app.trending): engagement weights and the half-life of its decay.
+# Run `manage.py update_trending` after changing either.
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WEIGHTS = {'views': 1.0, 'likes': 5.0, 'comments': 10.0}
+
+# Analytics time series (blog_app.rollups): events are buffered like views and written
+# to hourly rows. `manage.py compact_rollups` folds hourly rows older than
+# ANALYTICS_HOURLY_RETENTION_DAYS into daily rows, and drops daily rows older than
+# ANALYTICS_DAILY_RETENTION_DAYS (None keeps them forever).
+ROLLUP_BUFFER_FLUSH_INTERVAL = 5
+ROLLUP_BUFFER_MAX_PENDING = 1000
+ANALYTICS_HOURLY_RETENTION_DAYS = 7
+ANALYTICS_DAILY_RETENTION_DAYS = None
+
+# Seconds the user loaded by CachedJWTAuthentication stays cached (0 reads it on every request).
+# Only applies with a cache shared by every process (REDIS_URL or CACHE_DIRECTORY above):
+# with the default LocMemCache, users are read on every request.
+AUTH_USER_CACHE_TIMEOUT = 60
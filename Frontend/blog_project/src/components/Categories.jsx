@@ -98,11 +98,23 @@ const Categories = () => {
                 to={`/posts/${post.slug}`}
                 className="overflow-hidden rounded-lg"
               >
-                <img
-                  src={post.image || "https://via.placeholder.com/300x200"}
-                  alt={post.title}
-                  className="object-cover w-full h-48 hover:scale-105 transition-transform duration-300"
-                />
+                <picture>
+                  {post.image_variants?.medium && (
+                    <source
+                      srcSet={post.image_variants.medium.webp}
+                      type="image/webp"
+                    />
+                  )}
+                  <img
+                    src={
+                      post.image_variants?.medium?.jpeg ||
+                      post.image ||
+                      "https://via.placeholder.com/300x200"
+                    }
+                    alt={post.title}
+                    className="object-cover w-full h-48 hover:scale-105 transition-transform duration-300"
+                  />
+                </picture>
               </Link>
 
               {/* Post Details */}
@@ -3,9 +3,6 @@ import axios from "axios";
 import { useNavigate } from "react-router-dom";
 
 const UserCard = ({ user, onViewPosts }) => {
-  const [followersCount, setFollowersCount] = useState(null);
-  const [followersLoading, setFollowersLoading] = useState(true);
-  const [followersError, setFollowersError] = useState(null);
   const [modalImage, setModalImage] = useState(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
 
@@ -15,55 +12,36 @@ const UserCard = ({ user, onViewPosts }) => {
     setIsModalOpen((prevState) => !prevState);
   };
 
-  useEffect(() => {
-    const fetchFollowersCount = async () => {
-      try {
-        const response = await axios.get(
-          `http://localhost:8000/api/user/${user.id}/followers-count/`
-        );
-        setFollowersCount(response.data.followers_count);
-      } catch (err) {
-        setFollowersError("Error fetching followers count");
-      } finally {
-        setFollowersLoading(false);
-      }
-    };
-
-    fetchFollowersCount();
-  }, [user.id]);
-
   return (
     <div className="p-6 lg:w-1/4 md:w-1/2 w-full">
       <div className="h-full flex items-center border-gray-200 border p-6 rounded-lg  shadow-lg hover:shadow-xl transition-shadow duration-300">
-        <img
-          alt="user"
-          className="w-20 h-20 object-cover object-center flex-shrink-0 rounded-full mr-6"
-          src={
-            user.profile_picture
-              ? `http://localhost:8000${user.profile_picture}`
-              : "https://via.placeholder.com/150"
-          }
-          onClick={() =>
-            toggleModal(`http://localhost:8000${user.profile_picture}`)
-          }
-        />
+        <picture className="flex-shrink-0 mr-6">
+          {user.profile_picture_variants?.thumb && (
+            <source
+              srcSet={user.profile_picture_variants.thumb.webp}
+              type="image/webp"
+            />
+          )}
+          <img
+            alt="user"
+            className="w-20 h-20 object-cover object-center rounded-full"
+            src={
+              user.profile_picture_variants?.thumb?.jpeg ||
+              user.profile_picture ||
+              "https://via.placeholder.com/150"
+            }
+            onClick={() => toggleModal(user.profile_picture)}
+          />
+        </picture>
         <div className="flex-grow ">
           <h2 className="text-xl text-white font-semibold text-gray-800">
             {user.username}
           </h2>
 
-          {/* Followers Count */}
-          {followersLoading ? (
-            <div className="text-gray-500 text-sm mt-2">
-              Loading followers...
-            </div>
-          ) : followersError ? (
-            <div className="text-red-500 text-sm mt-2">{followersError}</div>
-          ) : (
-            <div className="text-white text-sm mt-2">
-              <strong>{followersCount}</strong> Followers
-            </div>
-          )}
+          {/* Followers Count (embedded in the users-list response) */}
+          <div className="text-white text-sm mt-2">
+            <strong>{user.followers_count}</strong> Followers
+          </div>
 
           <button
             onClick={() => onViewPosts(user.username)}
@@ -92,22 +70,27 @@ const UserCard = ({ user, onViewPosts }) => {
   );
 };
 
+const USERS_URL = "http://localhost:8000/api/users-list/";
+
 const UserListPage = () => {
   const [users, setUsers] = useState([]);
-  const [filteredUsers, setFilteredUsers] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
   const [searchTerm, setSearchTerm] = useState("");
   const navigate = useNavigate();
 
+  // Fetch the first page whenever the (debounced) search term changes
   useEffect(() => {
     const fetchUsers = async () => {
       try {
-        const response = await axios.get(
-          "http://localhost:8000/api/users-list/"
-        );
-        setUsers(response.data);
-        setFilteredUsers(response.data); // Initially, display all users
+        const response = await axios.get(USERS_URL, {
+          params: { include_counts: true, search: searchTerm || undefined },
+        });
+        setUsers(response.data.results);
+        setNextUrl(response.data.next);
+        setError(null);
       } catch (err) {
         setError("Error fetching users");
       } finally {
@@ -115,17 +98,26 @@ const UserListPage = () => {
       }
     };
 
-    fetchUsers();
-  }, []);
+    const timer = setTimeout(fetchUsers, 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  const handleLoadMore = async () => {
+    if (!nextUrl) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(nextUrl);
+      setUsers((prevUsers) => [...prevUsers, ...response.data.results]);
+      setNextUrl(response.data.next);
+    } catch (err) {
+      setError("Error fetching users");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const handleSearchChange = (event) => {
-    const searchQuery = event.target.value.toLowerCase();
-    setSearchTerm(searchQuery);
-
-    const filtered = users.filter((user) =>
-      user.username.toLowerCase().includes(searchQuery)
-    );
-    setFilteredUsers(filtered);
+    setSearchTerm(event.target.value.toLowerCase());
   };
 
   const handleViewPostsClick = (username) => {
@@ -176,7 +168,7 @@ const UserListPage = () => {
             </div>
           </div>
           <div className="flex flex-wrap -m-2">
-            {filteredUsers.map((user) => (
+            {users.map((user) => (
               <UserCard
                 key={user.username}
                 user={user}
@@ -184,6 +176,17 @@ const UserListPage = () => {
               />
             ))}
           </div>
+          {nextUrl && (
+            <div className="text-center mt-8">
+              <button
+                onClick={handleLoadMore}
+                disabled={loadingMore}
+                className="py-2 px-6 rounded-lg bg-indigo-500 hover:bg-indigo-600 disabled:opacity-50"
+              >
+                {loadingMore ? "Loading..." : "Load more"}
+              </button>
+            </div>
+          )}
         </div>
       </section>
     </div>
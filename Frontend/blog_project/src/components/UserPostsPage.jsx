@@ -73,11 +73,19 @@ const PostCard = ({ post, onReadMore }) => (
     <div onClick={() => onReadMore(post.slug)} className="cursor-pointer">
       {post.image && (
         <div className="relative h-56 w-full">
-          <img
-            src={post.image}
-            alt={post.title}
-            className="object-cover w-full h-full rounded-t-xl transform group-hover:scale-105 transition-transform duration-500"
-          />
+          <picture>
+            {post.image_variants?.medium && (
+              <source
+                srcSet={post.image_variants.medium.webp}
+                type="image/webp"
+              />
+            )}
+            <img
+              src={post.image_variants?.medium?.jpeg || post.image}
+              alt={post.title}
+              className="object-cover w-full h-full rounded-t-xl transform group-hover:scale-105 transition-transform duration-500"
+            />
+          </picture>
         </div>
       )}
     </div>
@@ -10,6 +10,7 @@ const PostDetailPage = () => {
   const [error, setError] = useState(null);
   const [isLiked, setIsLiked] = useState(false);
   const [comments, setComments] = useState([]);
+  const [nextComments, setNextComments] = useState(null);
   const [newComment, setNewComment] = useState("");
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [modalImage, setModalImage] = useState(null);
@@ -70,10 +71,11 @@ const PostDetailPage = () => {
     }
   };
 
-  const fetchComments = useCallback(async () => {
+  // Top-level comments come a page at a time, each with its first few replies
+  const fetchComments = useCallback(async (url) => {
     try {
       const response = await fetch(
-        `http://127.0.0.1:8000/api/posts/${slug}/comments_list/`,
+        url || `http://127.0.0.1:8000/api/posts/${slug}/comments_list/`,
         {
           headers: {
             "Content-Type": "application/json",
@@ -83,12 +85,43 @@ const PostDetailPage = () => {
       );
       if (!response.ok) throw new Error("Failed to fetch comments.");
       const data = await response.json();
-      setComments(data);
+      setComments((previous) =>
+        url ? [...previous, ...data.results] : data.results
+      );
+      setNextComments(data.next);
     } catch (err) {
       console.error("Error fetching comments:", err);
     }
   }, [slug]);
 
+  const fetchMoreReplies = async (comment) => {
+    try {
+      const response = await fetch(
+        comment.nextReplies ||
+          `http://127.0.0.1:8000/api/comments/${comment.id}/replies/`
+      );
+      if (!response.ok) throw new Error("Failed to fetch replies.");
+      const data = await response.json();
+      setComments((previous) =>
+        previous.map((item) => {
+          if (item.id !== comment.id) return item;
+          // The first page repeats the replies already shown
+          const shown = new Set(item.replies.map((reply) => reply.id));
+          return {
+            ...item,
+            replies: [
+              ...item.replies,
+              ...data.results.filter((reply) => !shown.has(reply.id)),
+            ],
+            nextReplies: data.next,
+          };
+        })
+      );
+    } catch (err) {
+      console.error("Error fetching replies:", err);
+    }
+  };
+
   const handleCommentSubmit = async () => {
     if (!newComment.trim()) {
       toast.error("Comment content is required.");
@@ -112,7 +145,7 @@ const PostDetailPage = () => {
       );
       if (!response.ok) throw new Error("Failed to post comment.");
       const data = await response.json();
-      setComments([data, ...comments]);
+      setComments([{ ...data, replies: [] }, ...comments]);
       setNewComment("");
       toast.success("Comment posted successfully!");
     } catch (err) {
@@ -120,6 +153,35 @@ const PostDetailPage = () => {
       toast.error("Failed to post comment.");
     }
   };
+  const renderComment = (comment) => (
+    <div className="bg-white p-6 rounded-lg shadow-lg flex items-start space-x-4">
+      {/* Profile Picture */}
+      <div className="flex-shrink-0">
+        <img
+          src={comment.author.profile_picture}
+          alt={`${comment.author.username} profile`}
+          className="w-12 h-12 rounded-full object-cover cursor-pointer transition-transform transform hover:scale-105"
+        />
+      </div>
+
+      {/* Comment Content */}
+      <div className="flex-1">
+        {/* Author Name and Content */}
+        <div className="mb-2">
+          <p className="text-lg font-semibold text-gray-900">
+            {comment.author.username}
+          </p>
+          <p className="text-gray-700">{comment.content}</p>
+        </div>
+
+        {/* Timestamp (Optional: you can display the time when the comment was posted) */}
+        <p className="text-sm text-gray-500">
+          Posted on {new Date(comment.created_at).toLocaleDateString()}
+        </p>
+      </div>
+    </div>
+  );
+
   useEffect(() => {
     fetchPostDetails();
     fetchRecentPosts();
@@ -249,40 +311,40 @@ const PostDetailPage = () => {
               <div className="mt-6">
                 {comments.length > 0 ? (
                   comments.map((comment) => (
-                    <div
-                      key={comment.id}
-                      className="bg-white p-6 rounded-lg shadow-lg mb-6 flex items-start space-x-4"
-                    >
-                      {/* Profile Picture */}
-                      <div className="flex-shrink-0">
-                        <img
-                          src={`http://127.0.0.1:8000${comment.author.profile_picture}`}
-                          alt={`${comment.author.username} profile`}
-                          className="w-12 h-12 rounded-full object-cover cursor-pointer transition-transform transform hover:scale-105"
-                        />
-                      </div>
-
-                      {/* Comment Content */}
-                      <div className="flex-1">
-                        {/* Author Name and Content */}
-                        <div className="mb-2">
-                          <p className="text-lg font-semibold text-gray-900">
-                            {comment.author.username}
-                          </p>
-                          <p className="text-gray-700">{comment.content}</p>
-                        </div>
+                    <div key={comment.id} className="mb-6">
+                      {renderComment(comment)}
 
-                        {/* Timestamp (Optional: you can display the time when the comment was posted) */}
-                        <p className="text-sm text-gray-500">
-                          Posted on{" "}
-                          {new Date(comment.created_at).toLocaleDateString()}
-                        </p>
+                      {/* Replies */}
+                      <div className="ml-12 mt-2">
+                        {comment.replies.map((reply) => (
+                          <div key={reply.id} className="mb-2">
+                            {renderComment(reply)}
+                          </div>
+                        ))}
+                        {comment.reply_count > comment.replies.length &&
+                          comment.nextReplies !== null && (
+                            <button
+                              className="text-sm text-blue-500"
+                              onClick={() => fetchMoreReplies(comment)}
+                            >
+                              Show more replies (
+                              {comment.reply_count - comment.replies.length})
+                            </button>
+                          )}
                       </div>
                     </div>
                   ))
                 ) : (
                   <p className="text-lg text-gray-500">No comments yet.</p>
                 )}
+                {nextComments && (
+                  <button
+                    className="mt-2 bg-gray-200 text-gray-800 py-2 px-4 rounded"
+                    onClick={() => fetchComments(nextComments)}
+                  >
+                    Load more comments
+                  </button>
+                )}
               </div>
             </div>
           </div>
@@ -30,35 +30,23 @@ const Profile = () => {
 
   useEffect(() => {
     if (user?.id && token) {
-      // Fetch followers count
-      fetch(`http://127.0.0.1:8000/api/user/${user.id}/followers-count`, {
+      // Fetch followers, following and post counts in one request
+      fetch(`http://127.0.0.1:8000/api/user/stats/?ids=${user.id}`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
       })
         .then((res) => res.json())
-        .then((data) => setFollowersCount(data.followers_count || "N/A"))
-        .catch(() => setFollowersCount("N/A"));
-
-      // Fetch following count
-      fetch(`http://127.0.0.1:8000/api/user/${user.id}/following-count`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      })
-        .then((res) => res.json())
-        .then((data) => setFollowingCount(data.following_count || "N/A"))
-        .catch(() => setFollowingCount("N/A"));
-
-      // Fetch post count
-      fetch(`http://127.0.0.1:8000/api/user/${user.id}/post-count`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      })
-        .then((res) => res.json())
-        .then((data) => setPostCount(data.post_count || "N/A"))
-        .catch(() => setPostCount("N/A"));
+        .then(([stats]) => {
+          setFollowersCount(stats?.followers_count ?? "N/A");
+          setFollowingCount(stats?.following_count ?? "N/A");
+          setPostCount(stats?.post_count ?? "N/A");
+        })
+        .catch(() => {
+          setFollowersCount("N/A");
+          setFollowingCount("N/A");
+          setPostCount("N/A");
+        });
 
       // Fetch posts for the logged-in user
       fetch(`http://127.0.0.1:8000/api/users/${user.id}/posts/`, {